@@ -17,13 +17,38 @@ Version:
 ### Imported modules
 
 from datetime import datetime as _datetime
+from time import time as _time
+from threading import Thread
+from queue import Queue, Full
 from sys import stdout as sys_stdout
+from sys import stdin as sys_stdin
 from sys import version_info as sys_version_info
 from getpass import getpass
 
 from constants import (
     LOG, CONST
 )
+from profiling import span
+
+###############################################################################
+### Globals
+
+# Log levels text
+LOG_LEVEL_TEXT = {
+    LOG.DEBUG: "DEBUG",
+    LOG.INFO: "INFO",
+    LOG.WARNING: "WARNING",
+    LOG.ERROR: "ERROR"
+}
+
+# Minimum log level to print (checked once in each print_log() call)
+_log_threshold = [CONST.LOG_LEVEL]
+
+# Asynchronous log queue and thread (None if disabled)
+_log_queue = [None, None]
+
+# Last timestamp second and its text
+_timestamp_cache = [-1, ""]
 
 ###############################################################################
 ### Auxiliars Functions
@@ -51,7 +76,7 @@ def is_int(s, base=10):
         return False
 
 
-def printts(to_print="", timestamp=True):
+def printts(to_print="", timestamp=True, print_time=None):
     '''printts with timestamp.'''
     print_without_ts = False
     # Normal print if timestamp is disabled
@@ -85,41 +110,99 @@ def printts(to_print="", timestamp=True):
         print(to_print)
     else:
         # Get actual time and print with timestamp
-        actual_date = _datetime.utcnow().strftime(CONST.LOG_TIMESTAMP_FORMAT)
-        print("{} - {}".format(actual_date, to_print))
+        if print_time is None:
+            print_time = _time()
+        print("{} - {}".format(timestamp_text(print_time), to_print))
+
+
+def timestamp_text(ts_time):
+    '''Get timestamp text of an epoch time (formatted once per second).'''
+    second = int(ts_time)
+    if second != _timestamp_cache[0]:
+        _timestamp_cache[1] = _datetime.utcfromtimestamp(second).strftime(
+                CONST.LOG_TIMESTAMP_FORMAT)
+        _timestamp_cache[0] = second
+    return _timestamp_cache[1]
+
+
+def print_log(log_level, log_text, *args):
+    '''Print according to a debug level. Provided args are formatted in
+    log_text just if the level is enabled (lazy formatting), so a discarded
+    debug message costs just this level check.'''
+    if log_level < _log_threshold[0]:
+        return
+    if _log_queue[0] is not None:
+        # Asynchronous log, formatting and output is done by log thread
+        try:
+            _log_queue[0].put_nowait((_time(), log_level, log_text, args))
+        except Full:
+            pass
+        return
+    log_write(_time(), log_level, log_text, args)
+
+
+def log_write(log_time, log_level, log_text, args=()):
+    '''Format and output a log message.'''
+    with span("print_log"):
+        if args:
+            log_text = log_text.format(*args)
+        printts("[{}] {}".format(LOG_LEVEL_TEXT.get(log_level,
+                "ERROR"), log_text), print_time=log_time)
+        sys_stdout.flush()
 
 
-def print_log(log_level, log_text):
-    '''Print according to a debug level.'''
-    if CONST.LOG_LEVEL <= LOG.DEBUG:
-        printts("[{}] {}".format(log_level_to_text(log_level), log_text))
-        sys_stdout.flush()
-    elif CONST.LOG_LEVEL == LOG.INFO:
-        if log_level >= LOG.INFO:
-            printts("[{}] {}".format(log_level_to_text(log_level), log_text))
-            sys_stdout.flush()
-    elif CONST.LOG_LEVEL == LOG.WARNING:
-        if log_level >= LOG.WARNING:
-            printts("[{}] {}".format(log_level_to_text(log_level), log_text))
-            sys_stdout.flush()
-    elif CONST.LOG_LEVEL == LOG.ERROR:
-        if log_level >= LOG.ERROR:
-            printts("[{}] {}".format(log_level_to_text(log_level), log_text))
-            sys_stdout.flush()
+def log_enabled(log_level):
+    '''Check if a log level is enabled (to skip building expensive log
+    arguments).'''
+    return log_level >= _log_threshold[0]
+
+
+def log_level_set(log_level):
+    '''Change current log level.'''
+    _log_threshold[0] = log_level
+
+
+def log_async_start(queue_size=CONST.LOG_ASYNC_QUEUE_SIZE):
+    '''Move log messages formatting and output to a background thread
+    (messages are dropped if the queue is full instead of blocking).'''
+    if _log_queue[0] is not None:
+        return
+    log_queue = Queue(queue_size)
+    th_log = Thread(target=_th_log, args=(log_queue,))
+    th_log.daemon = True
+    th_log.start()
+    _log_queue[0] = log_queue
+    _log_queue[1] = th_log
+
+
+def log_async_stop():
+    '''Output pending log messages and stop the log thread.'''
+    log_queue, th_log = _log_queue
+    if log_queue is None:
+        return
+    _log_queue[0] = None
+    _log_queue[1] = None
+    log_queue.put(None)
+    th_log.join()
+
+
+def _th_log(log_queue):
+    '''Asynchronous log output thread.'''
+    while True:
+        message = log_queue.get()
+        if message is None:
+            break
+        try:
+            log_write(*message)
+        except Exception:
+            pass
 
 
 def log_level_to_text(log_level):
     '''Convert log level number to string.'''
     if log_level <= LOG.DEBUG:
         return "DEBUG"
-    elif log_level == LOG.INFO:
-        return "INFO"
-    elif log_level == LOG.WARNING:
-        return "WARNING"
-    elif log_level >= LOG.ERROR:
-        return "ERROR"
-    else:
-        return "ERROR"
+    return LOG_LEVEL_TEXT.get(log_level, "ERROR")
 
 
 def stdin_input(text="", hide=True):
@@ -133,3 +216,26 @@ def stdin_input(text="", hide=True):
         else:
             in_str = input(text)
     return in_str
+
+
+def stdin_settings_get():
+    '''Get current standard input terminal settings (None if not a tty).'''
+    try:
+        import termios
+        if not sys_stdin.isatty():
+            return None
+        return termios.tcgetattr(sys_stdin.fileno())
+    except Exception:
+        return None
+
+
+def stdin_settings_restore(settings):
+    '''Restore standard input terminal settings (i.e. re-enable echo if
+    the program exits while a hidden input was in progress).'''
+    if settings is None:
+        return
+    try:
+        import termios
+        termios.tcsetattr(sys_stdin.fileno(), termios.TCSADRAIN, settings)
+    except Exception:
+        pass
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    baudcache.py
+Description:
+    Persistent BaudRate detection cache. Detected speeds are stored in a
+    small JSON file keyed by the USB identity of the device (VID, PID,
+    serial number and location), or by the port path for non-USB ports.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import json
+import time
+from os import path as os_path
+from os import replace as os_replace
+
+from serial.tools.list_ports import comports
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from filesrw import create_parents_dirs, file_exists, file_read_all_text
+
+###############################################################################
+### Functions
+
+def device_identity(port):
+    '''Get a stable identity key for a Serial port device.'''
+    port_path = os_path.realpath(port)
+    try:
+        for port_info in comports():
+            if os_path.realpath(port_info.device) != port_path:
+                continue
+            if port_info.vid is None:
+                break
+            return "usb:{:04x}:{:04x}:{}:{}".format(port_info.vid,
+                    port_info.pid, port_info.serial_number,
+                    port_info.location)
+    except Exception as e:
+        print_log(LOG.ERROR, str(e))
+    return "path:{}".format(port_path)
+
+
+def bauds_cache_load(cache_file=CONST.BAUDS_CACHE_FILE):
+    '''Load BaudRate cache entries from file.'''
+    if not file_exists(cache_file):
+        return {}
+    try:
+        cache = json.loads(file_read_all_text(cache_file))
+    except ValueError as e:
+        print_log(LOG.ERROR, "Invalid bauds cache file. {}", e)
+        return {}
+    if not isinstance(cache, dict):
+        return {}
+    return cache
+
+
+def bauds_cache_save(cache, cache_file=CONST.BAUDS_CACHE_FILE):
+    '''Save BaudRate cache entries to file (atomically replaced).'''
+    create_parents_dirs(cache_file)
+    tmp_file = "{}.tmp".format(cache_file)
+    try:
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f, indent=4, sort_keys=True)
+        os_replace(tmp_file, cache_file)
+    except Exception as e:
+        print_log(LOG.ERROR, "Can't write bauds cache file {}. {}",
+                cache_file, e)
+
+
+def bauds_cache_get(port, cache_file=CONST.BAUDS_CACHE_FILE,
+        ttl=CONST.BAUDS_CACHE_TTL):
+    '''Get cached BaudRate of a port device (0 if unknown or expired).'''
+    entry = bauds_cache_load(cache_file).get(device_identity(port))
+    if entry is None:
+        return 0
+    if time.time() - entry.get("time", 0) > ttl:
+        print_log(LOG.INFO, "Cached bauds of {} expired.", port)
+        bauds_cache_invalidate(port, cache_file)
+        return 0
+    return entry.get("bauds", 0)
+
+
+def bauds_cache_set(port, bauds, cache_file=CONST.BAUDS_CACHE_FILE):
+    '''Store the BaudRate of a port device.'''
+    cache = bauds_cache_load(cache_file)
+    cache[device_identity(port)] = {"bauds": bauds, "time": time.time()}
+    bauds_cache_save(cache, cache_file)
+
+
+def bauds_cache_invalidate(port, cache_file=CONST.BAUDS_CACHE_FILE):
+    '''Remove the cached BaudRate of a port device.'''
+    cache = bauds_cache_load(cache_file)
+    if cache.pop(device_identity(port), None) is not None:
+        bauds_cache_save(cache, cache_file)
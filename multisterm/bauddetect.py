@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    bauddetect.py
+Description:
+    Serial Port BaudRate detection. The port is open just once and each
+    candidate speed is configured in place, then received bytes are
+    passively captured for a short time and scored by a table driven text
+    classifier. Most common speeds are tried first and the detection stops
+    as soon as one of them gets a confident score.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from serialcomm import serial_open, serial_close, serial_write
+from baudcache import bauds_cache_get, bauds_cache_set, bauds_cache_invalidate
+
+###############################################################################
+### Classifier Tables
+
+# Bytes expected in human readable text (printable ASCII and EOLs)
+_TEXT_BYTES = bytes(range(0x20, 0x7F)) + b"\t\r\n"
+
+# Bytes that are not text
+_NON_TEXT_BYTES = bytes(set(range(256)) - set(_TEXT_BYTES))
+
+# Bytes typically produced by framing errors (wrong bauds)
+_ERROR_BYTES = b"\x00\xff" + bytes(range(0x80, 0xFF))
+
+# All bytes that are not framing errors
+_NON_ERROR_BYTES = bytes(set(range(256)) - set(_ERROR_BYTES))
+
+###############################################################################
+### Detection Result
+
+class BaudsDetectResult():
+    '''BaudRate detection result and report data.'''
+
+    def __init__(self):
+        self.bauds = 0
+        self.score = 0.0
+        self.elapsed = 0.0
+        self.tried = []
+        self.cached = False
+
+    def __str__(self):
+        if self.bauds == 0:
+            return "BaudRate not detected ({} speeds tried in {:.2f}s)".format(
+                    len(self.tried), self.elapsed)
+        if self.cached:
+            return "BaudRate {} verified from cache with {:.0f}% " \
+                "confidence (in {:.2f}s)".format(self.bauds, self.score*100,
+                    self.elapsed)
+        return "BaudRate {} detected with {:.0f}% confidence " \
+            "({} speeds tried in {:.2f}s)".format(self.bauds,
+                self.score*100, len(self.tried), self.elapsed)
+
+###############################################################################
+### Functions
+
+def bauds_score(data):
+    '''Score how much received bytes looks like valid text (0.0 to 1.0).'''
+    data_len = len(data)
+    if data_len < CONST.SERIAL_AUTODETECT_MIN_BYTES:
+        return 0.0
+    # Ratio of printable bytes and framing error bytes
+    text_ratio = len(data.translate(None, _NON_TEXT_BYTES)) / data_len
+    error_ratio = len(data.translate(None, _NON_ERROR_BYTES)) / data_len
+    # Line endings regularity, lines of a reasonable length are expected
+    # (a lot of random bytes with no EOL or a burst of EOLs is not text)
+    num_eol = data.count(b"\n")
+    if num_eol == 0:
+        eol_factor = 0.85
+    else:
+        line_len = data_len / num_eol
+        if CONST.SERIAL_AUTODETECT_MIN_LINE <= line_len \
+                <= CONST.SERIAL_AUTODETECT_MAX_LINE:
+            eol_factor = 1.0
+        else:
+            eol_factor = 0.5
+    score = text_ratio * (1.0 - error_ratio) * eol_factor
+    return score
+
+
+def bauds_listen(ser, listen_time):
+    '''Passively capture received bytes during a time window (or until
+    enough bytes are received).'''
+    captured = bytearray()
+    end_time = time.time() + listen_time
+    while len(captured) < CONST.SERIAL_AUTODETECT_MAX_BYTES:
+        remaining = end_time - time.time()
+        if remaining <= 0:
+            break
+        ser.timeout = remaining
+        try:
+            read = ser.read(ser.in_waiting or 1)
+        except Exception as e:
+            print_log(LOG.ERROR, str(e))
+            break
+        captured.extend(read)
+    return bytes(captured)
+
+
+def bauds_probe(ser, bauds, listen_time=CONST.SERIAL_AUTODETECT_LISTEN_TIME):
+    '''Configure the port at some bauds and get received bytes score. If
+    the device is silent, a dummy string is sent to try to get a response.'''
+    ser.baudrate = bauds
+    ser.reset_input_buffer()
+    captured = bauds_listen(ser, listen_time)
+    if len(captured) == 0:
+        serial_write(ser, CONST.SERIAL_AUTODETECT_BAUDS_SEND)
+        captured = bauds_listen(ser, listen_time)
+    return bauds_score(captured)
+
+
+def bauds_detect(serial_port, candidates=CONST.SERIAL_COMMON_BAUDS):
+    '''Detect Serial port BaudRate from a list of candidates sorted by
+    likelihood.'''
+    result = BaudsDetectResult()
+    start_time = time.time()
+    ser = serial_open(serial_port, candidates[0], 0, 1.0)
+    if ser is None:
+        return result
+    for bauds in candidates:
+        print_log(LOG.INFO, "Checking {} bauds...", bauds)
+        try:
+            score = bauds_probe(ser, bauds)
+        except Exception as e:
+            print_log(LOG.ERROR, str(e))
+            continue
+        result.tried.append((bauds, score))
+        if score > result.score:
+            result.bauds = bauds
+            result.score = score
+        if score >= CONST.SERIAL_AUTODETECT_CONFIDENT_SCORE:
+            break
+    serial_close(ser)
+    if result.score < CONST.SERIAL_AUTODETECT_MIN_SCORE:
+        result.bauds = 0
+    result.elapsed = time.time() - start_time
+    return result
+
+
+def bauds_detect_cached(serial_port, candidates=CONST.SERIAL_COMMON_BAUDS):
+    '''Detect Serial port BaudRate, trying first to verify the cached
+    BaudRate of the device with a single probe.'''
+    start_time = time.time()
+    cached_bauds = bauds_cache_get(serial_port)
+    if cached_bauds != 0:
+        result = BaudsDetectResult()
+        result.cached = True
+        ser = serial_open(serial_port, cached_bauds, 0, 1.0)
+        if ser is not None:
+            try:
+                result.score = bauds_probe(ser, cached_bauds)
+            except Exception as e:
+                print_log(LOG.ERROR, str(e))
+            serial_close(ser)
+        result.tried.append((cached_bauds, result.score))
+        if result.score >= CONST.SERIAL_AUTODETECT_MIN_SCORE:
+            result.bauds = cached_bauds
+            result.elapsed = time.time() - start_time
+            return result
+        print_log(LOG.INFO, "Cached bauds {} verification fail.",
+                cached_bauds)
+        bauds_cache_invalidate(serial_port)
+    result = bauds_detect(serial_port, candidates)
+    result.elapsed = time.time() - start_time
+    if result.bauds != 0:
+        bauds_cache_set(serial_port, result.bauds)
+    return result
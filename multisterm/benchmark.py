@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    benchmark.py
+Description:
+    Serial communication performance benchmarks over a virtual (pty) Serial
+    device. It measures sustained RX throughput of the read paths, TX
+    throughput, round-trip latency percentiles, CPU time per MB and dropped
+    bytes. Results can be saved and used as a baseline to detect
+    performance regressions:
+        python benchmark.py [-s <BYTES>] [-n <PINGS>] [-j <RESULTS_FILE>]
+               [-c <BASELINE_FILE>] [-t <TOLERANCE>] [BENCHMARK ...]
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import json
+import time
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from threading import Thread
+from argparse import ArgumentParser as argparse_ArgumentParser
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+from serialcomm import (
+    serial_open, serial_close, serial_read_str, serial_write
+)
+from serialloop import SerialEventLoop
+from virtualport import VirtualPort, gen_text, gen_binary
+from framing import DelimiterSplitter
+from triggers import Trigger, TriggerEngine
+from display import DataDisplay
+
+###############################################################################
+### Auxiliar Functions
+
+def percentile(sorted_values, percent):
+    '''Get a percentile from a sorted list of values.'''
+    if not sorted_values:
+        return 0.0
+    i = int(round((percent / 100.0) * (len(sorted_values) - 1)))
+    return sorted_values[i]
+
+
+def throughput_result(num_bytes, expected, elapsed, cpu_time):
+    '''Build a throughput benchmark result.'''
+    mb = max(num_bytes, 1) / 1e6
+    return {
+        "bytes": num_bytes,
+        "seconds": elapsed,
+        "mb_per_s": mb / elapsed if elapsed > 0 else 0.0,
+        "cpu_s_per_mb": cpu_time / mb,
+        "dropped": expected - num_bytes
+    }
+
+###############################################################################
+### Benchmarks
+
+def bench_rx_poll(size):
+    '''RX throughput of the polling read path (serial_read_str()).'''
+    with VirtualPort(gen_text(), limit=size) as vport:
+        ser = serial_open(vport.port, CONST.BENCH_BAUDS, 0.1, 1.0)
+        received = 0
+        last_rx = time.time()
+        start = time.time()
+        cpu_start = time.thread_time()
+        while received < size:
+            read = len(serial_read_str(ser).encode())
+            if read:
+                received = received + read
+                last_rx = time.time()
+            elif time.time() - last_rx > CONST.BENCH_IDLE_TIMEOUT:
+                break
+        cpu_time = time.thread_time() - cpu_start
+        elapsed = last_rx - start
+        serial_close(ser)
+    return throughput_result(received, size, elapsed, cpu_time)
+
+
+def bench_rx_loop(size):
+    '''RX throughput of the event driven read path (SerialEventLoop).'''
+    with VirtualPort(gen_text(), limit=size) as vport:
+        ser = serial_open(vport.port, CONST.BENCH_BAUDS, 0.1, 1.0)
+        received = [0, time.time()]
+        def on_read(data):
+            data.decode(errors="replace")
+            received[0] = received[0] + len(data)
+            received[1] = time.time()
+            if received[0] >= size:
+                loop.stop()
+        loop = SerialEventLoop(ser, on_read)
+        # Stop the loop if data is lost and the expected size never arrives
+        def th_watchdog():
+            while loop.is_running():
+                if time.time() - received[1] > CONST.BENCH_IDLE_TIMEOUT:
+                    loop.stop()
+                time.sleep(0.1)
+        start = time.time()
+        th = Thread(target=th_watchdog)
+        th.start()
+        cpu_start = time.thread_time()
+        loop.run()
+        cpu_time = time.thread_time() - cpu_start
+        th.join()
+        loop.close()
+        serial_close(ser)
+    return throughput_result(received[0], size, received[1] - start, cpu_time)
+
+
+def bench_tx(size):
+    '''TX throughput of serial_write().'''
+    chunk = "x" * CONST.BENCH_TX_CHUNK_SIZE
+    with VirtualPort() as vport:
+        ser = serial_open(vport.port, CONST.BENCH_BAUDS, 0.1, 1.0)
+        start = time.time()
+        cpu_start = time.thread_time()
+        written = 0
+        while written < size:
+            serial_write(ser, chunk)
+            written = written + len(chunk)
+        cpu_time = time.thread_time() - cpu_start
+        last_rx = time.time()
+        last_received = -1
+        while vport.bytes_received < written:
+            if vport.bytes_received != last_received:
+                last_received = vport.bytes_received
+                last_rx = time.time()
+            elif time.time() - last_rx > CONST.BENCH_IDLE_TIMEOUT:
+                break
+            time.sleep(0.001)
+        elapsed = time.time() - start
+        serial_close(ser)
+        received = vport.bytes_received
+    return throughput_result(received, written, elapsed, cpu_time)
+
+
+def bench_latency(num_pings):
+    '''Round-trip latency of serial_write() and an echo response read.'''
+    message = "ping\n"
+    rtts = []
+    lost = 0
+    with VirtualPort(echo=True) as vport:
+        ser = serial_open(vport.port, CONST.BENCH_BAUDS, 1.0, 1.0)
+        for _ in range(num_pings):
+            start = time.perf_counter()
+            serial_write(ser, message)
+            response = b''
+            while len(response) < len(message):
+                read = ser.read(len(message) - len(response))
+                if not read:
+                    break
+                response = response + read
+            if len(response) < len(message):
+                lost = lost + 1
+                continue
+            rtts.append((time.perf_counter() - start) * 1000)
+        serial_close(ser)
+    rtts.sort()
+    return {
+        "pings": num_pings,
+        "lost": lost,
+        "p50_ms": percentile(rtts, 50),
+        "p90_ms": percentile(rtts, 90),
+        "p99_ms": percentile(rtts, 99),
+        "max_ms": rtts[-1] if rtts else 0.0
+    }
+
+
+def bench_triggers(size):
+    '''Throughput of the triggers engine (literals, regexes, filters and
+    highlights) over received text chunks.'''
+    triggers = [Trigger("pattern{}".format(i))
+            for i in range(CONST.BENCH_TRIGGERS_PATTERNS)]
+    triggers.append(Trigger("re:[0-9]{8}0\\]", highlight=True))
+    triggers.append(Trigger("fox", highlight=True))
+    triggers.append(Trigger("re:ERR(OR)?", exclude=True))
+    engine = TriggerEngine(triggers)
+    splitter = DelimiterSplitter()
+    lines = gen_text()
+    chunks = []
+    chunk_bytes = 0
+    while chunk_bytes < CONST.VPORT_READ_SIZE * 16:
+        data = next(lines)[0]
+        chunks.append(data)
+        chunk_bytes = chunk_bytes + len(data)
+    data = b"".join(chunks)
+    chunks = [data[i:i+CONST.VPORT_READ_SIZE]
+            for i in range(0, len(data), CONST.VPORT_READ_SIZE)]
+    processed = 0
+    start = time.time()
+    cpu_start = time.thread_time()
+    while processed < size:
+        for chunk in chunks:
+            engine.feed(chunk)
+            for line in splitter.feed(chunk):
+                engine.line_process(line)
+            processed = processed + len(chunk)
+    cpu_time = time.thread_time() - cpu_start
+    return throughput_result(processed, processed, time.time() - start,
+            cpu_time)
+
+
+def bench_display(size):
+    '''Throughput of the mixed hex and ASCII dump display of binary
+    received chunks.'''
+    display = DataDisplay(CONST.DISPLAY_MODE_MIXED)
+    chunks = gen_binary()
+    processed = 0
+    start = time.time()
+    cpu_start = time.thread_time()
+    while processed < size:
+        data = next(chunks)[0]
+        display.stream(data)
+        processed = processed + len(data)
+    cpu_time = time.thread_time() - cpu_start
+    return throughput_result(processed, processed, time.time() - start,
+            cpu_time)
+
+
+BENCHMARKS = ["rx_poll", "rx_loop", "tx", "latency", "triggers", "display"]
+
+###############################################################################
+### Results Functions
+
+def results_show(results):
+    '''Print benchmarks results.'''
+    for name, result in results.items():
+        if "mb_per_s" in result:
+            print("{:<10} {:>8.2f} MB/s  {:>8.3f} CPU s/MB  {:>9} bytes  " \
+                "{} dropped".format(name, result["mb_per_s"],
+                    result["cpu_s_per_mb"], result["bytes"],
+                    result["dropped"]))
+        else:
+            print("{:<10} p50 {:.3f} ms  p90 {:.3f} ms  p99 {:.3f} ms  " \
+                "max {:.3f} ms  {} lost".format(name, result["p50_ms"],
+                    result["p90_ms"], result["p99_ms"], result["max_ms"],
+                    result["lost"]))
+
+
+def results_compare(results, baseline, tolerance):
+    '''Compare results against a baseline, return the list of regressions.'''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if "mb_per_s" in result:
+            if result["mb_per_s"] < base["mb_per_s"] * (1 - tolerance):
+                regressions.append("{} throughput {:.2f} < {:.2f} MB/s".format(
+                        name, result["mb_per_s"], base["mb_per_s"]))
+            if result["dropped"] > base["dropped"]:
+                regressions.append("{} dropped {} > {} bytes".format(
+                        name, result["dropped"], base["dropped"]))
+        else:
+            if result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+                regressions.append("{} p99 {:.3f} > {:.3f} ms".format(
+                        name, result["p99_ms"], base["p99_ms"]))
+    return regressions
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    arg_parser = argparse_ArgumentParser()
+    arg_parser.add_argument("benchmarks", nargs='*', default=[],
+                            help="Benchmarks to run ({})".format(
+                                ", ".join(BENCHMARKS)))
+    arg_parser.add_argument("-s", "--size", help="Throughput bytes",
+                            action='store', type=int,
+                            default=CONST.BENCH_SIZE)
+    arg_parser.add_argument("-n", "--pings", help="Latency pings",
+                            action='store', type=int,
+                            default=CONST.BENCH_PINGS)
+    arg_parser.add_argument("-j", "--json", help="Save results to file",
+                            action='store', type=str)
+    arg_parser.add_argument("-c", "--compare", help="Baseline results file",
+                            action='store', type=str)
+    arg_parser.add_argument("-t", "--tolerance", action='store', type=float,
+                            default=CONST.BENCH_TOLERANCE,
+                            help="Allowed regression ratio")
+    args = arg_parser.parse_args(argv[1:])
+    benchmarks = args.benchmarks or BENCHMARKS
+    for name in benchmarks:
+        if name not in BENCHMARKS:
+            print_log(LOG.ERROR, "Unknown benchmark {}", name)
+            return RC.FAIL
+    results = {}
+    for name in benchmarks:
+        if name == "latency":
+            results[name] = bench_latency(args.pings)
+        else:
+            results[name] = globals()["bench_{}".format(name)](args.size)
+    results_show(results)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=4)
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = results_compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print_log(LOG.ERROR, "Regression: {}", regression)
+        if regressions:
+            return RC.FAIL
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
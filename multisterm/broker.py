@@ -0,0 +1,493 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    broker.py
+Description:
+    Serial Port owner broker. A single process opens the Serial port and
+    fan-out the received stream to any number of clients attached through
+    a Unix domain socket, so each byte is read from the device just once.
+    Clients send their writes as messages (length and priority header), that
+    are queued whole in a Serial writer, so writes of different clients never
+    interleave. When the write queue is full, the broker stops reading the
+    client socket until there is space (backpressure up to the writer).
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import errno
+import selectors
+import socket
+import time
+from os import path as os_path
+from os import makedirs as os_makedirs
+from os import remove as os_remove
+from fcntl import ioctl as fcntl_ioctl
+from struct import pack as struct_pack
+from struct import unpack as struct_unpack
+from termios import FIONREAD
+
+from constants import LOG, PRIO, CONST
+from auxiliar import print_log
+from framing import LengthPrefixSplitter
+from serialwriter import SerialWriter
+from metrics import REGISTRY, port_metrics
+from profiling import span
+
+###############################################################################
+### Auxiliar Functions
+
+def broker_socket_path(port):
+    '''Get the Unix socket path used by the broker of a Serial port.'''
+    port_name = os_path.realpath(port).strip("/").replace("/", "_")
+    return os_path.join(CONST.BROKER_SOCKET_DIR, "{}.sock".format(port_name))
+
+
+def broker_is_running(port):
+    '''Check if there is a broker alive serving the provided Serial port.'''
+    sock_path = broker_socket_path(port)
+    if not os_path.exists(sock_path):
+        return False
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(sock_path)
+    except OSError:
+        return False
+    finally:
+        sock.close()
+    return True
+
+###############################################################################
+### Ring Buffer
+
+class RingBuffer():
+    '''Bounded bytes ring buffer that overwrites oldest data when full.'''
+
+    def __init__(self, capacity):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._capacity = capacity
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def capacity(self):
+        '''Get ring buffer maximum number of bytes.'''
+        return self._capacity
+
+    def free(self):
+        '''Get the number of bytes that can be written without overwrite.'''
+        return self._capacity - self._size
+
+    def write(self, data):
+        '''Append data, return number of oldest bytes discarded to fit.'''
+        data_len = len(data)
+        if data_len >= self._capacity:
+            # Only the newest capacity bytes fit
+            discarded = self._size + data_len - self._capacity
+            self._view[:] = data[data_len-self._capacity:]
+            self._head = 0
+            self._size = self._capacity
+            return discarded
+        discarded = max(0, data_len - self.free())
+        if discarded:
+            self.consume(discarded)
+        tail = (self._head + self._size) % self._capacity
+        first = min(data_len, self._capacity - tail)
+        self._view[tail:tail+first] = data[:first]
+        if first < data_len:
+            self._view[:data_len-first] = data[first:]
+        self._size = self._size + data_len
+        return discarded
+
+    def peek(self):
+        '''Get a view of the oldest contiguous chunk of buffered bytes.'''
+        end = min(self._head + self._size, self._capacity)
+        return self._view[self._head:end]
+
+    def consume(self, num_bytes):
+        '''Discard oldest bytes from the buffer.'''
+        num_bytes = min(num_bytes, self._size)
+        self._head = (self._head + num_bytes) % self._capacity
+        self._size = self._size - num_bytes
+        if self._size == 0:
+            self._head = 0
+
+###############################################################################
+### Broker
+
+class BrokerClient():
+    '''Broker side state of an attached client.'''
+
+    def __init__(self, sock, buffer_size):
+        self.sock = sock
+        self.ring = RingBuffer(buffer_size)
+        self.connected_time = time.time()
+        self.bytes_sent = 0
+        self.bytes_dropped = 0
+        self.max_lag = 0
+        self.splitter = LengthPrefixSplitter(4)
+        self.write_pending = []
+        self.events = 0
+
+    def lag(self):
+        '''Number of received bytes pending to be sent to this client.'''
+        return len(self.ring)
+
+
+class SerialBroker():
+    '''Serial port owner that fan-out RX data to Unix socket clients.'''
+
+    def __init__(self, ser, sock_path, policy=CONST.BROKER_POLICY_TRUNCATE,
+            buffer_size=CONST.BROKER_CLIENT_BUFFER_SIZE,
+            stats_interval=CONST.BROKER_STATS_INTERVAL):
+        self.ser = ser
+        self.sock_path = sock_path
+        self.policy = policy
+        self.buffer_size = buffer_size
+        self.stats_interval = stats_interval
+        self.clients = {}
+        self.bytes_read = 0
+        self.bytes_dropped = 0
+        self.writer = None
+        self._port_metrics = port_metrics(ser.port)
+        labels = {"port": str(ser.port)}
+        REGISTRY.gauge("multisterm_broker_clients", "Broker attached clients",
+                labels, fn=lambda: len(self.clients))
+        REGISTRY.gauge("multisterm_broker_max_client_lag_bytes",
+                "Received bytes waiting to be sent to the slowest client",
+                labels, fn=lambda: max([client.lag() for client in
+                list(self.clients.values())] or [0]))
+        REGISTRY.counter("multisterm_broker_dropped_bytes_total",
+                "Received bytes dropped for slow clients", labels,
+                fn=lambda: self.bytes_dropped)
+        self._selector = None
+        self._server = None
+        self._running = False
+
+    def start(self):
+        '''Create the Unix socket server and register I/O sources.'''
+        sock_dir = os_path.dirname(self.sock_path)
+        if not os_path.exists(sock_dir):
+            os_makedirs(sock_dir, 0o775)
+        # Remove stale socket from a previous broker that did not clean up
+        if os_path.exists(self.sock_path):
+            os_remove(self.sock_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.sock_path)
+        self._server.listen(CONST.BROKER_MAX_PENDING_CONNECTIONS)
+        self._server.setblocking(False)
+        self.ser.timeout = 0
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._server, selectors.EVENT_READ, "server")
+        self._selector.register(self.ser.fileno(), selectors.EVENT_READ,
+                "serial")
+        self.writer = SerialWriter(self.ser)
+        self.writer.start()
+        self._running = True
+        print_log(LOG.INFO, "Broker listening at {}", self.sock_path)
+
+    def stop(self):
+        '''Disconnect all clients and release the Unix socket.'''
+        self._running = False
+        for sock in list(self.clients):
+            self._client_remove(sock)
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os_path.exists(self.sock_path):
+                os_remove(self.sock_path)
+
+    def run(self):
+        '''Broker main loop.'''
+        self.start()
+        last_stats = time.time()
+        try:
+            while self._running:
+                timeout = None
+                if self.stats_interval > 0:
+                    timeout = max(0, last_stats + self.stats_interval
+                            - time.time())
+                if self._clients_blocked():
+                    timeout = CONST.BROKER_WRITE_RETRY
+                for key, events in self._selector.select(timeout):
+                    if key.data == "server":
+                        self._client_accept(key.fileobj)
+                    elif key.data == "serial":
+                        self._serial_read()
+                    else:
+                        if events & selectors.EVENT_READ:
+                            self._client_read(key.fileobj)
+                        if (events & selectors.EVENT_WRITE) and \
+                                (key.fileobj in self.clients):
+                            self._client_send(key.fileobj)
+                if self._clients_blocked():
+                    self._clients_write_retry()
+                if (self.stats_interval > 0) and \
+                        (time.time() - last_stats >= self.stats_interval):
+                    last_stats = time.time()
+                    self.show_stats()
+        finally:
+            self.stop()
+
+    def stats(self):
+        '''Get per-client statistics.'''
+        stats = []
+        for client in self.clients.values():
+            stats.append({
+                "fd": client.sock.fileno(),
+                "lag": client.lag(),
+                "max_lag": client.max_lag,
+                "sent": client.bytes_sent,
+                "dropped": client.bytes_dropped,
+                "uptime": time.time() - client.connected_time
+            })
+        return stats
+
+    def show_stats(self):
+        '''Print broker, write queue and per-client statistics.'''
+        print("Broker: {} bytes read, {} clients".format(
+                self.bytes_read, len(self.clients)))
+        write_stats = self.writer.stats()
+        print("  writes: {} bytes, queue {} bytes (max {}), latency avg " \
+                "{:.3f} ms, p99 {:.3f} ms, {} backpressure events".format(
+                write_stats["bytes_written"], write_stats["queued_bytes"],
+                write_stats["max_queued_bytes"],
+                write_stats["latency_avg_ms"], write_stats["latency_p99_ms"],
+                write_stats["backpressure_events"]))
+        for stat in self.stats():
+            print("  client {}: lag {} (max {}), sent {}, dropped {}".format(
+                    stat["fd"], stat["lag"], stat["max_lag"], stat["sent"],
+                    stat["dropped"]))
+
+    def _serial_read(self):
+        '''Read all available bytes from the port and fan them out.'''
+        try:
+            with span("serial_read"):
+                data = self.ser.read(self.ser.in_waiting or 1)
+        except Exception as e:
+            self._port_metrics.read_errors.inc()
+            print_log(LOG.ERROR, str(e))
+            self._running = False
+            return
+        if not data:
+            return
+        self.bytes_read = self.bytes_read + len(data)
+        self._port_metrics.rx(len(data))
+        self._fan_out(data)
+
+    def _fan_out(self, data):
+        '''Queue received data to be sent to all clients.'''
+        for client in list(self.clients.values()):
+            self._client_queue(client, data)
+
+    def _client_queue(self, client, data):
+        '''Queue received data to be sent to a client (the slow clients
+        policy is applied if it does not fit).'''
+        was_empty = (len(client.ring) == 0)
+        discarded = client.ring.write(data)
+        if discarded:
+            client.bytes_dropped = client.bytes_dropped + discarded
+            self.bytes_dropped = self.bytes_dropped + discarded
+            if self.policy == CONST.BROKER_POLICY_DROP:
+                print_log(LOG.WARNING, "Client {} too slow, dropping it.",
+                        client.sock.fileno())
+                self._client_remove(client.sock)
+                return
+        client.max_lag = max(client.max_lag, client.lag())
+        if was_empty:
+            self._client_events_update(client)
+
+    def _client_accept(self, server):
+        '''Accept a new client connection.'''
+        try:
+            sock, _ = server.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self.clients[sock] = BrokerClient(sock, self.buffer_size)
+        self._client_events_update(self.clients[sock])
+        print_log(LOG.INFO, "Client {} attached.", sock.fileno())
+
+    def _client_remove(self, sock):
+        '''Detach a client.'''
+        if sock not in self.clients:
+            return
+        print_log(LOG.INFO, "Client {} detached.", sock.fileno())
+        client = self.clients.pop(sock)
+        if (self._selector is not None) and client.events:
+            self._selector.unregister(sock)
+        sock.close()
+
+    def _client_events_update(self, client):
+        '''Register the client socket for the events it can handle now:
+        read while its writes are not blocked and write while it has
+        pending RX data.'''
+        events = 0
+        if not client.write_pending:
+            events = events | selectors.EVENT_READ
+        if len(client.ring):
+            events = events | selectors.EVENT_WRITE
+        if events == client.events:
+            return
+        if client.events == 0:
+            self._selector.register(client.sock, events)
+        elif events == 0:
+            self._selector.unregister(client.sock)
+        else:
+            self._selector.modify(client.sock, events)
+        client.events = events
+
+    def _client_read(self, sock):
+        '''Forward data written by a client to the Serial port.'''
+        try:
+            data = sock.recv(CONST.BROKER_RECV_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = b''
+        if not data:
+            self._client_remove(sock)
+            return
+        client = self.clients[sock]
+        for message in client.splitter.feed(data):
+            # Empty messages have no priority byte (nothing to write)
+            if message:
+                client.write_pending.append(message)
+        self._client_write(client)
+
+    def _client_write(self, client):
+        '''Queue client complete messages in the Serial writer, stop
+        reading from the client if the queue is full.'''
+        while client.write_pending:
+            message = client.write_pending[0]
+            priority = min(message[0], PRIO.LOW)
+            if not self.writer.write(message[1:], priority, True, False):
+                break
+            client.write_pending.pop(0)
+        self._client_events_update(client)
+
+    def _clients_blocked(self):
+        '''Check if any client is waiting for write queue space.'''
+        for client in self.clients.values():
+            if client.write_pending:
+                return True
+        return False
+
+    def _clients_write_retry(self):
+        '''Retry to queue writes of clients blocked by a full queue.'''
+        for client in list(self.clients.values()):
+            if client.write_pending:
+                self._client_write(client)
+
+    def _client_send(self, sock):
+        '''Send pending RX bytes to a client without blocking.'''
+        client = self.clients[sock]
+        while len(client.ring):
+            try:
+                sent = sock.send(client.ring.peek())
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                self._client_remove(sock)
+                return
+            client.ring.consume(sent)
+            client.bytes_sent = client.bytes_sent + sent
+        self._client_events_update(client)
+
+###############################################################################
+### Client Serial-like Port
+
+class BrokerPort():
+    '''Serial-like object to communicate with a port through its broker.'''
+
+    def __init__(self, port, timeout=None):
+        self.port = port
+        self.timeout = timeout
+        self.write_timeout = None
+        self.priority = PRIO.NORMAL
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(broker_socket_path(port))
+
+    def isOpen(self):
+        '''Check if the broker connection is open.'''
+        return self._sock is not None
+
+    is_open = property(isOpen)
+
+    def fileno(self):
+        '''Get the connection file descriptor.'''
+        return self._sock.fileno()
+
+    @property
+    def in_waiting(self):
+        '''Number of received bytes available to be read.'''
+        raw = fcntl_ioctl(self._sock.fileno(), FIONREAD, b"\0\0\0\0")
+        return struct_unpack("I", raw)[0]
+
+    def read(self, size=1):
+        '''Read up to size bytes, waiting at most the configured timeout.'''
+        self._sock.settimeout(self.timeout)
+        try:
+            data = self._sock.recv(size)
+        except socket.timeout:
+            return b''
+        if not data:
+            raise OSError("Broker connection closed.")
+        return data
+
+    def read_until(self, expected=b'\n', size=None):
+        '''Read until an expected sequence is found, size or timeout.'''
+        line = bytearray()
+        while (size is None) or (len(line) < size):
+            c = self.read(1)
+            if not c:
+                break
+            line += c
+            if line.endswith(expected):
+                break
+        return bytes(line)
+
+    def write(self, data):
+        '''Send data to the broker to be written in the Serial port, as
+        messages written atomically (up to the write queue size each).'''
+        self._sock.settimeout(self.write_timeout)
+        for i in range(0, len(data), CONST.WRITE_QUEUE_SIZE):
+            message = data[i:i+CONST.WRITE_QUEUE_SIZE]
+            self._sock.sendall(struct_pack(">IB", len(message) + 1,
+                    self.priority) + message)
+        return len(data)
+
+    def flush(self):
+        '''Nothing to flush, data is sent immediately.'''
+        return
+
+    def reset_input_buffer(self):
+        '''Discard any received data pending to be read.'''
+        self._sock.setblocking(False)
+        try:
+            while self._sock.recv(CONST.BROKER_RECV_SIZE):
+                pass
+        except OSError:
+            pass
+
+    def close(self):
+        '''Detach from the broker.'''
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    capturebin.py
+Description:
+    Binary capture format. RX/TX chunks are stored as raw records with a
+    monotonic nanoseconds timestamp and a direction byte, and a companion
+    fixed width index file allows to find a time or a data byte offset in
+    huge captures through a binary search over a memory map.
+    Capture file layout:
+        header: magic (8 bytes), wall clock ns (u64), monotonic ns (u64)
+        record: monotonic ns (u64), direction (u8), length (u32), data
+    Index file layout (capture file path + ".idx"):
+        header: magic (8 bytes)
+        entry: monotonic ns (u64), record file offset (u64),
+               data offset (u64, data bytes stored before the record)
+    It can be executed to export a capture to text or hex dump:
+        python capturebin.py <CAPTURE_FILE> [-f text|hex] [-s <SECONDS>]
+               [-e <SECONDS>] [-o <OFFSET>]
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import mmap
+import time
+from struct import Struct
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from sys import stdout as sys_stdout
+from os import path as os_path
+from os import open as os_open
+from os import dup2 as os_dup2
+from os import devnull as os_devnull
+from os import O_WRONLY
+from argparse import ArgumentParser as argparse_ArgumentParser
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+from filesrw import create_parents_dirs, file_exists, file_rotate
+from capturelog import TextCaptureSink
+
+###############################################################################
+### Format Definitions
+
+CAPTURE_MAGIC = b"MSTCAP1\0"
+INDEX_MAGIC = b"MSTIDX1\0"
+
+FILE_HEADER = Struct("<8sQQ")
+RECORD_HEADER = Struct("<QBI")
+INDEX_ENTRY = Struct("<QQQ")
+
+###############################################################################
+### Binary Capture Sink
+
+class BinaryCaptureSink():
+    '''Binary capture file writer with its timestamps index.'''
+
+    def __init__(self, file_path, max_size=CONST.CAPTURE_ROTATE_SIZE,
+            max_time=CONST.CAPTURE_ROTATE_TIME,
+            backups=CONST.CAPTURE_ROTATE_BACKUPS,
+            index_interval=CONST.CAPTURE_INDEX_INTERVAL):
+        self.file_path = file_path
+        self.index_path = "{}.idx".format(file_path)
+        self.max_size = max_size
+        self.max_time = max_time
+        self.backups = backups
+        self.index_interval = index_interval
+        self._file = None
+        self._index = None
+        self._size = 0
+        self._data_offset = 0
+        self._last_indexed = None
+        self._open_time = 0
+
+    def open(self):
+        '''Open the capture file (a new one, previous file is rotated).'''
+        create_parents_dirs(self.file_path)
+        if file_exists(self.file_path):
+            self._rotate_files()
+        self._file = open(self.file_path, "wb",
+                buffering=CONST.CAPTURE_FLUSH_SIZE)
+        self._index = open(self.index_path, "wb")
+        self._file.write(FILE_HEADER.pack(CAPTURE_MAGIC, time.time_ns(),
+                time.monotonic_ns()))
+        self._index.write(INDEX_MAGIC)
+        self._size = FILE_HEADER.size
+        self._data_offset = 0
+        self._last_indexed = None
+        self._open_time = time.time()
+
+    def close(self):
+        '''Close the capture and index files.'''
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+
+    def flush(self):
+        '''Flush written data to the OS (capture first, so an index entry
+        never points beyond the capture file).'''
+        self._file.flush()
+        self._index.flush()
+
+    def write(self, records):
+        '''Write a batch of (timestamp, direction, data) records.'''
+        self._check_rotate()
+        out = []
+        index = []
+        for timestamp, direction, data in records:
+            if (self._last_indexed is None) or \
+                    (self._data_offset - self._last_indexed
+                        >= self.index_interval):
+                index.append(INDEX_ENTRY.pack(timestamp, self._size,
+                        self._data_offset))
+                self._last_indexed = self._data_offset
+            out.append(RECORD_HEADER.pack(timestamp, direction, len(data)))
+            out.append(data)
+            self._size = self._size + RECORD_HEADER.size + len(data)
+            self._data_offset = self._data_offset + len(data)
+        self._file.write(b"".join(out))
+        if index:
+            self._index.write(b"".join(index))
+
+    def _rotate_files(self):
+        '''Rotate capture and index files.'''
+        file_rotate(self.file_path, self.backups)
+        file_rotate(self.index_path, self.backups)
+
+    def _check_rotate(self):
+        '''Rotate the capture file if it is too big or too old.'''
+        rotate = False
+        if (self.max_size > 0) and (self._size >= self.max_size):
+            rotate = True
+        if (self.max_time > 0) and \
+                (time.time() - self._open_time >= self.max_time):
+            rotate = True
+        if rotate:
+            self.close()
+            self.open()
+
+###############################################################################
+### Binary Capture Reader
+
+class CaptureReader():
+    '''Memory mapped binary capture reader.'''
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = None
+        self._map = None
+        self._index_file = None
+        self._index = None
+        self._index_len = 0
+        # Opened files are released if the capture or its index is invalid
+        try:
+            self._open()
+        except BaseException:
+            self.close()
+            raise
+        if self._index is None:
+            print_log(LOG.WARNING, "Capture index not found, seeks will " \
+                    "scan the whole capture.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''Release capture memory maps and files.'''
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        if self._index_file is not None:
+            self._index_file.close()
+            self._index_file = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        '''Map the capture file and its index (if any).'''
+        self._file = open(self.file_path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < FILE_HEADER.size:
+            raise ValueError("{} is not a capture file.".format(
+                    self.file_path))
+        magic, self.wall_ns, self.monotonic_ns = \
+                FILE_HEADER.unpack_from(self._map, 0)
+        if magic != CAPTURE_MAGIC:
+            raise ValueError("{} is not a capture file.".format(
+                    self.file_path))
+        index_path = "{}.idx".format(self.file_path)
+        if file_exists(index_path) and os_path.getsize(index_path) > \
+                len(INDEX_MAGIC):
+            self._index_file = open(index_path, "rb")
+            self._index = mmap.mmap(self._index_file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+            if self._index[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+                raise ValueError("Invalid capture index {}.".format(
+                        index_path))
+            self._index_len = \
+                (len(self._index) - len(INDEX_MAGIC)) // INDEX_ENTRY.size
+
+    def wall_time(self, timestamp):
+        '''Convert a record monotonic timestamp to epoch seconds.'''
+        return (self.wall_ns + (timestamp - self.monotonic_ns)) / 1e9
+
+    def index_entry(self, i):
+        '''Get (timestamp, record offset, data offset) of an index entry.'''
+        return INDEX_ENTRY.unpack_from(self._index,
+                len(INDEX_MAGIC) + (i * INDEX_ENTRY.size))
+
+    def records(self, offset=FILE_HEADER.size, data_offset=0):
+        '''Iterate (timestamp, direction, data, data offset) records from a
+        record file offset (data is a memoryview into the capture map, it
+        must be released before closing the reader).'''
+        view = memoryview(self._map)
+        end = len(self._map)
+        try:
+            while offset + RECORD_HEADER.size <= end:
+                timestamp, direction, length = \
+                        RECORD_HEADER.unpack_from(self._map, offset)
+                start = offset + RECORD_HEADER.size
+                # Incomplete record (capture still being written or crash)
+                if start + length > end:
+                    break
+                yield (timestamp, direction, view[start:start+length],
+                        data_offset)
+                data_offset = data_offset + length
+                offset = start + length
+        finally:
+            view.release()
+
+    def _index_search(self, field, value):
+        '''Binary search the last index entry with field <= value.'''
+        low = 0
+        high = self._index_len
+        while low < high:
+            mid = (low + high) // 2
+            if self.index_entry(mid)[field] <= value:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0:
+            return (0, FILE_HEADER.size, 0)
+        return self.index_entry(low - 1)
+
+    def seek_time(self, timestamp):
+        '''Get the file offset and data offset of the first record with a
+        timestamp equal or greater than the provided one.'''
+        _, offset, data_offset = self._index_search(0, timestamp)
+        while offset + RECORD_HEADER.size <= len(self._map):
+            record_ts, _, length = RECORD_HEADER.unpack_from(self._map,
+                    offset)
+            if record_ts >= timestamp:
+                break
+            offset = offset + RECORD_HEADER.size + length
+            data_offset = data_offset + length
+        return (offset, data_offset)
+
+    def seek_offset(self, data_offset):
+        '''Get the file offset and data offset of the record that contains
+        the provided data byte offset.'''
+        _, offset, record_data_offset = self._index_search(2, data_offset)
+        while offset + RECORD_HEADER.size <= len(self._map):
+            _, _, length = RECORD_HEADER.unpack_from(self._map, offset)
+            if record_data_offset + length > data_offset:
+                break
+            offset = offset + RECORD_HEADER.size + length
+            record_data_offset = record_data_offset + length
+        return (offset, record_data_offset)
+
+###############################################################################
+### Export Functions
+
+def capture_export(reader, output, export_format="text", start=None,
+        end=None, data_offset=None):
+    '''Export a binary capture to a text or hex dump output stream.
+    Start and end are seconds from the capture beginning.'''
+    offset = FILE_HEADER.size
+    if data_offset is not None:
+        offset, _ = reader.seek_offset(data_offset)
+    if start is not None:
+        offset, _ = reader.seek_time(reader.monotonic_ns + int(start*1e9))
+    end_ts = None
+    if end is not None:
+        end_ts = reader.monotonic_ns + int(end*1e9)
+    text_sink = TextCaptureSink(None)
+    text_sink.open_stream(output)
+    text_sink.clock_offset = reader.wall_ns - reader.monotonic_ns
+    records = reader.records(offset)
+    try:
+        for timestamp, direction, data, _ in records:
+            try:
+                if (end_ts is not None) and (timestamp > end_ts):
+                    break
+                if export_format == "hex":
+                    output.write(text_sink.line_prefix(timestamp, direction))
+                    output.write(data.hex(" ").encode())
+                    output.write(b"\n")
+                else:
+                    text_sink.write([(timestamp, direction, data.tobytes())])
+            finally:
+                data.release()
+    finally:
+        records.close()
+    text_sink.close()
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    arg_parser = argparse_ArgumentParser()
+    arg_parser.add_argument("capture", help="Binary capture file to export",
+                            action='store', type=str)
+    arg_parser.add_argument("-f", "--format", help="Export format",
+                            action='store', type=str, default="text",
+                            choices=["text", "hex"])
+    arg_parser.add_argument("-s", "--start", action='store', type=float,
+                            help="Export from this second of the capture")
+    arg_parser.add_argument("-e", "--end", action='store', type=float,
+                            help="Export until this second of the capture")
+    arg_parser.add_argument("-o", "--offset", action='store', type=int,
+                            help="Export from this data byte offset")
+    args = arg_parser.parse_args(argv[1:])
+    try:
+        with CaptureReader(args.capture) as reader:
+            capture_export(reader, sys_stdout.buffer, args.format,
+                    args.start, args.end, args.offset)
+    except BrokenPipeError:
+        # Output closed (i.e. piped to head), discard pending stdout data
+        os_dup2(os_open(os_devnull, O_WRONLY), sys_stdout.fileno())
+    except (OSError, ValueError) as e:
+        print_log(LOG.ERROR, str(e))
+        return RC.FAIL
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
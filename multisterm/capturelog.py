@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    capturelog.py
+Description:
+    Serial communication capture logger. Received and transmitted data is
+    queued without blocking the caller and written by a background thread
+    to a persistent file handle, in batches, with size and time based
+    rotation. Text captures can keep their search index (see logsearch.py)
+    updated while logging, or be written as compressed blocks (see
+    capturezip.py).
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from datetime import datetime as _datetime
+from threading import Thread
+from queue import Queue, Empty, Full
+
+from constants import LOG, CONST, DIR
+from auxiliar import print_log
+from filesrw import create_parents_dirs, file_rotate
+from logsearch import CaptureIndex
+from metrics import REGISTRY
+from profiling import span
+
+###############################################################################
+### Capture Sinks
+
+class TextCaptureSink():
+    '''Text capture file, each line is tagged with timestamp and direction.'''
+
+    def __init__(self, file_path, max_size=CONST.CAPTURE_ROTATE_SIZE,
+            max_time=CONST.CAPTURE_ROTATE_TIME,
+            backups=CONST.CAPTURE_ROTATE_BACKUPS, index=False):
+        self.file_path = file_path
+        self.max_size = max_size
+        self.max_time = max_time
+        self.backups = backups
+        self.index = None
+        if index:
+            self.index = CaptureIndex(file_path)
+        self._file = None
+        self._size = 0
+        self._open_time = 0
+        self._line_dir = None
+        self._stream = False
+        self._ts_second = -1
+        self._ts_prefix = ""
+        self.clock_offset = 0
+
+    def open(self):
+        '''Open (append) the capture file.'''
+        create_parents_dirs(self.file_path)
+        self._file = open(self.file_path, "ab",
+                buffering=CONST.CAPTURE_FLUSH_SIZE)
+        self._size = self._file.tell()
+        self._open_time = time.time()
+        self._line_dir = None
+        self.clock_offset = time.time_ns() - time.monotonic_ns()
+        if self.index is not None:
+            self.index.load()
+
+    def open_stream(self, stream):
+        '''Use an already open binary stream as output (no rotation).'''
+        self._file = stream
+        self._stream = True
+        self.max_size = 0
+        self.max_time = 0
+        self._line_dir = None
+        self.clock_offset = time.time_ns() - time.monotonic_ns()
+
+    def close(self):
+        '''Close the capture file.'''
+        if self._file is not None:
+            self._end_line()
+            if self._stream:
+                self._file.flush()
+            else:
+                self._file.close()
+            self._file = None
+
+    def flush(self):
+        '''Flush written data to the OS.'''
+        self._file.flush()
+
+    def write(self, records):
+        '''Write a batch of (monotonic ns timestamp, direction, data)
+        records.'''
+        self._check_rotate()
+        out = []
+        for timestamp, direction, data in records:
+            if direction == DIR.MARK:
+                self._end_line(out)
+                out.append(self.line_prefix(timestamp, direction))
+                out.append(data)
+                out.append(b"\n")
+                continue
+            # Continue the current line if it was started by same direction
+            if (self._line_dir is not None) and (self._line_dir != direction):
+                self._end_line(out)
+            lines = data.split(b"\n")
+            last = len(lines) - 1
+            for i, line in enumerate(lines):
+                if i == last and not line:
+                    break
+                if self._line_dir is None:
+                    out.append(self.line_prefix(timestamp, direction))
+                    self._line_dir = direction
+                out.append(line)
+                if i != last:
+                    out.append(b"\n")
+                    self._line_dir = None
+        chunk = b"".join(out)
+        self._file.write(chunk)
+        self._size = self._size + len(chunk)
+        # Index each new complete block (the rotated logs indexes are
+        # rebuilt when searched)
+        if (self.index is not None) and \
+                (self._size - self.index.indexed_size >= self.index.block_size):
+            self._file.flush()
+            self.index.update()
+
+    def _end_line(self, out=None):
+        '''Terminate a pending incomplete line.'''
+        if self._line_dir is None:
+            return
+        self._line_dir = None
+        if out is None:
+            self._file.write(b"\n")
+        else:
+            out.append(b"\n")
+
+    def line_prefix(self, timestamp, direction):
+        '''Get line timestamp and direction tag (date text is just
+        formatted once per second).'''
+        second, nanoseconds = divmod(timestamp + self.clock_offset,
+                1000000000)
+        if second != self._ts_second:
+            self._ts_second = second
+            self._ts_prefix = _datetime.utcfromtimestamp(second).strftime(
+                    CONST.LOG_TIMESTAMP_FORMAT)
+        return "{}.{:03d} [{}] ".format(self._ts_prefix,
+                nanoseconds // 1000000, DIR.TEXT[direction]).encode()
+
+    def _check_rotate(self):
+        '''Rotate the capture file if it is too big or too old.'''
+        rotate = False
+        if (self.max_size > 0) and (self._size >= self.max_size):
+            rotate = True
+        if (self.max_time > 0) and \
+                (time.time() - self._open_time >= self.max_time):
+            rotate = True
+        if rotate:
+            self.close()
+            self._rotate_files()
+            self.open()
+
+    def _rotate_files(self):
+        '''Rotate the capture file.'''
+        file_rotate(self.file_path, self.backups)
+
+###############################################################################
+### Capture Logger
+
+class CaptureLogger():
+    '''Non-blocking capture logger with a background writer thread. The
+    writer thread can serve more sinks through capture channels.'''
+
+    def __init__(self, sink=None, queue_size=CONST.CAPTURE_QUEUE_SIZE,
+            flush_interval=CONST.CAPTURE_FLUSH_INTERVAL,
+            flush_size=CONST.CAPTURE_FLUSH_SIZE):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.bytes_logged = 0
+        self.bytes_dropped = 0
+        self._sinks = []
+        self._dropped = {}
+        self._queue = Queue(queue_size)
+        self._thread = None
+        if sink is not None:
+            self._sinks.append(sink)
+        REGISTRY.counter("multisterm_capture_bytes_total",
+                "Bytes written to the capture sinks",
+                fn=lambda: self.bytes_logged)
+        REGISTRY.counter("multisterm_capture_dropped_bytes_total",
+                "Bytes dropped because the capture writer is behind",
+                fn=lambda: self.bytes_dropped)
+        REGISTRY.gauge("multisterm_capture_queue_depth",
+                "Capture records waiting to be written",
+                fn=self._queue.qsize)
+        self._lag = REGISTRY.histogram("multisterm_capture_lag_seconds",
+                "Time the oldest record of each batch waited in the queue",
+                CONST.METRICS_LATENCY_BUCKETS)
+
+    def start(self):
+        '''Open the capture sinks and launch the writer thread.'''
+        for sink in self._sinks:
+            sink.open()
+        self._thread = Thread(target=self._th_writer)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Write all pending data, stop the writer thread and close sinks.'''
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        for sink in self._sinks:
+            sink.close()
+
+    def channel(self, sink):
+        '''Add a sink served by this logger writer thread and get the
+        channel to log into it.'''
+        if self._thread is not None:
+            sink.open()
+        self._sinks.append(sink)
+        return CaptureChannel(self, sink)
+
+    def log(self, direction, data, sink=None):
+        '''Queue data to be logged (never blocks, data is dropped and
+        counted if the writer can't keep up).'''
+        if sink is None:
+            sink = self.sink
+        try:
+            self._queue.put_nowait((sink, time.monotonic_ns(), direction,
+                    bytes(data)))
+        except Full:
+            self.bytes_dropped = self.bytes_dropped + len(data)
+            self._dropped[sink] = self._dropped.get(sink, 0) + len(data)
+
+    def log_rx(self, data):
+        '''Queue received data to be logged.'''
+        self.log(DIR.RX, data)
+
+    def log_tx(self, data):
+        '''Queue transmitted data to be logged.'''
+        self.log(DIR.TX, data)
+
+    def mark(self, text):
+        '''Queue a text marker line to be logged.'''
+        self.log(DIR.MARK, text.encode())
+
+    def _th_writer(self):
+        '''Capture writer thread.'''
+        pending = 0
+        last_flush = time.time()
+        running = True
+        while running:
+            timeout = max(0, last_flush + self.flush_interval - time.time())
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+                # Get all queued records to write them in a single batch
+                while len(batch) < CONST.CAPTURE_MAX_BATCH:
+                    batch.append(self._queue.get_nowait())
+            except Empty:
+                pass
+            if None in batch:
+                del batch[batch.index(None):]
+                running = False
+            if batch:
+                self._lag.observe((time.monotonic_ns() - batch[0][1]) / 1e9)
+            # Group records by sink
+            batches = {}
+            for sink, timestamp, direction, data in batch:
+                records = batches.setdefault(sink, [])
+                records.append((timestamp, direction, data))
+                pending = pending + len(data)
+                self.bytes_logged = self.bytes_logged + len(data)
+            while self._dropped:
+                sink, dropped = self._dropped.popitem()
+                batches.setdefault(sink, []).append((time.monotonic_ns(),
+                        DIR.MARK, "{} bytes dropped".format(dropped).encode()))
+            try:
+                with span("log_write"):
+                    for sink, records in batches.items():
+                        sink.write(records)
+                    if (pending >= self.flush_size) or (not running) or \
+                            (time.time() - last_flush >= self.flush_interval):
+                        for sink in self._sinks:
+                            sink.flush()
+                        pending = 0
+                        last_flush = time.time()
+            except Exception as e:
+                print_log(LOG.ERROR, "Capture write fail. {}", e)
+
+###############################################################################
+### Capture Channel
+
+class CaptureChannel():
+    '''Interface to log into one of the sinks of a capture logger.'''
+
+    def __init__(self, logger, sink):
+        self.logger = logger
+        self.sink = sink
+
+    def log(self, direction, data):
+        '''Queue data to be logged.'''
+        self.logger.log(direction, data, self.sink)
+
+    def log_rx(self, data):
+        '''Queue received data to be logged.'''
+        self.logger.log(DIR.RX, data, self.sink)
+
+    def log_tx(self, data):
+        '''Queue transmitted data to be logged.'''
+        self.logger.log(DIR.TX, data, self.sink)
+
+    def mark(self, text):
+        '''Queue a text marker line to be logged.'''
+        self.logger.log(DIR.MARK, text.encode(), self.sink)
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    capturezip.py
+Description:
+    Compressed text capture format. The text capture stream is split in
+    independently compressed blocks (gzip, bz2 or lzma from the standard
+    library, or zstd if it is available), cut by size (at a line end) or by
+    time, and compressed and written by a background thread. A companion
+    block table allows to decompress just the blocks of a time range or a
+    data offset range.
+    Capture file layout:
+        header: magic (8 bytes)
+        block: codec (u8), compressed size (u32), data size (u32),
+               first and last wall clock timestamps (f64), compressed data
+    Block table file layout (capture file path + ".blk"):
+        header: magic (8 bytes)
+        entry: block file offset (u64), data offset (u64, data bytes stored
+               before the block), compressed size (u32), data size (u32),
+               first and last wall clock timestamps (f64)
+    The block table is just an accelerator, blocks not found in it (i.e.
+    capture interrupted before the table was written) are recovered from
+    the blocks headers.
+    It can be executed to export a capture (or a part of it) to text:
+        python capturezip.py <CAPTURE_FILE> [-s <SECONDS>] [-e <SECONDS>]
+               [-o <OFFSET>] [-n <BYTES>] [--blocks]
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from bisect import bisect_right
+from datetime import datetime as _datetime
+from struct import Struct
+from struct import error as struct_error
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from sys import stdout as sys_stdout
+from os import path as os_path
+from os import open as os_open
+from os import dup2 as os_dup2
+from os import devnull as os_devnull
+from os import O_WRONLY
+from threading import Thread
+from queue import Queue
+from argparse import ArgumentParser as argparse_ArgumentParser
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+from filesrw import create_parents_dirs, file_exists, file_rotate
+from capturelog import TextCaptureSink
+
+###############################################################################
+### Format Definitions
+
+CAPTURE_MAGIC = b"MSTZCAP1"
+TABLE_MAGIC = b"MSTZTBL1"
+
+BLOCK_HEADER = Struct("<BxxxIIdd")
+TABLE_ENTRY = Struct("<QQIIdd")
+
+# Block codec identifiers
+CODEC_IDS = {
+    "gzip": 1,
+    "bz2": 2,
+    "lzma": 3,
+    "zstd": 4
+}
+
+###############################################################################
+### Codec Functions
+
+def codec_functions(codec):
+    '''Get the (compress, decompress) functions of a codec or raise
+    ValueError if it is unknown or not available.'''
+    if codec == "gzip":
+        import gzip
+        return (lambda data: gzip.compress(data,
+                CONST.CAPTURE_COMPRESS_LEVEL, mtime=0), gzip.decompress)
+    if codec == "bz2":
+        import bz2
+        return (bz2.compress, bz2.decompress)
+    if codec == "lzma":
+        import lzma
+        return (lzma.compress, lzma.decompress)
+    if codec == "zstd":
+        try:
+            # Standard library since Python 3.14
+            from compression import zstd
+            return (zstd.compress, zstd.decompress)
+        except ImportError:
+            pass
+        try:
+            import zstandard
+            return (zstandard.ZstdCompressor().compress,
+                    zstandard.ZstdDecompressor().decompress)
+        except ImportError:
+            raise ValueError("zstd codec not available (it requires " \
+                    "Python 3.14 or zstandard package)")
+    raise ValueError("Unknown compression codec {}".format(codec))
+
+
+def codec_available(codec):
+    '''Check if a codec can be used.'''
+    try:
+        codec_functions(codec)
+    except ValueError:
+        return False
+    return True
+
+
+def codec_select(codec):
+    '''Get the codec to use for a requested one ("auto" is zstd if it is
+    available or the fallback codec otherwise).'''
+    if codec != CONST.CAPTURE_COMPRESS_AUTO:
+        return codec
+    if codec_available("zstd"):
+        return "zstd"
+    return CONST.CAPTURE_COMPRESS_FALLBACK
+
+###############################################################################
+### Block Writer
+
+class CompressedBlockWriter():
+    '''Binary stream that splits written data in blocks, compressed and
+    written to the capture file by a background thread.'''
+
+    def __init__(self, file_path, codec=CONST.CAPTURE_COMPRESS_CODEC,
+            block_size=CONST.CAPTURE_BLOCK_SIZE,
+            block_time=CONST.CAPTURE_BLOCK_TIME):
+        self.file_path = file_path
+        self.table_path = "{}.blk".format(file_path)
+        self.codec = codec_select(codec)
+        self.block_size = block_size
+        self.block_time = block_time
+        self.compressed_size = 0
+        self._codec_id = CODEC_IDS[self.codec]
+        self._compress = codec_functions(self.codec)[0]
+        self._file = None
+        self._table = None
+        self._pending = []
+        self._pending_size = 0
+        self._block_start = 0
+        self._first_ts = None
+        self._last_ts = None
+        self._data_offset = 0
+        self._file_offset = 0
+        self._queue = Queue(CONST.CAPTURE_BLOCK_QUEUE_SIZE)
+        self._thread = None
+
+    def open(self):
+        '''Create the capture and block table files and launch the
+        compressor thread.'''
+        self._file = open(self.file_path, "wb")
+        self._table = open(self.table_path, "wb")
+        self._file.write(CAPTURE_MAGIC)
+        self._table.write(TABLE_MAGIC)
+        self._file_offset = len(CAPTURE_MAGIC)
+        self._data_offset = 0
+        self.compressed_size = 0
+        self._thread = Thread(target=self._th_compressor)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        '''Compress pending data and wait for all blocks to be written.'''
+        if self._thread is None:
+            return
+        self._block_cut(False)
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        self._table.close()
+        print_log(LOG.DEBUG, "Capture {} compressed {} to {} bytes.",
+                self.file_path, self._data_offset, self.compressed_size)
+
+    def stamp(self, first_ts, last_ts):
+        '''Set the wall clock timestamps of the data to be written.'''
+        if self._first_ts is None:
+            self._first_ts = first_ts
+        self._last_ts = last_ts
+
+    def write(self, data):
+        '''Add data to the current block (cut at the last line end when the
+        block size is reached).'''
+        if not self._pending:
+            self._block_start = time.monotonic()
+        self._pending.append(data)
+        self._pending_size = self._pending_size + len(data)
+        if self._pending_size >= self.block_size:
+            self._block_cut(True)
+
+    def flush(self):
+        '''Cut the current block if it is older than the block time (data
+        is written to the OS by the compressor thread).'''
+        if self._pending and \
+                (time.monotonic() - self._block_start >= self.block_time):
+            self._block_cut(False)
+
+    def tell(self):
+        '''Get the number of data bytes written.'''
+        return self._data_offset + self._pending_size
+
+    def _block_cut(self, line_aligned):
+        '''Queue the current block to be compressed (the data after its
+        last line end is kept for the next block if line aligned).'''
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        remainder = b""
+        if line_aligned:
+            cut = data.rfind(b"\n") + 1
+            if cut > 0:
+                remainder = data[cut:]
+                data = data[:cut]
+        # Blocks the compressor is behind on make the capture writer wait
+        self._queue.put((self._data_offset, self._first_ts or time.time(),
+                self._last_ts or time.time(), data))
+        self._data_offset = self._data_offset + len(data)
+        self._pending = []
+        self._pending_size = 0
+        self._first_ts = None
+        if remainder:
+            self._pending.append(remainder)
+            self._pending_size = len(remainder)
+            self._first_ts = self._last_ts
+            self._block_start = time.monotonic()
+
+    def _th_compressor(self):
+        '''Block compressor thread.'''
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            data_offset, first_ts, last_ts, data = block
+            try:
+                compressed = self._compress(data)
+                self._file.write(BLOCK_HEADER.pack(self._codec_id,
+                        len(compressed), len(data), first_ts, last_ts))
+                self._file.write(compressed)
+                self._file.flush()
+                # Table entry written after its block, so it never points
+                # beyond the capture file
+                self._table.write(TABLE_ENTRY.pack(self._file_offset,
+                        data_offset, len(compressed), len(data), first_ts,
+                        last_ts))
+                self._table.flush()
+                self._file_offset = self._file_offset + \
+                        BLOCK_HEADER.size + len(compressed)
+                self.compressed_size = self.compressed_size + \
+                        len(compressed)
+            except Exception as e:
+                print_log(LOG.ERROR, "Capture block write fail. {}", e)
+
+###############################################################################
+### Compressed Capture Sink
+
+class CompressedCaptureSink(TextCaptureSink):
+    '''Text capture written as compressed blocks.'''
+
+    def __init__(self, file_path, codec=CONST.CAPTURE_COMPRESS_CODEC,
+            max_size=CONST.CAPTURE_ROTATE_SIZE,
+            max_time=CONST.CAPTURE_ROTATE_TIME,
+            backups=CONST.CAPTURE_ROTATE_BACKUPS,
+            block_size=CONST.CAPTURE_BLOCK_SIZE,
+            block_time=CONST.CAPTURE_BLOCK_TIME):
+        TextCaptureSink.__init__(self, file_path, max_size, max_time,
+                backups)
+        self.table_path = "{}.blk".format(file_path)
+        self.codec = codec_select(codec)
+        self.block_size = block_size
+        self.block_time = block_time
+        # Check the codec is available before the capture starts
+        codec_functions(self.codec)
+
+    def open(self):
+        '''Open the capture file (a new one, previous file is rotated).'''
+        create_parents_dirs(self.file_path)
+        if file_exists(self.file_path):
+            self._rotate_files()
+        self._file = CompressedBlockWriter(self.file_path, self.codec,
+                self.block_size, self.block_time)
+        self._file.open()
+        self._size = 0
+        self._open_time = time.time()
+        self._line_dir = None
+        self.clock_offset = time.time_ns() - time.monotonic_ns()
+
+    def write(self, records):
+        '''Write a batch of (monotonic ns timestamp, direction, data)
+        records.'''
+        self._check_rotate()
+        if records:
+            self._file.stamp((records[0][0] + self.clock_offset) / 1e9,
+                    (records[-1][0] + self.clock_offset) / 1e9)
+        TextCaptureSink.write(self, records)
+
+    def _rotate_files(self):
+        '''Rotate capture and block table files.'''
+        file_rotate(self.file_path, self.backups)
+        file_rotate(self.table_path, self.backups)
+
+###############################################################################
+### Compressed Capture Reader
+
+class CaptureBlock():
+    '''Block table entry of a compressed capture.'''
+
+    __slots__ = ("offset", "data_offset", "compressed_size", "size",
+            "first_ts", "last_ts")
+
+    def __init__(self, offset, data_offset, compressed_size, size, first_ts,
+            last_ts):
+        self.offset = offset
+        self.data_offset = data_offset
+        self.compressed_size = compressed_size
+        self.size = size
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+
+
+class CompressedCaptureReader():
+    '''Compressed capture reader, that decompresses just the blocks it
+    needs.'''
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.blocks = []
+        self._decompress = {}
+        self._file = open(file_path, "rb")
+        if self._file.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            self.close()
+            raise ValueError("{} is not a compressed capture file.".format(
+                    file_path))
+        self._table_load("{}.blk".format(file_path))
+        self._blocks_recover()
+        self._data_offsets = [block.data_offset for block in self.blocks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''Close the capture file.'''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def size(self):
+        '''Get the capture data size.'''
+        if not self.blocks:
+            return 0
+        return self.blocks[-1].data_offset + self.blocks[-1].size
+
+    def blocks_in_time_range(self, start=None, end=None):
+        '''Get the blocks with data in a wall clock timestamps range.'''
+        return [block for block in self.blocks
+                if ((start is None) or (block.last_ts >= start))
+                and ((end is None) or (block.first_ts <= end))]
+
+    def blocks_in_range(self, offset, size=None):
+        '''Get the blocks with data in a data bytes range.'''
+        i = max(0, bisect_right(self._data_offsets, offset) - 1)
+        blocks = []
+        for block in self.blocks[i:]:
+            if (size is not None) and (block.data_offset >= offset + size):
+                break
+            blocks.append(block)
+        return blocks
+
+    def block_read(self, block):
+        '''Get the decompressed data of a block.'''
+        self._file.seek(block.offset)
+        codec_id, compressed_size, size, _, _ = BLOCK_HEADER.unpack(
+                self._file.read(BLOCK_HEADER.size))
+        data = self._file.read(compressed_size)
+        return self._codec_decompress(codec_id)(data)
+
+    def read(self, offset, size=None):
+        '''Get the data of a data bytes range.'''
+        out = []
+        for block in self.blocks_in_range(offset, size):
+            data = self.block_read(block)
+            start = max(0, offset - block.data_offset)
+            stop = len(data)
+            if size is not None:
+                stop = min(stop, offset + size - block.data_offset)
+            out.append(data[start:stop])
+        return b"".join(out)
+
+    def _codec_decompress(self, codec_id):
+        '''Get the decompress function of a block codec.'''
+        if codec_id not in self._decompress:
+            for codec, known_id in CODEC_IDS.items():
+                if known_id == codec_id:
+                    self._decompress[codec_id] = codec_functions(codec)[1]
+                    break
+            else:
+                raise ValueError("Unknown block codec {}".format(codec_id))
+        return self._decompress[codec_id]
+
+    def _table_load(self, table_path):
+        '''Load the block table entries.'''
+        if not file_exists(table_path):
+            print_log(LOG.WARNING, "Capture block table not found, " \
+                    "recovering it from the capture blocks.")
+            return
+        with open(table_path, "rb") as f:
+            table = f.read()
+        if table[:len(TABLE_MAGIC)] != TABLE_MAGIC:
+            print_log(LOG.WARNING, "Invalid capture block table {}.",
+                    table_path)
+            return
+        for entry in TABLE_ENTRY.iter_unpack(table[len(TABLE_MAGIC):
+                len(table) - ((len(table) - len(TABLE_MAGIC))
+                    % TABLE_ENTRY.size)]):
+            self.blocks.append(CaptureBlock(*entry))
+
+    def _blocks_recover(self):
+        '''Add the complete blocks written after the last table entry.'''
+        offset = len(CAPTURE_MAGIC)
+        data_offset = 0
+        if self.blocks:
+            last = self.blocks[-1]
+            offset = last.offset + BLOCK_HEADER.size + last.compressed_size
+            data_offset = last.data_offset + last.size
+        file_size = os_path.getsize(self.file_path)
+        while offset + BLOCK_HEADER.size <= file_size:
+            self._file.seek(offset)
+            try:
+                _, compressed_size, size, first_ts, last_ts = \
+                        BLOCK_HEADER.unpack(self._file.read(
+                            BLOCK_HEADER.size))
+            except struct_error:
+                break
+            # Incomplete block (capture still being written or crash)
+            if offset + BLOCK_HEADER.size + compressed_size > file_size:
+                break
+            self.blocks.append(CaptureBlock(offset, data_offset,
+                    compressed_size, size, first_ts, last_ts))
+            offset = offset + BLOCK_HEADER.size + compressed_size
+            data_offset = data_offset + size
+
+###############################################################################
+### Export Functions
+
+def line_timestamp(wall_time):
+    '''Get the log line timestamp text of a wall clock time.'''
+    second, fraction = divmod(wall_time, 1)
+    return "{}.{:03d}".format(_datetime.utcfromtimestamp(second).strftime(
+            CONST.LOG_TIMESTAMP_FORMAT), int(fraction * 1000)).encode()
+
+
+def capture_export(reader, output, start=None, end=None, offset=None,
+        size=None):
+    '''Export a compressed capture to a text output stream, decompressing
+    just the blocks of a time range (seconds from the capture beginning)
+    or a data bytes range.'''
+    if offset is not None:
+        output.write(reader.read(offset, size))
+        return
+    if not reader.blocks:
+        return
+    capture_start = reader.blocks[0].first_ts
+    start_ts = None if start is None else capture_start + start
+    end_ts = None if end is None else capture_start + end
+    start_text = None if start_ts is None else line_timestamp(start_ts)
+    end_text = None if end_ts is None else line_timestamp(end_ts)
+    for block in reader.blocks_in_time_range(start_ts, end_ts):
+        data = reader.block_read(block)
+        # Blocks at the range limits are filtered by lines timestamps
+        if ((start_ts is None) or (block.first_ts >= start_ts)) and \
+                ((end_ts is None) or (block.last_ts <= end_ts)):
+            output.write(data)
+            continue
+        for line in data.splitlines(True):
+            timestamp = line[:len(b"YYYY-mm-dd_HH:MM:SS.mmm")]
+            if (start_text is not None) and (timestamp < start_text):
+                continue
+            if (end_text is not None) and (timestamp > end_text):
+                return
+            output.write(line)
+
+
+def capture_blocks_show(reader, output):
+    '''Show the block table of a compressed capture.'''
+    output.write("{:>6} {:>14} {:>12} {:>10} {:>8}  {}\n".format("BLOCK",
+            "DATA_OFFSET", "SIZE", "COMPRESSED", "RATIO", "TIME RANGE"))
+    for i, block in enumerate(reader.blocks):
+        output.write("{:>6} {:>14} {:>12} {:>10} {:>8.2f}  {} - {}\n".format(
+                i, block.data_offset, block.size, block.compressed_size,
+                block.size / max(1, block.compressed_size),
+                line_timestamp(block.first_ts).decode(),
+                line_timestamp(block.last_ts).decode()))
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    arg_parser = argparse_ArgumentParser()
+    arg_parser.add_argument("capture", help="Compressed capture file to " \
+                            "export", action='store', type=str)
+    arg_parser.add_argument("-s", "--start", action='store', type=float,
+                            help="Export from this second of the capture")
+    arg_parser.add_argument("-e", "--end", action='store', type=float,
+                            help="Export until this second of the capture")
+    arg_parser.add_argument("-o", "--offset", action='store', type=int,
+                            help="Export from this data byte offset")
+    arg_parser.add_argument("-n", "--size", action='store', type=int,
+                            help="Export this number of data bytes (from " \
+                            "the data byte offset)")
+    arg_parser.add_argument("--blocks", action='store_true',
+                            help="Show the capture block table")
+    args = arg_parser.parse_args(argv[1:])
+    if (args.size is not None) and (args.offset is None):
+        args.offset = 0
+    try:
+        with CompressedCaptureReader(args.capture) as reader:
+            if args.blocks:
+                capture_blocks_show(reader, sys_stdout)
+            else:
+                capture_export(reader, sys_stdout.buffer, args.start,
+                        args.end, args.offset, args.size)
+    except BrokenPipeError:
+        # Output closed (i.e. piped to head), discard pending stdout data
+        os_dup2(os_open(os_devnull, O_WRONLY), sys_stdout.fileno())
+    except (OSError, ValueError) as e:
+        print_log(LOG.ERROR, str(e))
+        return RC.FAIL
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
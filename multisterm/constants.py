@@ -35,6 +35,22 @@ class LOG():
     ERROR = 4
 
 
+# Capture data directions
+class DIR():
+    RX = 0
+    TX = 1
+    MARK = 2
+    TEXT = ["RX", "TX", "MARK"]
+
+
+# Serial write priority classes
+class PRIO():
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+    TEXT = ["HIGH", "NORMAL", "LOW"]
+
+
 # Constants
 class CONST():
 
@@ -44,6 +60,12 @@ class CONST():
     # Log timestamp format
     LOG_TIMESTAMP_FORMAT = "%Y-%m-%d_%H:%M:%S"
 
+    # Output log messages from a background thread
+    LOG_ASYNC = False
+
+    # Asynchronous log maximum pending messages
+    LOG_ASYNC_QUEUE_SIZE = 4096
+
     OPTIONS = \
     [
         "-h", "--help",
@@ -53,30 +75,334 @@ class CONST():
         "-v", "--version"
     ]
 
-    # Common Serial BaudRates
+    # Common Serial BaudRates (sorted from most to less likely to be used)
     SERIAL_COMMON_BAUDS = \
     [
-        115200, 19200, 9600, 1200, 2400, 4800,
-        50, 75, 110, 134, 150, 200, 300, 600,
-        1800, 19200, 38400, 57600, 230400,
-        460800, 500000, 576000, 921600
+        115200, 9600, 57600, 38400, 19200, 230400, 460800, 921600,
+        4800, 2400, 1200, 500000, 576000, 1800, 600, 300, 200, 150,
+        134, 110, 75, 50
     ]
 
-    # Common human texts characters
-    SERIAL_AUTODETECT_ASCII_LIST = \
-    [
-        'a', 'b', 'c', 'd', 'e', 'f', 'g', 'h', 'i', 'j', 'k', 'l',
-        'm', 'n', 'o', 'p', 'q', 'r', 's', 't', 'u', 'v', 'w', 'x',
-        'y', 'z',
-        'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L',
-        'M', 'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X',
-        'Y', 'Z',
-        '0', '1', '2', '3', '4', '5', '6', '7', '8', '9'
-    ]
+    # Serial autodetection time to listen for data at each BaudRate (seconds)
+    SERIAL_AUTODETECT_LISTEN_TIME = 0.25
+
+    # Serial autodetection minimum and maximum bytes to score
+    SERIAL_AUTODETECT_MIN_BYTES = 5
+    SERIAL_AUTODETECT_MAX_BYTES = 256
+
+    # Serial autodetection expected text lines length range
+    SERIAL_AUTODETECT_MIN_LINE = 2
+    SERIAL_AUTODETECT_MAX_LINE = 512
+
+    # Serial autodetection score to stop checking more BaudRates
+    SERIAL_AUTODETECT_CONFIDENT_SCORE = 0.9
+
+    # Serial autodetection minimum score to accept a BaudRate
+    SERIAL_AUTODETECT_MIN_SCORE = 0.7
+
+    # Detected BaudRates cache file
+    BAUDS_CACHE_FILE = os_path.join(os_path.expanduser("~"), ".cache",
+            "multisterm", "bauds.json")
+
+    # Detected BaudRates cache entries expiration time (seconds)
+    BAUDS_CACHE_TTL = 30 * 24 * 60 * 60
 
     # Serial autodetection dummy bytes string to write
     SERIAL_AUTODETECT_BAUDS_SEND = "\r\na2sf6h8q9\r\n"
 
+    # Broker Unix sockets directory
+    BROKER_SOCKET_DIR = "/tmp/multisterm"
+
+    # Broker slow clients policies (truncate oldest data or drop client)
+    BROKER_POLICY_TRUNCATE = "truncate"
+    BROKER_POLICY_DROP = "drop"
+
+    # Broker per-client RX ring buffer size (bytes)
+    BROKER_CLIENT_BUFFER_SIZE = 1048576
+
+    # Broker clients statistics show interval (seconds, 0 to disable)
+    BROKER_STATS_INTERVAL = 10
+
+    # Broker maximum number of pending connections to accept
+    BROKER_MAX_PENDING_CONNECTIONS = 32
+
+    # Broker maximum bytes to receive from a client in each read
+    BROKER_RECV_SIZE = 4096
+
+    # Broker time to retry queuing writes of clients blocked by a full
+    # write queue (seconds)
+    BROKER_WRITE_RETRY = 0.01
+
+    # Network bridge default listen address (all interfaces)
+    NET_DEFAULT_HOST = "0.0.0.0"
+
+    # Network bridge slow clients default policy
+    NET_POLICY = BROKER_POLICY_DROP
+
+    # Network bridge per-client RX buffer size (bytes)
+    NET_CLIENT_BUFFER_SIZE = 262144
+
+    # Network bridge clients sockets kernel send buffer size (bytes)
+    NET_SOCKET_SEND_BUFFER = 65536
+
+    # Network bridge client pending bytes to batch its sends (bulk stream)
+    NET_BULK_SIZE = 4096
+
+    # Network bridge RFC 2217 modem lines check interval (seconds)
+    NET_MODEM_CHECK_INTERVAL = 1.0
+
+    # Event loop read interval of ports without file descriptor (seconds)
+    LOOP_POLL_INTERVAL = 0.01
+
+    # Shared memory RX ring number of slots and slot data size (bytes)
+    SHM_RING_SLOTS = 2048
+    SHM_RING_SLOT_SIZE = 4096
+
+    # Shared memory ring taps time to wait for new data (seconds)
+    SHM_POLL_INTERVAL = 0.005
+
+    # Sessions received chunks queue size (iterator interface)
+    SESSION_QUEUE_SIZE = 1024
+
+    # Sessions loop thread calls check period (seconds)
+    SESSION_CALL_TIMEOUT = 0.1
+
+    # Transactions default expected response end pattern ("re:" prefix for
+    # regular expressions) and command end of line
+    TRANSACTION_EXPECT = "\n"
+    TRANSACTION_EOL = "\n"
+
+    # Transactions default response timeout and its check period (seconds)
+    TRANSACTION_TIMEOUT = 5.0
+    TRANSACTION_TIMEOUT_RESOLUTION = 0.01
+
+    # Transactions batch default number of commands in flight
+    TRANSACTION_DEPTH = 1
+
+    # Transactions latency samples kept for statistics
+    TRANSACTION_LATENCY_SAMPLES = 65536
+
+    # Serial write queue maximum pending bytes
+    WRITE_QUEUE_SIZE = 65536
+
+    # Serial write maximum bytes of messages joined in a single write
+    WRITE_COALESCE_SIZE = 4096
+
+    # Serial write latency samples kept for statistics
+    WRITE_LATENCY_SAMPLES = 1024
+
+    # Serial write maximum time to send pending messages at stop (seconds)
+    WRITE_DRAIN_TIMEOUT = 2.0
+
+    # Capture logger maximum number of queued chunks pending to be written
+    CAPTURE_QUEUE_SIZE = 8192
+
+    # Capture logger maximum number of chunks to write in a single batch
+    CAPTURE_MAX_BATCH = 1024
+
+    # Capture logger flush to disk interval (seconds) and size (bytes)
+    CAPTURE_FLUSH_INTERVAL = 1.0
+    CAPTURE_FLUSH_SIZE = 65536
+
+    # Capture file rotation size (bytes) and time (seconds), 0 to disable
+    CAPTURE_ROTATE_SIZE = 0
+    CAPTURE_ROTATE_TIME = 0
+
+    # Capture file number of rotated files to keep
+    CAPTURE_ROTATE_BACKUPS = 5
+
+    # Capture log file formats
+    CAPTURE_FORMAT_TEXT = "text"
+    CAPTURE_FORMAT_BINARY = "binary"
+
+    # Binary capture data bytes between index entries
+    CAPTURE_INDEX_INTERVAL = 4096
+
+    # Compressed capture codecs and default codec ("auto" selects zstd if
+    # it is available or the fallback codec otherwise)
+    CAPTURE_COMPRESS_AUTO = "auto"
+    CAPTURE_COMPRESS_CODECS = ["auto", "gzip", "bz2", "lzma", "zstd"]
+    CAPTURE_COMPRESS_CODEC = "auto"
+    CAPTURE_COMPRESS_FALLBACK = "gzip"
+
+    # Compressed capture gzip compression level
+    CAPTURE_COMPRESS_LEVEL = 6
+
+    # Compressed capture block maximum size (bytes) and time (seconds)
+    CAPTURE_BLOCK_SIZE = 1048576
+    CAPTURE_BLOCK_TIME = 60
+
+    # Compressed capture maximum number of blocks pending to be compressed
+    CAPTURE_BLOCK_QUEUE_SIZE = 4
+
+    # Capture log search index block size (bytes)
+    SEARCH_BLOCK_SIZE = 1048576
+
+    # Capture log search index bloom filter bits per block (0 to disable)
+    SEARCH_BLOOM_BITS = 65536
+
+    # Virtual port generated text lines size (bytes)
+    VPORT_LINE_SIZE = 80
+
+    # Virtual port generated binary chunks size (bytes)
+    VPORT_CHUNK_SIZE = 4096
+
+    # Virtual port generated bursts size (bytes) and gap between them (s)
+    VPORT_BURST_SIZE = 16384
+    VPORT_BURST_GAP = 0.5
+
+    # Virtual port device thread maximum wait time (seconds)
+    VPORT_POLL_TIME = 0.01
+
+    # Virtual port maximum bytes to read from the pty in each read
+    VPORT_READ_SIZE = 65536
+
+    # Benchmarks Serial port BaudRate (virtual port, it doesn't limit speed)
+    BENCH_BAUDS = 921600
+
+    # Benchmarks throughput bytes and latency round-trips
+    BENCH_SIZE = 10000000
+    BENCH_PINGS = 1000
+
+    # Benchmarks TX write size (bytes)
+    BENCH_TX_CHUNK_SIZE = 64
+
+    # Benchmarks time without data to consider the rest lost (seconds)
+    BENCH_IDLE_TIMEOUT = 2.0
+
+    # Benchmarks allowed regression ratio against a baseline
+    BENCH_TOLERANCE = 0.2
+
+    # Benchmarks number of literal and regex patterns of the triggers engine
+    BENCH_TRIGGERS_PATTERNS = 50
+
+    # Multi-port mode maximum number of ports BaudRate detections at a time
+    MULTIPORT_DETECT_WORKERS = 16
+
+    # Multi-port mode time to show an incomplete received line (seconds)
+    MULTIPORT_LINE_TIMEOUT = 0.2
+
+    # Serial maximum bytes to read at once from a non-blocking port
+    SERIAL_READ_SIZE = 65536
+
+    # Serial flow control modes (hardware RTS/CTS or software XON/XOFF)
+    SERIAL_FLOW_CONTROLS = ["rtscts", "xonxoff"]
+
+    # Serial port readiness strategies after open (no wait, fixed delay,
+    # wait for the first received byte or for a banner/prompt)
+    READY_NONE = "none"
+    READY_DELAY = "delay"
+    READY_BYTE = "byte"
+    READY_BANNER = "banner"
+    READY_STRATEGIES = [READY_NONE, READY_DELAY, READY_BYTE, READY_BANNER]
+
+    # Serial port readiness maximum wait time (seconds)
+    READY_TIMEOUT = 5.0
+
+    # Serial port readiness reads timeout (seconds)
+    READY_POLL_TIME = 0.1
+
+    # Hot-plug reopen retry interval of a failed port (seconds)
+    HOTPLUG_RETRY_INTERVAL = 0.5
+
+    # Hot-plug maximum bytes of device directory events to read at once
+    HOTPLUG_EVENTS_READ_SIZE = 4096
+
+    # File transfer raw mode chunk size (bytes)
+    TRANSFER_CHUNK_SIZE = 4096
+
+    # File transfer progress display update interval (seconds)
+    TRANSFER_PROGRESS_INTERVAL = 0.5
+
+    # XMODEM/YMODEM time to wait for the receiver start request (seconds)
+    TRANSFER_START_TIMEOUT = 60
+
+    # XMODEM/YMODEM time to wait for a block response (seconds)
+    TRANSFER_ACK_TIMEOUT = 10
+
+    # XMODEM/YMODEM maximum transmissions of a block
+    TRANSFER_MAX_RETRIES = 10
+
+    # Received data display modes
+    DISPLAY_MODE_TEXT = "text"
+    DISPLAY_MODE_HEX = "hex"
+    DISPLAY_MODE_MIXED = "mixed"
+    DISPLAY_MODE_ESCAPE = "escape"
+    DISPLAY_MODES = [DISPLAY_MODE_TEXT, DISPLAY_MODE_HEX, DISPLAY_MODE_MIXED,
+            DISPLAY_MODE_ESCAPE]
+
+    # Hex dump display default bytes per row
+    DISPLAY_ROW_BYTES = 16
+
+    # Terminal write input modes (text or hex bytes)
+    INPUT_MODES = ["text", "hex"]
+
+    # Terminal output maximum flushes per second
+    OUTPUT_FLUSH_RATE = 60
+
+    # Terminal output size to flush without waiting the flush rate (bytes)
+    OUTPUT_FLUSH_SIZE = 65536
+
+    # Terminal output maximum pending bytes, more output is suppressed
+    OUTPUT_MAX_PENDING = 1048576
+
+    # Metrics sizes histograms buckets (bytes)
+    METRICS_SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536,
+            262144, 1048576)
+
+    # Metrics latencies histograms buckets (seconds)
+    METRICS_LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025,
+            0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+    # Metrics outages histograms buckets (seconds)
+    METRICS_OUTAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0,
+            60.0, 300.0)
+
+    # Metrics Unix sockets directory
+    METRICS_SOCKET_DIR = "/tmp/multisterm"
+
+    # Metrics socket server time to check for stop (seconds)
+    METRICS_SOCKET_POLL_TIME = 0.5
+
+    # Metrics Prometheus textfile update interval (seconds)
+    METRICS_FILE_INTERVAL = 10.0
+
+    # Profilers (deterministic cProfile or statistical sampling)
+    PROFILER_CPROFILE = "cprofile"
+    PROFILER_SAMPLE = "sample"
+    PROFILERS = [PROFILER_CPROFILE, PROFILER_SAMPLE]
+
+    # Profile reports default directory
+    PROFILE_DIR = "."
+
+    # Sampling profiler interval between samples (seconds)
+    PROFILE_SAMPLE_INTERVAL = 0.005
+
+    # Sampling profiler maximum stack depth to record
+    PROFILE_MAX_STACK = 64
+
+    # Profile memory allocations traceback frames to store
+    PROFILE_TRACEMALLOC_FRAMES = 1
+
+    # Profile report number of functions and allocations to show
+    PROFILE_REPORT_LINES = 30
+
+    # Framing text encoding and decode errors handling
+    FRAMING_ENCODING = "utf-8"
+    FRAMING_DECODE_ERRORS = "replace"
+
+    # Framing maximum incomplete frame size (bytes)
+    FRAMING_MAX_SIZE = 1048576
+
+    # Framing time to show an incomplete received line (seconds)
+    FRAMING_LINE_TIMEOUT = 0.2
+
+    # Triggers minimum time between two runs of a trigger command (seconds)
+    TRIGGER_HOOK_MIN_INTERVAL = 1.0
+
+    # Triggers default highlight color
+    TRIGGER_HIGHLIGHT_COLOR = "red"
+
     # Main Developer
     AUTHOR = "Jose Miguel Rios Rubio"
 
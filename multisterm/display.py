@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    display.py
+Description:
+    Received data display modes: decoded text, hex dump, mixed hex and
+    ASCII dump and C-escaped text. Dumps are rendered over whole chunks
+    with table driven conversions (bytes.hex() for the hex columns,
+    bytes.translate() for the ASCII column and str.translate() for the
+    escapes), so the cost per byte stays in C code. Hex dumps keep the
+    stream offset and the bytes of the incomplete last row between
+    chunks.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+from constants import CONST
+from framing import StreamDecoder
+
+###############################################################################
+### Translation Tables
+
+# Non printable bytes are shown as "." in the ASCII column
+ASCII_TABLE = bytes(b if 0x20 <= b < 0x7f else 0x2e for b in range(256))
+
+
+def escape_table():
+    '''Build the C-escape table (for latin-1 decoded data).'''
+    table = ["\\x{:02x}".format(b) for b in range(256)]
+    for b in range(0x20, 0x7f):
+        table[b] = chr(b)
+    table[ord("\\")] = "\\\\"
+    table[ord("\t")] = "\\t"
+    table[ord("\r")] = "\\r"
+    # Keep the line breaks after its escape
+    table[ord("\n")] = "\\n\n"
+    return table
+
+
+ESCAPE_TABLE = escape_table()
+
+###############################################################################
+### Data Display
+
+class DataDisplay():
+    '''Render received data in a display mode.'''
+
+    def __init__(self, mode=CONST.DISPLAY_MODE_TEXT,
+            row_bytes=CONST.DISPLAY_ROW_BYTES, offsets=True):
+        self.mode = mode
+        self.row_bytes = row_bytes
+        self.offsets = offsets
+        self._decoder = StreamDecoder()
+        self._pending = bytearray()
+        self._offset = 0
+        self.decode_errors = 0
+
+    def is_dump(self):
+        '''Check if the display mode is a hex dump.'''
+        return self.mode in (CONST.DISPLAY_MODE_HEX, CONST.DISPLAY_MODE_MIXED)
+
+    def stream(self, data):
+        '''Render a chunk of the received stream (dumps only render the
+        complete rows, the rest is kept for next chunk or flush()).'''
+        if self.mode == CONST.DISPLAY_MODE_TEXT:
+            return self.text(self._decoder.decode(data))
+        if self.mode == CONST.DISPLAY_MODE_ESCAPE:
+            return escape(data)
+        self._pending.extend(data)
+        rows_len = len(self._pending) - (len(self._pending) % self.row_bytes)
+        if not rows_len:
+            return ""
+        text = self.rows(self._pending[:rows_len], self._offset)
+        del self._pending[:rows_len]
+        self._offset = self._offset + rows_len
+        return text
+
+    def flush(self):
+        '''Render the incomplete row of a dump.'''
+        if not self._pending:
+            return ""
+        text = self.rows(self._pending, self._offset)
+        self._offset = self._offset + len(self._pending)
+        self._pending.clear()
+        return text
+
+    def frame(self, data):
+        '''Render a complete frame (dumps offsets relative to the frame).'''
+        if self.mode == CONST.DISPLAY_MODE_TEXT:
+            return self.text(data.decode(CONST.FRAMING_ENCODING,
+                    CONST.FRAMING_DECODE_ERRORS))
+        if self.mode == CONST.DISPLAY_MODE_ESCAPE:
+            return escape(data)
+        return self.rows(data, 0)
+
+    def line(self, data):
+        '''Render a received text line.'''
+        if self.mode == CONST.DISPLAY_MODE_TEXT:
+            return self.text(self._decoder.decode(data))
+        return self.frame(data)
+
+    def text(self, text):
+        '''Count the decode errors (replacement characters) of a decoded
+        text.'''
+        if "\ufffd" in text:
+            self.decode_errors = self.decode_errors + text.count("\ufffd")
+        return text
+
+    def rows(self, data, offset=0):
+        '''Render data as hex dump rows.'''
+        row_bytes = self.row_bytes
+        hex_len = (row_bytes * 3) - 1
+        hex_text = data.hex(" ")
+        ascii_text = None
+        if self.mode == CONST.DISPLAY_MODE_MIXED:
+            ascii_text = bytes(data).translate(ASCII_TABLE).decode("ascii")
+        rows = []
+        for i in range(0, len(data), row_bytes):
+            row = hex_text[i*3:(i*3)+hex_len]
+            if ascii_text is not None:
+                row = "{}  |{}|".format(row.ljust(hex_len),
+                        ascii_text[i:i+row_bytes])
+            if self.offsets:
+                row = "{:08x}  {}".format(offset + i, row)
+            rows.append(row)
+        return "\n".join(rows)
+
+###############################################################################
+### Auxiliar Functions
+
+def escape(data):
+    '''C-escape bytes (printable ASCII is kept).'''
+    return bytes(data).decode("latin-1").translate(ESCAPE_TABLE)
+
+
+def hex_input_parse(text):
+    '''Parse a hex input line (i.e. "01 03 00 00 00 0a c5 cd"), None if it
+    is not valid.'''
+    try:
+        return bytes.fromhex(text)
+    except ValueError:
+        return None
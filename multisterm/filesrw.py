@@ -17,10 +17,12 @@ Version:
 
 ### Imported modules ###
 
+import mmap
 from os import path as os_path
 from os import remove as os_remove
 from os import makedirs as os_makedirs
 from os import utime as os_utime
+from os import replace as os_replace
 
 from constants import LOG
 from auxiliar import print_log, is_running_with_py3
@@ -36,7 +38,7 @@ def create_parents_dirs(file_path):
         if not os_path.exists(parentdirpath):
             os_makedirs(parentdirpath, 0o775)
     except Exception as e:
-        print_log(LOG.ERROR, "Can't create parents directories of {}. {}".format(file_path, str(e)))
+        print_log(LOG.ERROR, "Can't create parents directories of {}. {}", file_path, e)
 
 
 def file_exists(file_path=None):
@@ -55,7 +57,7 @@ def file_read_all_bin(file_path):
     if file_path is None:
         return None
     if not os_path.exists(file_path):
-        print_log(LOG.ERROR, "File {} not found.".format(file_path))
+        print_log(LOG.ERROR, "File {} not found.", file_path)
         return None
     # File exists, so open and read it
     read = None
@@ -63,7 +65,7 @@ def file_read_all_bin(file_path):
         with open(file_path, "rb") as f:
             read = f.read()
     except Exception as e:
-        print_log(LOG.ERROR, "Can't open and read file {}. {}".format(file_path, str(e)))
+        print_log(LOG.ERROR, "Can't open and read file {}. {}", file_path, e)
     return read
 
 
@@ -72,7 +74,7 @@ def file_read_all_text(file_path):
     read = ""
     # Check if file doesnt exists
     if not os_path.exists(file_path):
-        print_log(LOG.ERROR, "File {} not found.".format(file_path))
+        print_log(LOG.ERROR, "File {} not found.", file_path)
     # File exists, so open and read it
     else:
         try:
@@ -83,7 +85,7 @@ def file_read_all_text(file_path):
                 with open(file_path, "r") as f:
                     read = f.read()
         except Exception as e:
-            print_log(LOG.ERROR, "Can't open and read file {}. {}".format(file_path, str(e)))
+            print_log(LOG.ERROR, "Can't open and read file {}. {}", file_path, e)
     return read
 
 
@@ -92,20 +94,20 @@ def file_write(file_path, text=""):
     create_parents_dirs(file_path)
     # Determine if file exists and set open mode to write or append
     if not os_path.exists(file_path):
-        print_log(LOG.INFO, "File {} not found, creating it...".format(file_path))
+        print_log(LOG.INFO, "File {} not found, creating it...", file_path)
     # Try to Open and write to file
     if is_running_with_py3():
         try:
             with open(file_path, 'a', encoding="utf-8") as f:
                 f.write(text)
         except Exception as e:
-            print_log(LOG.ERROR, "Can't write to file {}. {}".format(file_path, str(e)))
+            print_log(LOG.ERROR, "Can't write to file {}. {}", file_path, e)
     else:
         try:
             with open(file_path, 'a') as f:
                 f.write(text)
         except Exception as e:
-            print_log(LOG.ERROR, "Can't write to file {}. {}".format(file_path, str(e)))
+            print_log(LOG.ERROR, "Can't write to file {}. {}", file_path, e)
 
 
 def file_write_line(file_path, text=""):
@@ -113,20 +115,20 @@ def file_write_line(file_path, text=""):
     create_parents_dirs(file_path)
     # Determine if file exists and set open mode to write or append
     if not os_path.exists(file_path):
-        print_log(LOG.INFO, "File {} not found, creating it...".format(file_path))
+        print_log(LOG.INFO, "File {} not found, creating it...", file_path)
     # Try to Open and write to file
     if is_running_with_py3():
         try:
             with open(file_path, 'a', encoding="utf-8") as f:
                 f.write("{}\n".format(text))
         except Exception as e:
-            print_log(LOG.ERROR, "Can't write to file {}. {}".format(file_path, str(e)))
+            print_log(LOG.ERROR, "Can't write to file {}. {}", file_path, e)
     else:
         try:
             with open(file_path, 'a') as f:
                 f.write("{}\n".format(text))
         except Exception as e:
-            print_log(LOG.ERROR, "Can't write to file {}. {}".format(file_path, str(e)))
+            print_log(LOG.ERROR, "Can't write to file {}. {}", file_path, e)
 
 
 def file_clear(file_path):
@@ -138,5 +140,57 @@ def file_clear(file_path):
         with open(file_path, 'a'):
             os_utime(file_path, None)
     except Exception as e:
-        print_log(LOG.ERROR, "Can't clear file {}. {}".format(file_path, str(e)))
+        print_log(LOG.ERROR, "Can't clear file {}. {}", file_path, e)
 
+
+
+def file_rotate(file_path, backups=5):
+    '''Rotate a file, renaming it to file.1 (file.1 to file.2, etc.) and
+    removing the oldest one if there are more than backups files.'''
+    try:
+        oldest = "{}.{}".format(file_path, backups)
+        if os_path.exists(oldest):
+            os_remove(oldest)
+        for i in range(backups-1, 0, -1):
+            src = "{}.{}".format(file_path, i)
+            if os_path.exists(src):
+                os_replace(src, "{}.{}".format(file_path, i+1))
+        if os_path.exists(file_path):
+            if backups > 0:
+                os_replace(file_path, "{}.1".format(file_path))
+            else:
+                os_remove(file_path)
+    except Exception as e:
+        print_log(LOG.ERROR, "Can't rotate file {}. {}", file_path, e)
+
+
+def file_mmap(file_path):
+    '''Map a file in memory as read-only (None if it doesn't exist, it is empty or it can't be
+    mapped), so big files can be searched without reading them whole.'''
+    if not os_path.exists(file_path):
+        print_log(LOG.ERROR, "File {} not found.", file_path)
+        return None
+    try:
+        with open(file_path, "rb") as f:
+            if os_path.getsize(file_path) == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception as e:
+        print_log(LOG.ERROR, "Can't map file {}. {}", file_path, e)
+    return None
+
+
+def file_read_chunks(file_path, chunk_size=4096):
+    '''Read a binary file in chunks through a single reused buffer (each yielded chunk is a
+    memoryview that is only valid until the next one is read).'''
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            while True:
+                read = f.readinto(buf)
+                if not read:
+                    break
+                yield view[:read]
+    finally:
+        view.release()
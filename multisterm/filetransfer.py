@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    filetransfer.py
+Description:
+    File upload to the device through the Serial port. Files are streamed
+    in fixed size chunks (constant memory use for any file size) as raw
+    data or framed with the XMODEM (128 bytes blocks, checksum or CRC),
+    XMODEM-1K or YMODEM (1K blocks with file name and size header)
+    protocols, that retransmit blocks rejected by the receiver. A live
+    progress line shows the throughput, and the final report compares it
+    with the theoretical line rate of the port configuration.
+    It can be executed to upload a file without the terminal:
+        python filetransfer.py -p <PORT> -b <BAUDS> [-m <MODE>]
+               [--flow-control rtscts|xonxoff] <FILE>
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from binascii import crc_hqx
+from os import path as os_path
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from sys import stdout as sys_stdout
+from threading import Condition
+from argparse import ArgumentParser as argparse_ArgumentParser
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+from filesrw import file_exists, file_read_chunks
+from serialcomm import serial_open, serial_close, serial_flow_control_set
+
+###############################################################################
+### Protocol Definitions
+
+SOH = b"\x01"
+STX = b"\x02"
+EOT = b"\x04"
+ACK = b"\x06"
+NAK = b"\x15"
+CAN = b"\x18"
+CRC = b"C"
+SUB = b"\x1a"
+
+TRANSFER_MODES = ["raw", "xmodem", "xmodem1k", "ymodem"]
+
+###############################################################################
+### Received Data Tap
+
+class RxTap():
+    '''Divert received data to a transfer while the terminal event loop
+    owns the port (the loop feeds it, the transfer reads from it).'''
+
+    def __init__(self):
+        self.active = False
+        self._buf = bytearray()
+        self._cond = Condition()
+
+    def start(self):
+        '''Start capturing received data (previous data is discarded).'''
+        with self._cond:
+            self._buf.clear()
+            self.active = True
+
+    def stop(self):
+        '''Stop capturing received data.'''
+        with self._cond:
+            self.active = False
+            self._buf.clear()
+
+    def feed(self, data):
+        '''Add received data.'''
+        with self._cond:
+            self._buf.extend(data)
+            self._cond.notify_all()
+
+    def read(self, size, timeout):
+        '''Read up to size bytes, waiting at most timeout for any data.'''
+        with self._cond:
+            self._cond.wait_for(lambda: len(self._buf) > 0, timeout)
+            data = bytes(self._buf[:size])
+            del self._buf[:size]
+        return data
+
+###############################################################################
+### Transfer Progress
+
+class TransferProgress():
+    '''Live transfer progress and throughput report.'''
+
+    def __init__(self, name, total, line_rate=0, output=sys_stdout):
+        self.name = name
+        self.total = total
+        self.line_rate = line_rate
+        self.output = output
+        self.done = 0
+        self.retries = 0
+        self.start_time = time.monotonic()
+        self._last_show = 0
+
+    def start(self):
+        '''Restart the transfer time (i.e. when the receiver is ready).'''
+        self.start_time = time.monotonic()
+
+    def update(self, num_bytes):
+        '''Account sent bytes, showing the progress line from time to
+        time.'''
+        self.done = self.done + num_bytes
+        now = time.monotonic()
+        if now - self._last_show >= CONST.TRANSFER_PROGRESS_INTERVAL:
+            self._last_show = now
+            self.show()
+
+    def rate(self):
+        '''Get current throughput (bytes/s).'''
+        elapsed = time.monotonic() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return self.done / elapsed
+
+    def show(self):
+        '''Show the progress line.'''
+        rate = self.rate()
+        percent = 100.0
+        if self.total:
+            percent = self.done * 100.0 / self.total
+        eta = ""
+        if rate > 0:
+            eta = " ETA {:.0f}s".format((self.total - self.done) / rate)
+        self.output.write("\r{}: {:5.1f}% {}/{} bytes {:.0f} B/s{}{}".format(
+                self.name, percent, self.done, self.total, rate,
+                self._efficiency_text(rate), eta).ljust(79))
+        self.output.flush()
+
+    def finish(self, success=True):
+        '''Show the final transfer report.'''
+        self.show()
+        elapsed = time.monotonic() - self.start_time
+        rate = self.rate()
+        result = "sent" if success else "FAILED"
+        self.output.write("\n{} {}: {} bytes in {:.2f}s, {:.0f} B/s{}, " \
+                "{} retransmits\n".format(self.name, result, self.done,
+                elapsed, rate, self._efficiency_text(rate), self.retries))
+        self.output.flush()
+
+    def _efficiency_text(self, rate):
+        '''Throughput versus theoretical line rate text.'''
+        if self.line_rate <= 0:
+            return ""
+        return " ({:.0f}% of {:.0f} B/s line rate)".format(
+                rate * 100.0 / self.line_rate, self.line_rate)
+
+###############################################################################
+### Auxiliar Functions
+
+def line_rate(ser):
+    '''Get the theoretical bytes/s of a port configuration (start bit,
+    data bits, parity bit and stop bits for each byte).'''
+    baudrate = getattr(ser, "baudrate", 0)
+    if not baudrate:
+        return 0
+    bits = 1 + getattr(ser, "bytesize", 8) + getattr(ser, "stopbits", 1)
+    if getattr(ser, "parity", "N") != "N":
+        bits = bits + 1
+    return baudrate / bits
+
+
+def block_packet(num, data, block_size, crc=True, pad=SUB):
+    '''Build a XMODEM block packet.'''
+    header = STX if block_size == 1024 else SOH
+    num = num & 0xFF
+    payload = bytes(data).ljust(block_size, pad)
+    if crc:
+        check = crc_hqx(payload, 0).to_bytes(2, "big")
+    else:
+        check = bytes([sum(payload) & 0xFF])
+    return b"".join((header, bytes([num, 0xFF - num]), payload, check))
+
+
+def response_wait(read, expected, timeout):
+    '''Wait for one of the expected response bytes, ignoring any other
+    received byte (returns b'' on timeout and CAN if transfer is
+    cancelled by the receiver).'''
+    end = time.monotonic() + timeout
+    cancels = 0
+    while True:
+        remaining = end - time.monotonic()
+        if remaining <= 0:
+            return b''
+        c = read(1, remaining)
+        if not c:
+            continue
+        if c in expected:
+            return c
+        if c == CAN:
+            # Receiver cancels with two consecutive CAN
+            cancels = cancels + 1
+            if cancels >= 2:
+                return CAN
+        else:
+            cancels = 0
+
+###############################################################################
+### Transfer Functions
+
+def file_send_raw(write, file_path, progress=None,
+        chunk_size=CONST.TRANSFER_CHUNK_SIZE):
+    '''Stream a file as raw data.'''
+    for chunk in file_read_chunks(file_path, chunk_size):
+        write(bytes(chunk))
+        if progress is not None:
+            progress.update(len(chunk))
+    return True
+
+
+def xmodem_send_block(write, read, packet, progress=None):
+    '''Send a block until the receiver acknowledges it.'''
+    for retry in range(CONST.TRANSFER_MAX_RETRIES):
+        if retry and (progress is not None):
+            progress.retries = progress.retries + 1
+        write(packet)
+        response = response_wait(read, (ACK, NAK), CONST.TRANSFER_ACK_TIMEOUT)
+        if response == ACK:
+            return True
+        if response == CAN:
+            print_log(LOG.ERROR, "Transfer cancelled by the receiver.")
+            return False
+    print_log(LOG.ERROR, "Block not acknowledged after {} retries.",
+            CONST.TRANSFER_MAX_RETRIES)
+    return False
+
+
+def xmodem_send_data(write, read, file_path, block_size=1024, crc=True,
+        progress=None):
+    '''Send a file as XMODEM blocks and end the transfer (EOT).'''
+    # Checksum mode receivers only support 128 bytes blocks
+    if not crc:
+        block_size = 128
+    num = 1
+    for chunk in file_read_chunks(file_path, block_size):
+        # Last block with a few bytes, use a short block (less padding)
+        size = 128 if len(chunk) <= 128 else block_size
+        packet = block_packet(num, chunk, size, crc)
+        if not xmodem_send_block(write, read, packet, progress):
+            write(CAN + CAN)
+            return False
+        num = num + 1
+        if progress is not None:
+            progress.update(len(chunk))
+    # Some receivers NAK the first EOT to confirm the end of transfer
+    for _ in range(CONST.TRANSFER_MAX_RETRIES):
+        write(EOT)
+        response = response_wait(read, (ACK, NAK), CONST.TRANSFER_ACK_TIMEOUT)
+        if response == ACK:
+            return True
+        if response == CAN:
+            return False
+    return False
+
+
+def xmodem_start_wait(read):
+    '''Wait for the receiver start request, get if it requests CRC mode
+    (None if the receiver is not ready).'''
+    response = response_wait(read, (CRC, NAK), CONST.TRANSFER_START_TIMEOUT)
+    if response == CRC:
+        return True
+    if response == NAK:
+        return False
+    print_log(LOG.ERROR, "Receiver not ready.")
+    return None
+
+
+def xmodem_send(write, read, file_path, block_size=128, progress=None):
+    '''Upload a file with XMODEM (128 bytes blocks) or XMODEM-1K (1024 bytes
+    blocks) protocol.'''
+    crc = xmodem_start_wait(read)
+    if crc is None:
+        return False
+    if progress is not None:
+        progress.start()
+    return xmodem_send_data(write, read, file_path, block_size, crc,
+            progress)
+
+
+def ymodem_send(write, read, file_path, progress=None):
+    '''Upload a file with YMODEM protocol (single file batch).'''
+    if not xmodem_start_wait(read):
+        print_log(LOG.ERROR, "Receiver does not support YMODEM.")
+        return False
+    if progress is not None:
+        progress.start()
+    # Block 0: file name, size and modification time
+    header = b"%s\0%d %o\0" % (os_path.basename(file_path).encode(),
+            os_path.getsize(file_path), int(os_path.getmtime(file_path)))
+    header_size = 128 if len(header) <= 128 else 1024
+    if not xmodem_send_block(write, read,
+            block_packet(0, header, header_size, pad=b"\0"), progress):
+        return False
+    if not xmodem_start_wait(read):
+        return False
+    if not xmodem_send_data(write, read, file_path, 1024, True, progress):
+        return False
+    # Empty block 0 ends the batch
+    if not xmodem_start_wait(read):
+        return False
+    return xmodem_send_block(write, read,
+            block_packet(0, b'', 128, pad=b"\0"), progress)
+
+
+def file_send(write, read, file_path, mode="raw", progress=None):
+    '''Upload a file with the provided transfer mode.'''
+    if not file_exists(file_path):
+        print_log(LOG.ERROR, "File {} not found.", file_path)
+        return False
+    try:
+        if mode == "xmodem":
+            return xmodem_send(write, read, file_path, 128, progress)
+        if mode == "xmodem1k":
+            return xmodem_send(write, read, file_path, 1024, progress)
+        if mode == "ymodem":
+            return ymodem_send(write, read, file_path, progress)
+        return file_send_raw(write, file_path, progress)
+    except OSError as e:
+        print_log(LOG.ERROR, "File transfer fail: {}", e)
+        return False
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    arg_parser = argparse_ArgumentParser()
+    arg_parser.add_argument("file", help="File to upload",
+                            action='store', type=str)
+    arg_parser.add_argument("-p", "--port", help="Serial port",
+                            action='store', type=str, required=True)
+    arg_parser.add_argument("-b", "--bauds", help="Serial BaudRate",
+                            action='store', type=int, required=True)
+    arg_parser.add_argument("-m", "--mode", help="Transfer mode",
+                            action='store', type=str, default="raw",
+                            choices=TRANSFER_MODES)
+    arg_parser.add_argument("--flow-control", help="Flow control",
+                            action='store', type=str,
+                            choices=CONST.SERIAL_FLOW_CONTROLS)
+    args = arg_parser.parse_args(argv[1:])
+    if not file_exists(args.file):
+        print_log(LOG.ERROR, "File {} not found.", args.file)
+        return RC.FAIL
+    ser = serial_open(args.port, args.bauds, 1.0, None)
+    if ser is None:
+        return RC.FAIL
+    serial_flow_control_set(ser, args.flow_control)
+    def read(size, timeout):
+        ser.timeout = timeout
+        return ser.read(size)
+    progress = TransferProgress(os_path.basename(args.file),
+            os_path.getsize(args.file), line_rate(ser))
+    try:
+        success = file_send(ser.write, read, args.file, args.mode, progress)
+        ser.flush()
+    except KeyboardInterrupt:
+        if args.mode != "raw":
+            ser.write(CAN + CAN)
+        success = False
+    progress.finish(success)
+    serial_close(ser)
+    if not success:
+        return RC.FAIL
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    framing.py
+Description:
+    Incremental stream framing. Raw data chunks, as read from the Serial
+    port, are fed to a splitter that returns the complete frames (lines,
+    SLIP, COBS or length prefixed frames) and keeps incomplete data for the
+    next chunk. Splitters scan a reusable buffer with bytes.find() and
+    memoryview slices instead of copying it at every step, and text is
+    decoded with an incremental decoder, so multi-byte characters split
+    between reads are not broken.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+from codecs import getincrementaldecoder
+
+from constants import CONST
+
+###############################################################################
+### Stream Decoder
+
+class StreamDecoder():
+    '''Incremental bytes to text decoder for unframed streams.'''
+
+    def __init__(self, encoding=CONST.FRAMING_ENCODING,
+            errors=CONST.FRAMING_DECODE_ERRORS):
+        self._decoder = getincrementaldecoder(encoding)(errors)
+
+    def decode(self, data):
+        '''Decode a chunk, keeping incomplete characters for next chunk.'''
+        return self._decoder.decode(data)
+
+    def flush(self):
+        '''Decode any pending incomplete character.'''
+        return self._decoder.decode(b'', True)
+
+###############################################################################
+### Frame Splitters
+
+class FrameSplitter():
+    '''Base incremental frame splitter with a reusable buffer.'''
+
+    def __init__(self, max_size=CONST.FRAMING_MAX_SIZE):
+        self.max_size = max_size
+        self.frames_overflow = 0
+        self._buf = bytearray()
+        self._start = 0
+
+    def feed(self, data):
+        '''Add received data and get the list of completed frames.'''
+        self._buf.extend(data)
+        frames = self._split()
+        # Release consumed data (not in every feed, to avoid moving the
+        # pending bytes each time)
+        if self._start == len(self._buf):
+            self._buf.clear()
+            self._start = 0
+        elif self._start > (len(self._buf) >> 1):
+            del self._buf[:self._start]
+            self._start = 0
+        # Incomplete frame too big, discard it
+        if len(self._buf) - self._start > self.max_size:
+            self.frames_overflow = self.frames_overflow + 1
+            self.reset()
+        return frames
+
+    def pending(self):
+        '''Get incomplete frame bytes received.'''
+        return bytes(self._buf[self._start:])
+
+    def reset(self):
+        '''Discard incomplete frame bytes.'''
+        self._buf.clear()
+        self._start = 0
+
+    def _split(self):
+        '''Extract all complete frames from the buffer.'''
+        raise NotImplementedError
+
+
+class DelimiterSplitter(FrameSplitter):
+    '''Split frames by a delimiter bytes sequence (i.e. LF or CRLF).'''
+
+    def __init__(self, delimiter=b"\n", keep_delimiter=False,
+            max_size=CONST.FRAMING_MAX_SIZE):
+        FrameSplitter.__init__(self, max_size)
+        # An empty delimiter would be found at any position
+        if not delimiter:
+            raise ValueError("Empty framing delimiter")
+        self.delimiter = delimiter
+        self.keep_delimiter = keep_delimiter
+        self._scanned = 0
+
+    def reset(self):
+        '''Discard incomplete frame bytes.'''
+        FrameSplitter.reset(self)
+        self._scanned = 0
+
+    def _split(self):
+        frames = []
+        buf = self._buf
+        view = memoryview(buf)
+        delimiter = self.delimiter
+        delim_len = len(delimiter)
+        tail = 0 if self.keep_delimiter else delim_len
+        # Don't scan again pending bytes already checked in previous feeds
+        search = self._start + max(0, self._scanned - delim_len + 1)
+        while True:
+            end = buf.find(delimiter, search)
+            if end == -1:
+                break
+            frames.append(bytes(view[self._start:end+delim_len-tail]))
+            self._start = end + delim_len
+            search = self._start
+        view.release()
+        self._scanned = len(buf) - self._start
+        return frames
+
+
+class SlipSplitter(FrameSplitter):
+    '''Split and decode SLIP frames (RFC 1055).'''
+
+    END = b"\xc0"
+    ESC = b"\xdb"
+
+    def _split(self):
+        frames = []
+        buf = self._buf
+        view = memoryview(buf)
+        while True:
+            end = buf.find(self.END, self._start)
+            if end == -1:
+                break
+            if end > self._start:
+                frames.append(slip_unescape(bytes(view[self._start:end])))
+            self._start = end + 1
+        view.release()
+        return frames
+
+
+class CobsSplitter(FrameSplitter):
+    '''Split and decode COBS frames (zero byte delimited).'''
+
+    def _split(self):
+        frames = []
+        buf = self._buf
+        view = memoryview(buf)
+        while True:
+            end = buf.find(b"\0", self._start)
+            if end == -1:
+                break
+            if end > self._start:
+                frame = cobs_decode(view[self._start:end])
+                if frame is not None:
+                    frames.append(frame)
+            self._start = end + 1
+        view.release()
+        return frames
+
+
+class LengthPrefixSplitter(FrameSplitter):
+    '''Split frames prefixed by its length (unsigned integer header).'''
+
+    def __init__(self, header_size=2, byteorder="big",
+            max_size=CONST.FRAMING_MAX_SIZE):
+        FrameSplitter.__init__(self, max_size)
+        self.header_size = header_size
+        self.byteorder = byteorder
+
+    def _split(self):
+        frames = []
+        buf = self._buf
+        view = memoryview(buf)
+        header_size = self.header_size
+        while len(buf) - self._start >= header_size:
+            start = self._start + header_size
+            length = int.from_bytes(view[self._start:start], self.byteorder)
+            if len(buf) < start + length:
+                break
+            frames.append(bytes(view[start:start+length]))
+            self._start = start + length
+        view.release()
+        return frames
+
+###############################################################################
+### Encoding Functions
+
+def slip_escape(data):
+    '''SLIP escape frame data.'''
+    return data.replace(b"\xdb", b"\xdb\xdd").replace(b"\xc0", b"\xdb\xdc")
+
+
+def slip_unescape(data):
+    '''SLIP unescape frame data (an ESC byte is always followed by
+    ESC_END or ESC_ESC, so replacements can't overlap).'''
+    return data.replace(b"\xdb\xdc", b"\xc0").replace(b"\xdb\xdd", b"\xdb")
+
+
+def slip_encode(data):
+    '''Build a SLIP frame.'''
+    return b"\xc0" + slip_escape(data) + b"\xc0"
+
+
+def cobs_encode(data):
+    '''Build a COBS frame (with its zero delimiter).'''
+    out = bytearray()
+    for block in data.split(b"\0"):
+        # Blocks longer than 254 bytes are split without an implicit zero
+        while len(block) >= 0xFF:
+            out.append(0xFF)
+            out.extend(block[:0xFE])
+            block = block[0xFE:]
+        out.append(len(block) + 1)
+        out.extend(block)
+    out.append(0)
+    return bytes(out)
+
+
+def cobs_decode(data):
+    '''Decode a COBS frame (without its zero delimiter), None if invalid.'''
+    out = bytearray()
+    i = 0
+    data_len = len(data)
+    while i < data_len:
+        code = data[i]
+        if (code == 0) or (i + code > data_len + 1):
+            return None
+        out.extend(data[i+1:i+code])
+        i = i + code
+        if (code < 0xFF) and (i < data_len):
+            out.append(0)
+    return bytes(out)
+
+###############################################################################
+### Factory
+
+def framing_create(framing):
+    '''Create a frame splitter from its name: "lf", "crlf", "slip", "cobs",
+    "len8", "len16", "len32" or "delim:<HEX_BYTES>" (i.e. "delim:0d").'''
+    if framing == "lf":
+        return DelimiterSplitter(b"\n")
+    if framing == "crlf":
+        return DelimiterSplitter(b"\r\n")
+    if framing == "slip":
+        return SlipSplitter()
+    if framing == "cobs":
+        return CobsSplitter()
+    if framing in ("len8", "len16", "len32"):
+        return LengthPrefixSplitter(int(framing[3:]) // 8)
+    if framing.startswith("delim:"):
+        return DelimiterSplitter(bytes.fromhex(framing[6:]))
+    raise ValueError("Unknown framing {}".format(framing))
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    hotplug.py
+Description:
+    Serial port hot-plug supervision. When a port fails (i.e. the USB
+    adapter is unplugged or reset), it is closed and its device directory
+    is watched with inotify (the watch file descriptor is served by the
+    event loop, so nothing is polled) until the device comes back, at the
+    same path or at another one with the same USB identity (VID, PID and
+    serial number). Then the same Serial object is reopened, keeping all
+    its settings, so its users (readers, writers, loggers) keep their
+    state across the gap. Without inotify (or for network ports), or while
+    the device is there but can't be opened yet (i.e. busy), it is retried
+    with a slow timer. Outage durations are recorded.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import ctypes
+import ctypes.util
+import time
+from errno import EBUSY
+from os import close as os_close
+from os import read as os_read
+from os import path as os_path
+from os import O_NONBLOCK, O_CLOEXEC
+from struct import unpack_from as struct_unpack_from
+
+from serial.tools.list_ports import comports
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from serialcomm import serial_is_url
+from metrics import REGISTRY, port_metrics
+
+###############################################################################
+### Constants
+
+# inotify events of a new device node, symlink or permissions change
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_EVENTS = IN_ATTRIB | IN_MOVED_TO | IN_CREATE
+
+# inotify event header (wd, mask, cookie, name length)
+IN_EVENT_HEADER = "iIII"
+IN_EVENT_HEADER_SIZE = 16
+
+###############################################################################
+### Inotify Watcher
+
+class InotifyWatcher():
+    '''Linux inotify watch of directories entries creation (it raises
+    OSError if inotify is not available).'''
+
+    def __init__(self, paths):
+        self._fd = -1
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            inotify_init1 = libc.inotify_init1
+            inotify_add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError) as e:
+            raise OSError("inotify not available ({})".format(e))
+        self._fd = inotify_init1(O_NONBLOCK | O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 fail")
+        for path in paths:
+            if inotify_add_watch(self._fd, path.encode(), IN_EVENTS) < 0:
+                self.close()
+                raise OSError(ctypes.get_errno(),
+                        "Can't watch {}".format(path))
+
+    def fileno(self):
+        '''Get the file descriptor to wait for events.'''
+        return self._fd
+
+    def read(self):
+        '''Get the names of the entries of the pending events.'''
+        names = []
+        while True:
+            try:
+                data = os_read(self._fd, CONST.HOTPLUG_EVENTS_READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + IN_EVENT_HEADER_SIZE <= len(data):
+                _, _, _, name_len = struct_unpack_from(IN_EVENT_HEADER, data,
+                        offset)
+                offset = offset + IN_EVENT_HEADER_SIZE
+                name = data[offset:offset+name_len].rstrip(b"\0")
+                names.append(name.decode(errors="replace"))
+                offset = offset + name_len
+        return names
+
+    def close(self):
+        '''Release the inotify file descriptor.'''
+        if self._fd >= 0:
+            os_close(self._fd)
+            self._fd = -1
+
+###############################################################################
+### Port Supervisor
+
+class PortSupervisor():
+    '''Serve a Serial port in an event loop and reopen it when it comes
+    back after a failure. on_disconnect is called with the error and
+    on_reconnect with the outage duration (seconds).'''
+
+    def __init__(self, loop, ser, on_read, on_disconnect=None,
+            on_reconnect=None):
+        self.loop = loop
+        self.ser = ser
+        self.port = ser.port
+        self.on_read = on_read
+        self.on_disconnect = on_disconnect
+        self.on_reconnect = on_reconnect
+        self.identity = port_identity(self.port)
+        self.connected = False
+        self.disconnect_time = 0
+        self.disconnects = 0
+        self.last_outage = 0
+        self._watcher = None
+        self._retrying = False
+        labels = {"port": str(self.port)}
+        self._disconnects_metric = REGISTRY.counter(
+                "multisterm_disconnects_total",
+                "Port failures (disconnections)", labels)
+        self._outage_metric = REGISTRY.histogram(
+                "multisterm_outage_seconds",
+                "Time from a port failure to its reopening",
+                CONST.METRICS_OUTAGE_BUCKETS, labels)
+
+    def start(self):
+        '''Serve the port in the loop.'''
+        self.connected = True
+        self.loop.add_serial(self.ser, self.on_read, self._on_error)
+
+    def close(self):
+        '''Stop watching for the port.'''
+        self._watch_stop()
+
+    def fail(self, error):
+        '''Handle a port failure detected out of the loop reads (i.e. by
+        its writer) as a read failure (call it from the loop thread).'''
+        if not self.connected:
+            return
+        self.loop.remove_serial(self.ser)
+        self._on_error(self.ser, error)
+
+    def _on_error(self, ser, error):
+        '''Port failure, close it and wait for it to come back.'''
+        self.connected = False
+        self.disconnect_time = time.monotonic()
+        self.disconnects = self.disconnects + 1
+        self._disconnects_metric.inc()
+        try:
+            self.ser.close()
+        except Exception as e:
+            print_log(LOG.DEBUG, "Serial close fail: {}", e)
+        if self.on_disconnect is not None:
+            self.on_disconnect(error)
+        # The device node can still be there (i.e. the port is failing
+        # without being removed), so it is not reopened right now to
+        # not spin on a failing port
+        self._watch_start()
+
+    def _watch_start(self):
+        '''Watch the port device directories (or check it periodically if
+        inotify is not available).'''
+        if not serial_is_url(self.port):
+            dirs = set([os_path.dirname(os_path.realpath(self.port))])
+            if os_path.isdir(os_path.dirname(self.port)):
+                dirs.add(os_path.dirname(self.port))
+            try:
+                self._watcher = InotifyWatcher(sorted(dirs))
+                self.loop.add_reader(self._watcher, self._on_watch_event)
+            except OSError as e:
+                print_log(LOG.DEBUG, "Port watch not available: {}", e)
+                self._watcher = None
+        # A device node that is still there raises no new event
+        if (self._watcher is None) or os_path.exists(self.port):
+            self._retry_start()
+
+    def _watch_stop(self):
+        '''Stop watching for the port device.'''
+        self._retry_stop()
+        if self._watcher is not None:
+            self.loop.remove_reader(self._watcher)
+            self._watcher.close()
+            self._watcher = None
+
+    def _retry_start(self):
+        '''Retry the reopening periodically.'''
+        if not self._retrying:
+            self._retrying = True
+            self.loop.add_timer(CONST.HOTPLUG_RETRY_INTERVAL, self._reconnect)
+
+    def _retry_stop(self):
+        '''Stop the periodic reopening retries.'''
+        if self._retrying:
+            self._retrying = False
+            self.loop.remove_timer(self._reconnect)
+
+    def _on_watch_event(self):
+        '''Device directory changes.'''
+        self._watcher.read()
+        self._reconnect()
+
+    def _reconnect(self):
+        '''Try to reopen the port (at its path or, if it is not there, at
+        the device with the same USB identity).'''
+        if self.connected:
+            return
+        device = self.port
+        # Network ports are just retried
+        if not serial_is_url(device):
+            if (not os_path.exists(device)) and (self.identity is not None):
+                device = port_identity_find(self.identity)
+            if (device is None) or (not os_path.exists(device)):
+                # The watch signals when the device comes back
+                if self._watcher is not None:
+                    self._retry_stop()
+                return
+        try:
+            self.ser.port = device
+            self.ser.open()
+        except Exception as e:
+            print_log(LOG.DEBUG, "Serial reopen fail: {}", e)
+            # A busy device raises no new event when it is released
+            if getattr(e, "errno", None) == EBUSY:
+                self._retry_start()
+            return
+        self.connected = True
+        self.last_outage = time.monotonic() - self.disconnect_time
+        self._watch_stop()
+        self.loop.add_serial(self.ser, self.on_read, self._on_error)
+        self._outage_metric.observe(self.last_outage)
+        port_metrics(self.port).opens.inc()
+        print_log(LOG.INFO, "Serial port {} reopened ({:.3f} s outage).",
+                device, self.last_outage)
+        if self.on_reconnect is not None:
+            self.on_reconnect(self.last_outage)
+
+###############################################################################
+### Auxiliar Functions
+
+def port_identity(port):
+    '''Get the USB identity of a port (VID, PID, serial number and location,
+    None if it is not an USB device).'''
+    if serial_is_url(port):
+        return None
+    device = os_path.realpath(port)
+    try:
+        for info in comports():
+            if (info.vid is not None) and \
+                    (os_path.realpath(info.device) == device):
+                return (info.vid, info.pid, info.serial_number,
+                        info.location)
+    except Exception as e:
+        print_log(LOG.DEBUG, "Ports list fail: {}", e)
+    return None
+
+
+def port_identity_find(identity):
+    '''Get the device of the port with an USB identity (the location is
+    used just for devices without serial number), None if not found.'''
+    vid, pid, serial_number, location = identity
+    try:
+        for info in comports():
+            if (info.vid != vid) or (info.pid != pid) or \
+                    (info.serial_number != serial_number):
+                continue
+            if (serial_number is None) and (info.location != location):
+                continue
+            return info.device
+    except Exception as e:
+        print_log(LOG.DEBUG, "Ports list fail: {}", e)
+    return None
@@ -0,0 +1,545 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    logsearch.py
+Description:
+    Indexed search over text capture logs. A sidecar index file (the log
+    file path plus ".idx") splits the log in blocks of whole lines, and it
+    keeps the offset, first line number, number of lines, first and last
+    timestamps and, optionally, a bloom filter of the text trigrams of each
+    block. The index is built incrementally while logging (see
+    TextCaptureSink) or lazily before a query, covering just the complete
+    blocks (the log tail is always searched). Queries by time range and
+    literal or regex pattern only scan the candidate blocks of the
+    memory-mapped log.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import re
+import time
+from os import path as os_path
+from os import devnull as os_devnull
+from os import dup2 as os_dup2
+from os import open as os_open
+from os import O_WRONLY
+from struct import calcsize as struct_calcsize
+from struct import pack as struct_pack
+from struct import unpack_from as struct_unpack_from
+from struct import error as struct_error
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from sys import stdout as sys_stdout
+
+from constants import RC, LOG, CONST, DIR
+from auxiliar import print_log
+from filesrw import file_mmap
+
+###############################################################################
+### Constants
+
+# Index header: magic, version, bloom filter bits, block size, number of
+# blocks, log bytes covered and first bytes of the log (to detect that the
+# log was replaced)
+INDEX_MAGIC = b"MSTMSIDX"
+INDEX_VERSION = 1
+INDEX_HEADER = "<8sIIQQQ64s"
+INDEX_HEADER_SIZE = struct_calcsize(INDEX_HEADER)
+INDEX_HEAD_SIZE = 64
+
+# Index block record: offset, size, first line number, number of lines and
+# first and last line timestamps (followed by the bloom filter bits)
+BLOCK_RECORD = "<QQQQ23s23s2x"
+BLOCK_RECORD_SIZE = struct_calcsize(BLOCK_RECORD)
+
+# Text capture lines timestamp ("YYYY-mm-dd_HH:MM:SS.mmm") size and format
+TIMESTAMP_SIZE = 23
+TIMESTAMP_RE = re.compile(
+        br"\d{4}-\d\d-\d\d_\d\d:\d\d:\d\d\.\d{3}")
+TIMESTAMP_QUERY_RE = re.compile(
+        r"^\d{4}(-\d\d(-\d\d(_\d\d(:\d\d(:\d\d(\.\d{1,3})?)?)?)?)?)?$")
+
+# Lines timestamps are not in the bloom filters (they are different in each
+# line and the blocks time ranges are indexed), so trigrams that can be part
+# of them are not looked up
+TIMESTAMP_PREFIX_RE = re.compile(
+        br"^\d{4}-\d\d-\d\d_\d\d:\d\d:\d\d\.\d{3} ", re.MULTILINE)
+TIMESTAMP_CHARS_RE = re.compile(br"^[0-9:._-]+$")
+
+# Regex special characters (just literal runs between them are indexed)
+REGEX_SPECIAL = ".^$*+?{}[]()"
+REGEX_QUANTIFIERS = "*?{"
+
+###############################################################################
+### Index
+
+class IndexBlock():
+    '''Index entry of a log block.'''
+
+    __slots__ = ("offset", "size", "first_line", "lines", "first_ts",
+            "last_ts", "bloom")
+
+    def __init__(self, offset, size, first_line, lines, first_ts=b"",
+            last_ts=b"", bloom=None):
+        self.offset = offset
+        self.size = size
+        self.first_line = first_line
+        self.lines = lines
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.bloom = bloom
+
+    def pack(self):
+        '''Get the block index record.'''
+        return struct_pack(BLOCK_RECORD, self.offset, self.size,
+                self.first_line, self.lines, self.first_ts,
+                self.last_ts) + (self.bloom or b"")
+
+    def in_time_range(self, start=None, end=None):
+        '''Check if the block can have lines in a timestamps range.'''
+        if (start is not None) and self.last_ts and (self.last_ts < start):
+            return False
+        if (end is not None) and self.first_ts and \
+                (self.first_ts[:len(end)] > end):
+            return False
+        return True
+
+    def may_contain(self, trigrams, bloom_bits):
+        '''Check if the block bloom filter has all trigrams.'''
+        if (self.bloom is None) or (not trigrams):
+            return True
+        for trigram in trigrams:
+            bit = trigram_hash(trigram, bloom_bits)
+            if not self.bloom[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+
+class CaptureIndex():
+    '''Sidecar index of a text capture log.'''
+
+    def __init__(self, log_path, block_size=CONST.SEARCH_BLOCK_SIZE,
+            bloom_bits=CONST.SEARCH_BLOOM_BITS):
+        self.log_path = log_path
+        self.index_path = "{}.idx".format(log_path)
+        self.block_size = block_size
+        self.bloom_bits = bloom_bits
+        self.blocks = []
+        self.indexed_size = 0
+        self.lines = 0
+        self._head = b""
+
+    def load(self):
+        '''Load the index file (it is discarded if it was built with
+        other settings or it is damaged).'''
+        self.reset()
+        if not os_path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "rb") as f:
+                header = f.read(INDEX_HEADER_SIZE)
+                magic, version, bloom_bits, block_size, num_blocks, \
+                        indexed_size, head = struct_unpack_from(
+                        INDEX_HEADER, header)
+                if (magic != INDEX_MAGIC) or (version != INDEX_VERSION) or \
+                        (bloom_bits != self.bloom_bits) or \
+                        (block_size != self.block_size):
+                    print_log(LOG.INFO, "Index {} outdated, rebuilding it.",
+                            self.index_path)
+                    return
+                bloom_size = bloom_bits // 8
+                data = f.read(num_blocks * (BLOCK_RECORD_SIZE + bloom_size))
+        except (OSError, ValueError, struct_error) as e:
+            print_log(LOG.WARNING, "Can't load index {}: {}", self.index_path,
+                    e)
+            return
+        record_size = BLOCK_RECORD_SIZE + bloom_size
+        if len(data) < num_blocks * record_size:
+            print_log(LOG.WARNING, "Index {} truncated, rebuilding it.",
+                    self.index_path)
+            return
+        for i in range(num_blocks):
+            offset = i * record_size
+            block_offset, size, first_line, lines, first_ts, last_ts = \
+                    struct_unpack_from(BLOCK_RECORD, data, offset)
+            bloom = None
+            if bloom_size:
+                offset = offset + BLOCK_RECORD_SIZE
+                bloom = data[offset:offset+bloom_size]
+            self.blocks.append(IndexBlock(block_offset, size, first_line,
+                    lines, first_ts.rstrip(b"\0"), last_ts.rstrip(b"\0"),
+                    bloom))
+        self.indexed_size = indexed_size
+        self._head = head.rstrip(b"\0")
+        if self.blocks:
+            self.lines = self.blocks[-1].first_line + self.blocks[-1].lines
+
+    def reset(self):
+        '''Discard all indexed blocks.'''
+        self.blocks = []
+        self.indexed_size = 0
+        self.lines = 0
+        self._head = b""
+
+    def update(self, mm=None):
+        '''Index the new complete blocks of the log (a memory map of the
+        log can be provided), get the number of new blocks.'''
+        own_map = (mm is None)
+        if own_map:
+            mm = file_mmap(self.log_path)
+        if mm is None:
+            return 0
+        try:
+            # The log was rotated, truncated or replaced
+            head = mm[:INDEX_HEAD_SIZE]
+            if (len(mm) < self.indexed_size) or \
+                    (head[:len(self._head)] != self._head):
+                print_log(LOG.INFO, "Log {} changed, rebuilding index.",
+                        self.log_path)
+                self.reset()
+            if not self.blocks:
+                self._head = head
+            new_blocks = []
+            while len(mm) - self.indexed_size >= self.block_size:
+                block = self._block_index(mm, self.indexed_size)
+                if block is None:
+                    break
+                new_blocks.append(block)
+                self.blocks.append(block)
+                self.indexed_size = block.offset + block.size
+                self.lines = self.lines + block.lines
+        finally:
+            if own_map:
+                mm.close()
+        if new_blocks:
+            self._save(new_blocks)
+        return len(new_blocks)
+
+    def _block_index(self, mm, offset):
+        '''Index the block of whole lines that starts at an offset (None if
+        there is not a complete block yet).'''
+        end = mm.find(b"\n", offset + self.block_size - 1)
+        if end == -1:
+            return None
+        end = end + 1
+        data = mm[offset:end]
+        last_line = data.rfind(b"\n", 0, len(data) - 1) + 1
+        first_ts = data[:TIMESTAMP_SIZE]
+        last_ts = data[last_line:last_line+TIMESTAMP_SIZE]
+        if not TIMESTAMP_RE.match(first_ts):
+            first_ts = b""
+        if not TIMESTAMP_RE.match(last_ts):
+            last_ts = b""
+        bloom = None
+        if self.bloom_bits:
+            bloom = bloom_build(data, self.bloom_bits)
+        return IndexBlock(offset, end - offset, self.lines,
+                data.count(b"\n"), first_ts, last_ts, bloom)
+
+    def _save(self, new_blocks):
+        '''Append new block records to the index file (it is rewritten if
+        it has no blocks).'''
+        header = struct_pack(INDEX_HEADER, INDEX_MAGIC, INDEX_VERSION,
+                self.bloom_bits, self.block_size, len(self.blocks),
+                self.indexed_size, self._head)
+        record_size = BLOCK_RECORD_SIZE + (self.bloom_bits // 8)
+        try:
+            if (len(new_blocks) == len(self.blocks)) or \
+                    (not os_path.exists(self.index_path)):
+                with open(self.index_path, "wb") as f:
+                    f.write(header)
+                    for block in self.blocks:
+                        f.write(block.pack())
+                return
+            # The header is updated after the records, so an interrupted
+            # update just loses the new records
+            with open(self.index_path, "r+b") as f:
+                f.seek(INDEX_HEADER_SIZE + (record_size *
+                        (len(self.blocks) - len(new_blocks))))
+                for block in new_blocks:
+                    f.write(block.pack())
+                f.truncate()
+                f.flush()
+                f.seek(0)
+                f.write(header)
+        except OSError as e:
+            print_log(LOG.ERROR, "Can't write index {}: {}", self.index_path,
+                    e)
+
+###############################################################################
+### Search
+
+class SearchStats():
+    '''Search query statistics.'''
+
+    def __init__(self):
+        self.blocks = 0
+        self.blocks_scanned = 0
+        self.bytes_scanned = 0
+        self.matches = 0
+        self.index_time = 0.0
+        self.search_time = 0.0
+
+
+def capture_search(index, mm, pattern=None, regex=False, ignore_case=False,
+        start=None, end=None, direction=None, stats=None):
+    '''Search a memory-mapped text capture log, yield the (line number,
+    line) of the lines that match the pattern (any line if None), are in
+    the timestamps range (prefixes of the "YYYY-mm-dd_HH:MM:SS.mmm" format,
+    both included) and have the direction ("RX", "TX" or "MARK").'''
+    if stats is None:
+        stats = SearchStats()
+    if isinstance(pattern, str):
+        pattern = pattern.encode()
+    if isinstance(start, str):
+        start = start.encode()
+    if isinstance(end, str):
+        end = end.encode()
+    tag = None
+    if direction is not None:
+        tag = "[{}] ".format(direction).encode()
+    # Literals are found with a plain search, the rest with a regex
+    literal = None
+    matcher = None
+    trigrams = set()
+    if pattern is None:
+        literal = b""
+    elif regex:
+        matcher = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        if not ignore_case:
+            for run in regex_literals(pattern):
+                trigrams.update(text_trigrams(run))
+    elif ignore_case:
+        matcher = re.compile(re.escape(pattern), re.IGNORECASE)
+    else:
+        literal = pattern
+        trigrams = text_trigrams(pattern)
+    # Candidate blocks and the not indexed log tail
+    regions = []
+    for block in index.blocks:
+        if block.in_time_range(start, end) and \
+                block.may_contain(trigrams, index.bloom_bits):
+            regions.append((block.offset, block.offset + block.size,
+                    block.first_line))
+    stats.blocks = len(index.blocks)
+    stats.blocks_scanned = len(regions)
+    if len(mm) > index.indexed_size:
+        regions.append((index.indexed_size, len(mm), index.lines))
+    for region_start, region_end, first_line in regions:
+        stats.bytes_scanned = stats.bytes_scanned + \
+                (region_end - region_start)
+        line_number = first_line
+        counted = region_start
+        pos = region_start
+        while pos < region_end:
+            if literal is not None:
+                found = mm.find(literal, pos, region_end)
+            else:
+                match = matcher.search(mm, pos, region_end)
+                found = -1 if match is None else match.start()
+            if found == -1:
+                break
+            line_start = mm.rfind(b"\n", region_start, found) + 1
+            if line_start == 0:
+                line_start = region_start
+            line_end = mm.find(b"\n", found, region_end)
+            if line_end == -1:
+                line_end = region_end
+            pos = line_end + 1
+            line = mm[line_start:line_end]
+            if not line_matches(line, start, end, tag):
+                continue
+            line_number = line_number + \
+                    mm[counted:line_start].count(b"\n")
+            counted = line_start
+            stats.matches = stats.matches + 1
+            yield (line_number + 1, line)
+
+
+def line_matches(line, start=None, end=None, tag=None):
+    '''Check if a capture line is in a timestamps range and has a
+    direction tag.'''
+    if (start is None) and (end is None) and (tag is None):
+        return True
+    if not TIMESTAMP_RE.match(line):
+        return False
+    timestamp = line[:TIMESTAMP_SIZE]
+    if (start is not None) and (timestamp < start):
+        return False
+    if (end is not None) and (timestamp[:len(end)] > end):
+        return False
+    if (tag is not None) and \
+            (line[TIMESTAMP_SIZE+1:TIMESTAMP_SIZE+1+len(tag)] != tag):
+        return False
+    return True
+
+
+def timestamp_parse(timestamp):
+    '''Check a query timestamp (a prefix of "YYYY-mm-dd_HH:MM:SS.mmm",
+    date and time can be separated by a space), get it in the log format
+    or raise ValueError if it is invalid.'''
+    timestamp = timestamp.strip().replace(" ", "_")
+    if not TIMESTAMP_QUERY_RE.match(timestamp):
+        raise ValueError("Invalid timestamp {} (expected " \
+                "YYYY-mm-dd_HH:MM:SS.mmm or a prefix of it)".format(
+                timestamp))
+    return timestamp
+
+###############################################################################
+### Bloom Filter Functions
+
+def trigram_hash(trigram, bloom_bits):
+    '''Get the bloom filter bit of a trigram.'''
+    return ((int.from_bytes(trigram, "little") * 2654435761) >> 16) % \
+            bloom_bits
+
+
+def text_trigrams(text):
+    '''Get the trigrams of a query text that can be looked up in the bloom
+    filters (trigrams that span whitespaces are not indexed).'''
+    trigrams = set()
+    for token in text.split():
+        trigrams.update(token[i:i+3] for i in range(len(token) - 2))
+    return set(trigram for trigram in trigrams
+            if not TIMESTAMP_CHARS_RE.match(trigram))
+
+
+def bloom_build(data, bloom_bits):
+    '''Get the bloom filter of a block text trigrams (the trigrams of its
+    distinct tokens, much faster than a sliding window over all data).'''
+    trigrams = set()
+    for token in set(TIMESTAMP_PREFIX_RE.sub(b"", data).split()):
+        trigrams.update(token[i:i+3] for i in range(len(token) - 2))
+    bloom = bytearray(bloom_bits // 8)
+    for trigram in trigrams:
+        bit = trigram_hash(trigram, bloom_bits)
+        bloom[bit >> 3] = bloom[bit >> 3] | (1 << (bit & 7))
+    return bytes(bloom)
+
+
+def regex_literals(pattern):
+    '''Get the literal runs that any match of a regex pattern must contain
+    (none for patterns with alternatives, groups or escapes).'''
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode(errors="replace")
+    if ("|" in pattern) or ("(" in pattern) or ("\\" in pattern):
+        return []
+    runs = []
+    run = ""
+    in_class = False
+    for i, c in enumerate(pattern):
+        if in_class:
+            in_class = (c != "]")
+            continue
+        if c not in REGEX_SPECIAL:
+            # A character with a quantifier can be missing
+            if (i + 1 < len(pattern)) and \
+                    (pattern[i+1] in REGEX_QUANTIFIERS):
+                runs.append(run)
+                run = ""
+            else:
+                run = run + c
+            continue
+        runs.append(run)
+        run = ""
+        in_class = (c == "[")
+    runs.append(run)
+    return [run.encode() for run in runs if len(run) >= 3]
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    # Imported here, the index is used while logging too
+    from argparse import ArgumentParser as argparse_ArgumentParser
+    arg_parser = argparse_ArgumentParser(prog="search")
+    arg_parser.add_argument("log", help="Text capture log file to search",
+                            action='store', type=str)
+    arg_parser.add_argument("pattern", help="Text to find (any line if " \
+                            "not provided)", action='store', type=str,
+                            nargs='?')
+    arg_parser.add_argument("-r", "--regex", action='store_true',
+                            help="The pattern is a regular expression")
+    arg_parser.add_argument("-i", "--ignore-case", action='store_true',
+                            help="Case insensitive search")
+    arg_parser.add_argument("-s", "--start", action='store', type=str,
+                            help="From this timestamp (YYYY-mm-dd_HH:MM:SS)")
+    arg_parser.add_argument("-e", "--end", action='store', type=str,
+                            help="Until this timestamp (YYYY-mm-dd_HH:MM:SS)")
+    arg_parser.add_argument("-d", "--direction", action='store', type=str,
+                            choices=DIR.TEXT,
+                            help="Only lines of this direction")
+    arg_parser.add_argument("-c", "--count", action='store_true',
+                            help="Just show the number of matching lines")
+    arg_parser.add_argument("-m", "--max-count", action='store', type=int,
+                            help="Stop after this number of matching lines")
+    arg_parser.add_argument("--no-bloom", action='store_true',
+                            help="Index without bloom filters (faster to " \
+                            "build, time range queries only)")
+    arg_parser.add_argument("--stats", action='store_true',
+                            help="Show index and scanned blocks statistics")
+    args = arg_parser.parse_args(argv[1:])
+    try:
+        start = None if args.start is None else timestamp_parse(args.start)
+        end = None if args.end is None else timestamp_parse(args.end)
+        if args.regex:
+            re.compile(args.pattern or "")
+    except (ValueError, re.error) as e:
+        print_log(LOG.ERROR, str(e))
+        return RC.FAIL
+    if not os_path.exists(args.log):
+        print_log(LOG.ERROR, "File {} not found.", args.log)
+        return RC.FAIL
+    stats = SearchStats()
+    bloom_bits = 0 if args.no_bloom else CONST.SEARCH_BLOOM_BITS
+    index = CaptureIndex(args.log, bloom_bits=bloom_bits)
+    mm = file_mmap(args.log)
+    if mm is None:
+        if args.count:
+            print(0)
+        return RC.OK
+    try:
+        time_start = time.perf_counter()
+        index.load()
+        index.update(mm)
+        stats.index_time = time.perf_counter() - time_start
+        time_start = time.perf_counter()
+        for line_number, line in capture_search(index, mm, args.pattern,
+                args.regex, args.ignore_case, start, end, args.direction,
+                stats):
+            if not args.count:
+                sys_stdout.write("{}:{}\n".format(line_number,
+                        line.decode(errors="replace")))
+            if (args.max_count is not None) and \
+                    (stats.matches >= args.max_count):
+                break
+        stats.search_time = time.perf_counter() - time_start
+        if args.count:
+            print(stats.matches)
+        sys_stdout.flush()
+    except BrokenPipeError:
+        # Output closed (i.e. piped to head), discard pending stdout data
+        os_dup2(os_open(os_devnull, O_WRONLY), sys_stdout.fileno())
+    finally:
+        mm.close()
+    if args.stats:
+        print("\n{} matches, {} of {} blocks scanned ({} bytes), index " \
+                "update {:.3f} s, search {:.3f} s".format(stats.matches,
+                stats.blocks_scanned, stats.blocks, stats.bytes_scanned,
+                stats.index_time, stats.search_time))
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    metrics.py
+Description:
+    Instrumentation metrics. Modules register counters, gauges and fixed
+    buckets histograms (optionally labeled, i.e. by port) in a process wide
+    registry, that updates them with a single lock acquire and bisect, and
+    metrics backed by a function read existing statistics only when they
+    are collected. The registry can be exposed through a local Unix socket
+    (Prometheus text format for each connection), a periodically updated
+    Prometheus textfile and a human readable summary.
+    It can be executed to get the metrics of a running instance:
+        python metrics.py <PORT|SOCKET_FILE>
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import socket
+from bisect import bisect_left
+from os import path as os_path
+from os import makedirs as os_makedirs
+from os import remove as os_remove
+from os import replace as os_replace
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from sys import stdout as sys_stdout
+from threading import Thread, Lock, Event
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+
+###############################################################################
+### Metrics
+
+class Counter():
+    '''Monotonic counter (or a function that gets its value).'''
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=(), fn=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.value = 0
+        self._fn = fn
+        self._lock = Lock()
+
+    def inc(self, amount=1):
+        '''Increase the counter.'''
+        with self._lock:
+            self.value = self.value + amount
+
+    def get(self):
+        '''Get current value.'''
+        if self._fn is not None:
+            return self._fn()
+        return self.value
+
+
+class Gauge(Counter):
+    '''Value that can go up and down (or a function that gets it).'''
+
+    kind = "gauge"
+
+    def set(self, value):
+        '''Set the gauge value.'''
+        self.value = value
+
+
+class Histogram():
+    '''Fixed buckets histogram (buckets are the upper bounds).'''
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        '''Add a value to its bucket.'''
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] = self.counts[i] + 1
+            self.sum = self.sum + value
+            self.count = self.count + 1
+
+    def quantile(self, q):
+        '''Estimate a quantile (upper bound of the bucket that holds it).'''
+        if not self.count:
+            return 0
+        target = q * self.count
+        accumulated = 0
+        for i, count in enumerate(self.counts):
+            accumulated = accumulated + count
+            if accumulated >= target:
+                if i < len(self.buckets):
+                    return self.buckets[i]
+                break
+        return float("inf")
+
+###############################################################################
+### Metrics Registry
+
+class MetricsRegistry():
+    '''Set of registered metrics.'''
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        '''Get or register a counter.'''
+        return self._register(Counter, name, help_text, labels, fn=fn)
+
+    def gauge(self, name, help_text, labels=None, fn=None):
+        '''Get or register a gauge.'''
+        return self._register(Gauge, name, help_text, labels, fn=fn)
+
+    def histogram(self, name, help_text, buckets, labels=None):
+        '''Get or register a histogram.'''
+        return self._register(Histogram, name, help_text, labels,
+                buckets=buckets)
+
+    def metrics(self):
+        '''Get the registered metrics sorted by name.'''
+        with self._lock:
+            return [self._metrics[key] for key in sorted(self._metrics)]
+
+    def prometheus_text(self):
+        '''Get all metrics in Prometheus text exposition format.'''
+        lines = []
+        last_name = None
+        for metric in self.metrics():
+            if metric.name != last_name:
+                last_name = metric.name
+                lines.append("# HELP {} {}".format(metric.name, metric.help))
+                lines.append("# TYPE {} {}".format(metric.name, metric.kind))
+            if metric.kind != "histogram":
+                lines.append("{}{} {}".format(metric.name,
+                        labels_text(metric.labels), metric.get()))
+                continue
+            accumulated = 0
+            for bound, count in zip(metric.buckets + ("+Inf",),
+                    metric.counts):
+                accumulated = accumulated + count
+                lines.append("{}_bucket{} {}".format(metric.name,
+                        labels_text(metric.labels + (("le", bound),)),
+                        accumulated))
+            lines.append("{}_sum{} {}".format(metric.name,
+                    labels_text(metric.labels), metric.sum))
+            lines.append("{}_count{} {}".format(metric.name,
+                    labels_text(metric.labels), metric.count))
+        return "\n".join(lines) + "\n"
+
+    def summary_text(self):
+        '''Get a human readable summary of all metrics.'''
+        lines = []
+        for metric in self.metrics():
+            name = "{}{}".format(metric.name, labels_text(metric.labels))
+            if metric.kind != "histogram":
+                lines.append("{}: {}".format(name, metric.get()))
+            elif metric.count:
+                lines.append("{}: count {}, avg {:.6g}, p50 <= {}, " \
+                        "p99 <= {}".format(name, metric.count,
+                        metric.sum / metric.count, metric.quantile(0.5),
+                        metric.quantile(0.99)))
+            else:
+                lines.append("{}: count 0".format(name))
+        return "\n".join(lines)
+
+    def _register(self, metric_class, name, help_text, labels, **kwargs):
+        '''Get a metric, creating it if it is not registered (metrics
+        backed by a function are replaced, to read the last instance).'''
+        labels = tuple(sorted((labels or {}).items()))
+        key = (name, labels)
+        with self._lock:
+            metric = self._metrics.get(key)
+            if (metric is None) or (kwargs.get("fn") is not None):
+                if metric_class is Histogram:
+                    metric = Histogram(name, help_text, kwargs["buckets"],
+                            labels)
+                else:
+                    metric = metric_class(name, help_text, labels,
+                            kwargs.get("fn"))
+                self._metrics[key] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+###############################################################################
+### Port Metrics
+
+class PortMetrics():
+    '''Serial port instrumentation metrics.'''
+
+    def __init__(self, port, registry=REGISTRY):
+        labels = {"port": port}
+        self.rx_bytes = registry.counter("multisterm_rx_bytes_total",
+                "Bytes read from the port", labels)
+        self.rx_reads = registry.counter("multisterm_rx_reads_total",
+                "Read calls that returned data", labels)
+        self.rx_chunk = registry.histogram("multisterm_rx_chunk_bytes",
+                "Bytes returned by each read",
+                CONST.METRICS_SIZE_BUCKETS, labels)
+        self.tx_bytes = registry.counter("multisterm_tx_bytes_total",
+                "Bytes written to the port", labels)
+        self.decode_errors = registry.counter(
+                "multisterm_decode_errors_total",
+                "Received data text decode errors", labels)
+        self.read_errors = registry.counter("multisterm_read_errors_total",
+                "Port read failures", labels)
+        self.opens = registry.counter("multisterm_opens_total",
+                "Port opens (including reopens)", labels)
+        self.open_errors = registry.counter("multisterm_open_errors_total",
+                "Port open failures", labels)
+
+    def rx(self, num_bytes):
+        '''Account a read.'''
+        self.rx_bytes.inc(num_bytes)
+        self.rx_reads.inc()
+        self.rx_chunk.observe(num_bytes)
+
+
+_ports_metrics = {}
+
+
+def port_metrics(port):
+    '''Get the metrics of a port.'''
+    metrics = _ports_metrics.get(port)
+    if metrics is None:
+        metrics = PortMetrics(str(port))
+        _ports_metrics[port] = metrics
+    return metrics
+
+###############################################################################
+### Metrics Exporters
+
+class MetricsServer():
+    '''Unix socket that sends the metrics to each client connection.'''
+
+    def __init__(self, sock_path, registry=REGISTRY):
+        self.sock_path = sock_path
+        self.registry = registry
+        self._server = None
+        self._thread = None
+        self._stop = Event()
+
+    def start(self):
+        '''Create the socket and launch the server thread.'''
+        sock_dir = os_path.dirname(self.sock_path)
+        if not os_path.exists(sock_dir):
+            os_makedirs(sock_dir, 0o775)
+        if os_path.exists(self.sock_path):
+            os_remove(self.sock_path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.sock_path)
+        self._server.listen(CONST.BROKER_MAX_PENDING_CONNECTIONS)
+        self._server.settimeout(CONST.METRICS_SOCKET_POLL_TIME)
+        self._thread = Thread(target=self._th_server)
+        self._thread.daemon = True
+        self._thread.start()
+        print_log(LOG.INFO, "Metrics available at {}", self.sock_path)
+
+    def stop(self):
+        '''Stop the server and remove the socket.'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            if os_path.exists(self.sock_path):
+                os_remove(self.sock_path)
+
+    def _th_server(self):
+        '''Server thread.'''
+        while not self._stop.is_set():
+            try:
+                client, _ = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                client.settimeout(CONST.METRICS_SOCKET_POLL_TIME)
+                client.sendall(self.registry.prometheus_text().encode())
+            except OSError:
+                pass
+            client.close()
+
+
+class MetricsFileExporter():
+    '''Periodically write the metrics to a Prometheus textfile.'''
+
+    def __init__(self, file_path, interval=CONST.METRICS_FILE_INTERVAL,
+            registry=REGISTRY):
+        self.file_path = file_path
+        self.interval = interval
+        self.registry = registry
+        self._thread = None
+        self._stop = Event()
+
+    def start(self):
+        '''Launch the exporter thread.'''
+        self._thread = Thread(target=self._th_export)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the exporter (metrics file is updated a last time).'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self):
+        '''Write the metrics file (atomically replaced, so the collector
+        never reads a partial file).'''
+        tmp_path = "{}.tmp".format(self.file_path)
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(self.registry.prometheus_text())
+            os_replace(tmp_path, self.file_path)
+        except OSError as e:
+            print_log(LOG.ERROR, "Can't write metrics file: {}", e)
+
+    def _th_export(self):
+        '''Exporter thread.'''
+        while not self._stop.wait(self.interval):
+            self.write()
+        self.write()
+
+###############################################################################
+### Metrics Exporting
+
+# Running exporters and if the summary must be shown at stop
+_exporters = []
+_summary = [False]
+
+
+def metrics_start(sock_path=None, file_path=None, summary=False):
+    '''Start exposing the metrics through a socket and/or a Prometheus
+    textfile, and/or showing its summary at metrics_stop().'''
+    if sock_path is not None:
+        server = MetricsServer(sock_path)
+        try:
+            server.start()
+            _exporters.append(server)
+        except OSError as e:
+            print_log(LOG.ERROR, "Can't create metrics socket: {}", e)
+    if file_path is not None:
+        exporter = MetricsFileExporter(file_path)
+        exporter.start()
+        _exporters.append(exporter)
+    _summary[0] = summary
+
+
+def metrics_stop():
+    '''Stop the metrics exporters and show the summary if requested.'''
+    while _exporters:
+        _exporters.pop().stop()
+    if _summary[0]:
+        _summary[0] = False
+        print("\nMetrics:\n{}".format(REGISTRY.summary_text()))
+
+###############################################################################
+### Auxiliar Functions
+
+def labels_text(labels):
+    '''Prometheus labels text.'''
+    if not labels:
+        return ""
+    return "{{{}}}".format(",".join("{}=\"{}\"".format(key, value)
+            for key, value in labels))
+
+
+def metrics_socket_path(name):
+    '''Get the metrics socket path of an instance (by its port, or a name
+    like "multiport").'''
+    if os_path.exists(name):
+        name = os_path.realpath(name)
+    name = name.strip("/").replace("/", "_")
+    return os_path.join(CONST.METRICS_SOCKET_DIR,
+            "{}.metrics.sock".format(name))
+
+
+def metrics_read(sock_path):
+    '''Get the metrics of a running instance from its socket.'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    chunks = []
+    try:
+        sock.connect(sock_path)
+        while True:
+            data = sock.recv(CONST.BROKER_RECV_SIZE)
+            if not data:
+                break
+            chunks.append(data)
+    finally:
+        sock.close()
+    return b"".join(chunks).decode()
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    if argc != 2:
+        print("Usage: python metrics.py <PORT|SOCKET_FILE>")
+        return RC.FAIL
+    sock_path = argv[1]
+    if not sock_path.endswith(".sock"):
+        sock_path = metrics_socket_path(sock_path)
+    try:
+        sys_stdout.write(metrics_read(sock_path))
+    except OSError as e:
+        print_log(LOG.ERROR, "Can't get metrics from {}: {}", sock_path, e)
+        return RC.FAIL
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))
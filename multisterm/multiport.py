@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    multiport.py
+Description:
+    Multi-port terminal mode. Any number of Serial ports are served by a
+    single event loop, each one with its own BaudRate (fixed or detected),
+    its own capture log and a prefix to identify its data in the merged
+    output. There are no per-port threads, so resources grow with the
+    traffic and not with the number of ports. Failed ports are reopened
+    when they come back (hot-plug).
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from os import path as os_path
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import LOG, CONST
+from auxiliar import (
+    print_log, is_int, stdin_input, stdin_settings_get, stdin_settings_restore
+)
+from filesrw import file_exists, file_read_all_text
+from serialcomm import (
+    serial_open, serial_close, serial_is_url, SerialTimeoutException
+)
+from serialloop import SerialEventLoop
+from serialwriter import SerialWriter
+from hotplug import PortSupervisor
+from bauddetect import bauds_detect_cached
+from capturelog import CaptureLogger, TextCaptureSink
+from output import OutputRenderer
+from profiling import span
+
+###############################################################################
+### Port Channel
+
+class PortChannel():
+    '''Multi-port mode port state.'''
+
+    def __init__(self, port, bauds=0, name=None, log_file=None):
+        self.port = port
+        self.bauds = bauds
+        self.name = name
+        if self.name is None:
+            self.name = os_path.basename(port)
+        self.log_file = log_file
+        self.ser = None
+        self.writer = None
+        self.supervisor = None
+        self.capture = None
+        self.prefix = "[{}] ".format(self.name).encode()
+        self.partial = bytearray()
+        self.partial_time = 0
+
+###############################################################################
+### Configuration Functions
+
+def ports_parse_spec(spec):
+    '''Parse a port specification "PORT[:BAUDS[:NAME]]" (BAUDS can be
+    "auto" to detect it). A PORT URL keeps its "<HOST>:<PORT>" address
+    (i.e. "socket://<HOST>:<PORT>:115200:dut").'''
+    fields = spec.split(":")
+    if serial_is_url(spec):
+        scheme, _, address = spec.partition("://")
+        fields = address.split(":")
+        fields = ["{}://{}".format(scheme, ":".join(fields[:2]))] + \
+            fields[2:]
+    bauds = 0
+    name = None
+    if (len(fields) > 1) and is_int(fields[1]):
+        bauds = int(fields[1])
+    if (len(fields) > 2) and fields[2]:
+        name = fields[2]
+    return PortChannel(fields[0], bauds, name)
+
+
+def ports_parse_file(file_path):
+    '''Parse a ports configuration file, with a port each line:
+    PORT [bauds=<BAUDS>|auto] [name=<NAME>] [log=<LOG_FILE>]'''
+    channels = []
+    if not file_exists(file_path):
+        print_log(LOG.ERROR, "Ports file {} not found.", file_path)
+        return channels
+    for line in file_read_all_text(file_path).splitlines():
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        fields = line.split()
+        options = {}
+        for field in fields[1:]:
+            key, _, value = field.partition("=")
+            options[key] = value
+        bauds = 0
+        if is_int(options.get("bauds", "")):
+            bauds = int(options["bauds"])
+        channels.append(PortChannel(fields[0], bauds, options.get("name"),
+                options.get("log")))
+    return channels
+
+###############################################################################
+### Multi-Port Terminal
+
+class MultiPortTerminal():
+    '''Serve multiple Serial ports with a single event loop.'''
+
+    def __init__(self, channels, log_dir=None):
+        self.channels = channels
+        self.log_dir = log_dir
+        self.capture = None
+        self.loop = None
+        self.output = OutputRenderer()
+        self._names = {}
+
+    def open(self):
+        '''Detect unknown BaudRates and open all the ports (ports that can't
+        be open are discarded).'''
+        to_detect = [ch for ch in self.channels if ch.bauds == 0]
+        if to_detect:
+            print("\nDetecting BaudRate of {} ports...".format(len(to_detect)))
+            with ThreadPoolExecutor(CONST.MULTIPORT_DETECT_WORKERS) as pool:
+                results = pool.map(bauds_detect_cached,
+                        [ch.port for ch in to_detect])
+                for channel, result in zip(to_detect, results):
+                    print("[{}] {}".format(channel.name, result))
+                    channel.bauds = result.bauds
+        opened = []
+        for channel in self.channels:
+            if channel.bauds == 0:
+                continue
+            channel.ser = serial_open(channel.port, channel.bauds, 0, 1.0)
+            if channel.ser is None:
+                print("[{}] Can't open Serial port.".format(channel.name))
+                continue
+            opened.append(channel)
+        self.channels = opened
+        self._names = {ch.name: ch for ch in self.channels}
+        # Captures of all ports are written by a single thread
+        self.capture = CaptureLogger()
+        for channel in self.channels:
+            log_file = channel.log_file
+            if (log_file is None) and (self.log_dir is not None):
+                log_file = os_path.join(self.log_dir,
+                        "{}.log".format(channel.name))
+            if log_file is not None:
+                channel.capture = self.capture.channel(
+                        TextCaptureSink(log_file))
+        self.capture.start()
+        return len(self.channels) > 0
+
+    def close(self):
+        '''Close all ports and captures.'''
+        for channel in self.channels:
+            self.channel_flush(channel)
+            if channel.writer is not None:
+                channel.writer.stop()
+                channel.writer = None
+            if (channel.ser is not None) and channel.ser.isOpen():
+                serial_close(channel.ser)
+        self.output.stop()
+        if self.capture is not None:
+            self.capture.stop()
+
+    def run(self):
+        '''Multi-port terminal main loop.'''
+        self.loop = SerialEventLoop()
+        for channel in self.channels:
+            channel.supervisor = PortSupervisor(self.loop, channel.ser,
+                    lambda data, ch=channel: self.channel_read(ch, data),
+                    lambda e, ch=channel: self.channel_error(ch, e),
+                    lambda outage, ch=channel: self.channel_reconnect(ch,
+                            outage))
+            channel.supervisor.start()
+            # Writes are queued, so a slow port does not block the input
+            # of the others, and they are held while the port is reopened
+            channel.writer = SerialWriter(channel.ser, on_error=lambda e,
+                    ch=channel: self.channel_write_error(ch, e))
+            channel.writer.start()
+        self.loop.add_timer(CONST.MULTIPORT_LINE_TIMEOUT,
+                self.channels_flush_partial)
+        th_write = Thread(target=self._th_write)
+        th_write.daemon = True
+        stdin_settings = stdin_settings_get()
+        print("\nMulti-Port Terminal Start ({} ports)".format(
+                len(self.channels)))
+        self.output.start()
+        th_write.start()
+        try:
+            self.loop.run()
+        except KeyboardInterrupt:
+            pass
+        for channel in self.channels:
+            channel.supervisor.close()
+        self.loop.close()
+        stdin_settings_restore(stdin_settings)
+
+    def channel_read(self, channel, data):
+        '''Log and show received data of a port, prefixing each line.'''
+        if channel.capture is not None:
+            channel.capture.log_rx(data)
+        with span("decode"):
+            self.channel_show(channel, data)
+
+    def channel_show(self, channel, data):
+        '''Show received data of a port, prefixing each line.'''
+        last_eol = data.rfind(b"\n")
+        if last_eol == -1:
+            if not channel.partial:
+                channel.partial_time = time.monotonic()
+            channel.partial.extend(data)
+            return
+        out = bytearray(channel.prefix)
+        out.extend(channel.partial)
+        out.extend(data[:last_eol+1].replace(b"\n", b"\n" + channel.prefix))
+        del out[-len(channel.prefix):]
+        channel.partial.clear()
+        channel.partial.extend(data[last_eol+1:])
+        channel.partial_time = time.monotonic()
+        self.output.write(out)
+
+    def channel_flush(self, channel):
+        '''Show pending incomplete line of a port.'''
+        if not channel.partial:
+            return
+        self.output.write(channel.prefix + channel.partial + b"\n")
+        channel.partial.clear()
+
+    def channels_flush_partial(self):
+        '''Show incomplete lines that have been waiting too long.'''
+        now = time.monotonic()
+        for channel in self.channels:
+            if channel.partial and (now - channel.partial_time
+                    >= CONST.MULTIPORT_LINE_TIMEOUT):
+                self.channel_flush(channel)
+
+    def channel_error(self, channel, error):
+        '''Handle a port failure (it is reopened when it comes back).'''
+        channel.writer.pause()
+        self.channel_flush(channel)
+        print("[{}] Serial port fail ({}), waiting for it...".format(
+                channel.name, error))
+        if channel.capture is not None:
+            channel.capture.mark("Serial port fail ({})".format(error))
+
+    def channel_reconnect(self, channel, outage):
+        '''Handle a failed port reopening.'''
+        print("[{}] Serial port reconnected ({:.3f} s outage).".format(
+                channel.name, outage))
+        if channel.capture is not None:
+            channel.capture.mark("Serial port reconnected ({:.3f} s " \
+                    "outage)".format(outage))
+        channel.writer.resume()
+
+    def channel_write(self, channel, text):
+        '''Queue a write to a port (held while it is disconnected).'''
+        data = text.encode()
+        if not channel.writer.write(data, flush=True, block=False):
+            print("[{}] Write queue full, discarded.".format(channel.name))
+            return
+        if not channel.supervisor.connected:
+            print("[{}] Serial port disconnected, write held.".format(
+                    channel.name))
+        if channel.capture is not None:
+            channel.capture.log_tx(data)
+
+    def channel_write_error(self, channel, error):
+        '''Port write failure (writer thread). The failed writes are held
+        and the port is reopened, except for write timeouts, whose writes
+        are discarded (they can be partially written).'''
+        if isinstance(error, SerialTimeoutException):
+            return False
+        self.loop.call_soon(lambda: channel.supervisor.fail(error))
+        return True
+
+    def _th_write(self):
+        '''Multi-port terminal write thread.'''
+        print("Write \"<NAME>: <TEXT>\" to send to a port, \"*: <TEXT>\" " \
+            "to send to all ports or \"--exit--\" to quit.\n")
+        while self.loop.is_running():
+            write_str = stdin_input()
+            if write_str == "--exit--":
+                self.loop.stop()
+                break
+            name, sep, text = write_str.partition(": ")
+            if not sep:
+                print("Unknown destination port.")
+                continue
+            if name == "*":
+                for channel in self.channels:
+                    self.channel_write(channel, text)
+            elif name in self._names:
+                self.channel_write(self._names[name], text)
+            else:
+                print("Unknown port {}.".format(name))
@@ -19,25 +19,44 @@ Version:
 ### Imported modules
 
 import time
+from os import path as os_path
+from os import getpid as os_getpid
 from sys import argv as sys_argv
 from sys import exit as sys_exit
-from argparse import ArgumentParser as argparse_ArgumentParser
 from threading import Thread
 
-from constants import RC, LOG, CONST
+from constants import RC, LOG, PRIO, CONST
 from texts import TEXT
-from auxiliar import print_log, stdin_input
-from serialcomm import (
-    serial_open, serial_close, serial_read, serial_read_str, serial_write
+from auxiliar import (
+    print_log, stdin_input, stdin_settings_get, stdin_settings_restore,
+    log_async_start, log_async_stop
+)
+from capturelog import CaptureLogger, TextCaptureSink
+from capturebin import BinaryCaptureSink
+from capturezip import CompressedCaptureSink
+from framing import DelimiterSplitter, framing_create
+from display import DataDisplay, hex_input_parse
+from output import OutputRenderer
+from metrics import (
+    REGISTRY, metrics_start, metrics_stop, metrics_socket_path
+)
+from profiling import span, profiling_start, profiling_stop
+from triggers import (
+    Trigger, TriggerEngine, triggers_parse_file, triggers_check
+)
+from broker import (
+    SerialBroker, broker_socket_path, broker_is_running
 )
 
+# Modules that import pyserial (serialcomm, serialloop, bauddetect,
+# filetransfer, multiport, session and transaction) are imported by the
+# functions that use them, so --help and --version don't pay for it
+
 ###############################################################################
 ### Globals
 
-ser = None
-th_read = None
-th_write = None
-g_terminal_close = False
+# Program start time (time to first byte report)
+START_TIME = time.monotonic()
 
 ###############################################################################
 
@@ -50,8 +69,10 @@ def show_help():
     print(LOG.INFO, text_help)
 
 
-def parse_options():
-    '''Get and parse program input arguments.'''
+def parse_options(args=None):
+    '''Get and parse program input arguments (from command line if no
+    arguments are provided).'''
+    from argparse import ArgumentParser as argparse_ArgumentParser
     arg_parser = argparse_ArgumentParser()
     arg_parser.version = CONST.APP_VERSION
     arg_parser.add_argument("-p", "--port", help=TEXT.OPT_PORT, 
@@ -60,156 +81,746 @@ def parse_options():
                             action='store', nargs=1, type=int)
     arg_parser.add_argument("-l", "--log", help=TEXT.OPT_LOG,
                             action='store', nargs=1, type=str)
+    arg_parser.add_argument("--log-format", help=TEXT.OPT_LOG_FORMAT,
+                            action='store', nargs=1, type=str,
+                            choices=[CONST.CAPTURE_FORMAT_TEXT,
+                                     CONST.CAPTURE_FORMAT_BINARY])
+    arg_parser.add_argument("--log-max-size", help=TEXT.OPT_LOG_MAX_SIZE,
+                            action='store', nargs=1, type=int)
+    arg_parser.add_argument("--log-max-time", help=TEXT.OPT_LOG_MAX_TIME,
+                            action='store', nargs=1, type=int)
+    arg_parser.add_argument("--log-index", help=TEXT.OPT_LOG_INDEX,
+                            action='store_true')
+    arg_parser.add_argument("--log-compress", help=TEXT.OPT_LOG_COMPRESS,
+                            action='store', nargs=1, type=str,
+                            choices=CONST.CAPTURE_COMPRESS_CODECS)
+    arg_parser.add_argument("--framing", help=TEXT.OPT_FRAMING,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--ready", help=TEXT.OPT_READY,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--ready-timeout", help=TEXT.OPT_READY_TIMEOUT,
+                            action='store', nargs=1, type=float)
+    arg_parser.add_argument("--display", help=TEXT.OPT_DISPLAY,
+                            action='store', nargs=1, type=str,
+                            choices=CONST.DISPLAY_MODES)
+    arg_parser.add_argument("--row-bytes", help=TEXT.OPT_ROW_BYTES,
+                            action='store', nargs=1, type=int)
+    arg_parser.add_argument("--no-offsets", help=TEXT.OPT_NO_OFFSETS,
+                            action='store_true')
+    arg_parser.add_argument("--input-mode", help=TEXT.OPT_INPUT_MODE,
+                            action='store', nargs=1, type=str,
+                            choices=CONST.INPUT_MODES)
+    arg_parser.add_argument("--highlight", help=TEXT.OPT_HIGHLIGHT,
+                            action='store', nargs='+', type=str)
+    arg_parser.add_argument("--filter", help=TEXT.OPT_FILTER,
+                            action='store', nargs='+', type=str)
+    arg_parser.add_argument("--filter-out", help=TEXT.OPT_FILTER_OUT,
+                            action='store', nargs='+', type=str)
+    arg_parser.add_argument("--triggers-file", help=TEXT.OPT_TRIGGERS_FILE,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--flow-control", help=TEXT.OPT_FLOW_CONTROL,
+                            action='store', nargs=1, type=str,
+                            choices=CONST.SERIAL_FLOW_CONTROLS)
+    arg_parser.add_argument("--stats", help=TEXT.OPT_STATS,
+                            action='store_true')
+    arg_parser.add_argument("--metrics-file", help=TEXT.OPT_METRICS_FILE,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--metrics-socket", help=TEXT.OPT_METRICS_SOCKET,
+                            action='store_true')
+    arg_parser.add_argument("--profile", help=TEXT.OPT_PROFILE,
+                            action='store', nargs=1, type=str,
+                            choices=CONST.PROFILERS)
+    arg_parser.add_argument("--profile-dir", help=TEXT.OPT_PROFILE_DIR,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--ports", help=TEXT.OPT_PORTS,
+                            action='store', nargs='+', type=str)
+    arg_parser.add_argument("--ports-file", help=TEXT.OPT_PORTS_FILE,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--broker", help=TEXT.OPT_BROKER,
+                            action='store_true')
+    arg_parser.add_argument("--broker-policy", help=TEXT.OPT_BROKER_POLICY,
+                            action='store', nargs=1, type=str,
+                            choices=[CONST.BROKER_POLICY_TRUNCATE,
+                                     CONST.BROKER_POLICY_DROP])
+    arg_parser.add_argument("--publish", help=TEXT.OPT_PUBLISH,
+                            action='store_true')
+    arg_parser.add_argument("--tap", help=TEXT.OPT_TAP,
+                            action='store_true')
+    arg_parser.add_argument("--serve", help=TEXT.OPT_SERVE,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--serve-rfc2217", help=TEXT.OPT_SERVE_RFC2217,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--batch", help=TEXT.OPT_BATCH,
+                            action='store', nargs=1, type=str)
+    arg_parser.add_argument("--batch-depth", help=TEXT.OPT_BATCH_DEPTH,
+                            action='store', nargs=1, type=int)
+    arg_parser.add_argument("--batch-expect", help=TEXT.OPT_BATCH_EXPECT,
+                            action='store', nargs=1, type=str)
     arg_parser.add_argument("-v", "--version", action='version')
-    args = arg_parser.parse_args()
+    args = arg_parser.parse_args(args)
     return vars(args)
 
 
 def auto_detect_serial_bauds(serial_port):
     '''Automatic Serial baudrate detection (check for ascii text in commons
     bauds).'''
-    bauds = 0
-    ser = None
-    for common_baud in CONST.SERIAL_COMMON_BAUDS:
-        # Try to open Serial port at current common baud rate
-        # If port can't be open, continue to next common bauds
-        print("\nChecking {} bauds...".format(common_baud))
-        ser = serial_open(serial_port, common_baud, 1.0, 1.0)
-        if ser is None:
-            continue
-        time.sleep(2)
-        # Send some strange string with end of line and read response
-        serial_write(ser, CONST.SERIAL_AUTODETECT_BAUDS_SEND)
-        readed_bytes = serial_read_str(ser)
-        if len(readed_bytes) == 0:
-            serial_close(ser)
-            continue
-        # Remove end of line bytes
-        readed_bytes = readed_bytes.replace("\r", "")
-        readed_bytes = readed_bytes.replace("\n", "")
-        # Ignore if readed bytes are less than 10 characters
-        if len(readed_bytes) < 5:
-            serial_close(ser)
-            continue
-        # Check how many characters are commons in human texts
-        num_human_chars = 0
-        for character in readed_bytes:
-            if character in CONST.SERIAL_AUTODETECT_ASCII_LIST:
-                num_human_chars = num_human_chars + 1
-        # If >=70% of the read string are common human text characters
-        # Assume that this is the correct baud rate
-        if ((num_human_chars / len(readed_bytes)) *100) >= 70:
-            bauds = common_baud
-            print_log(LOG.INFO, "Seems that BuadRate is {}".format(bauds))
-            serial_close(ser)
-            break
-        serial_close(ser)
-    return bauds
+    from bauddetect import bauds_detect_cached
+    result = bauds_detect_cached(serial_port)
+    print("\n{}".format(result))
+    return result.bauds
+
+
+def serial_broker(port, bauds, policy):
+    '''Own a Serial port and share it with clients through a broker.'''
+    from serialcomm import serial_open, serial_close
+    print("\nOpening port {} at {} bauds...".format(port, bauds))
+    broker_ser = serial_open(port, bauds, 1.0, 1.0)
+    if (broker_ser is None) or (not broker_ser.isOpen()):
+        print_log(LOG.INFO, "Can't open Serial port.")
+        return False
+    broker = SerialBroker(broker_ser, broker_socket_path(port), policy)
+    print("\nSerial Broker Start ({})".format(broker.sock_path))
+    try:
+        broker.run()
+    except KeyboardInterrupt:
+        pass
+    serial_close(broker_ser)
+    return True
 
 
-def serial_terminal(port, bauds):
-    '''Handle a Serial Terminal.'''
-    global ser
-    global th_read, th_write
-    # Opening Serial Port
+def net_bridge(port, bauds, listeners, policy):
+    '''Own a Serial port and serve it to network clients.'''
+    from serialcomm import serial_open, serial_close
+    from netbridge import NetBridge
     print("\nOpening port {} at {} bauds...".format(port, bauds))
-    ser = serial_open(port, bauds, 1.0, 1.0)
-    if (ser is None) or (not ser.isOpen()):
+    bridge_ser = serial_open(port, bauds, 1.0, 1.0)
+    if (bridge_ser is None) or (not bridge_ser.isOpen()):
         print_log(LOG.INFO, "Can't open Serial port.")
         return False
-    time.sleep(2)
-    # Launching Serial read and write threads
-    th_read = Thread(target=th_serial_read, args=(ser,))
-    th_write = Thread(target=th_serial_write, args=(ser,))
+    bridge = NetBridge(bridge_ser, listeners, policy)
+    print("\nNetwork Bridge Start ({})".format(", ".join(
+            "{}:{}{}".format(host, net_port, " RFC 2217" if rfc2217 else "")
+            for host, net_port, rfc2217 in listeners)))
+    rc = True
+    try:
+        bridge.run()
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print_log(LOG.ERROR, str(e))
+        rc = False
+    serial_close(bridge_ser)
+    return rc
+
+
+def serial_batch(port, bauds, script_file, depth=CONST.TRANSACTION_DEPTH,
+        expect=CONST.TRANSACTION_EXPECT, capture=None, flow_control=None,
+        ready=None, ready_timeout=CONST.READY_TIMEOUT):
+    '''Run a script of command/response transactions with up to depth
+    commands in flight, showing the responses and the latency statistics.
+    Returns if all the commands got their response.'''
+    from session import SerialSession
+    from transaction import (
+        TransactionChannel, expect_compile, transaction_script_parse,
+        transaction_batch
+    )
+    commands = transaction_script_parse(script_file)
+    if commands is None:
+        return False
+    try:
+        expect = expect_compile(expect)
+    except Exception as e:
+        print_log(LOG.ERROR, "Invalid expected pattern: {}", e)
+        return False
+    if broker_is_running(port):
+        print("\nAttaching to port {} broker...".format(port))
+    else:
+        print("\nOpening port {} at {} bauds...".format(port, bauds))
+    session = SerialSession(port, bauds, None, capture, flow_control, ready,
+            ready_timeout, queue_size=0)
+    if not session.open():
+        if not session.attached:
+            print_log(LOG.INFO, "Can't open Serial port.")
+        return False
+    session.start()
+    print("\nSerial Batch Start ({} commands, {} in flight)\n".format(
+            len(commands), depth))
+    def on_result(command, result):
+        if isinstance(result, Exception):
+            print_log(LOG.ERROR, str(result))
+        else:
+            print(result.text, end="", flush=True)
+    channel = TransactionChannel(session, expect)
+    channel.start()
+    start_time = time.monotonic()
+    try:
+        transaction_batch(channel, commands, depth, on_result)
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - start_time
+    channel.stop()
+    stats = channel.stats()
+    print("\n\nTransactions: {} sent, {} completed, {} timeouts, {} " \
+            "failed ({:.3f} s, {:.1f} per second)".format(stats["sent"],
+            stats["completed"], stats["timeouts"], stats["failed"], elapsed,
+            stats["completed"] / max(elapsed, 1e-9)))
+    print("Latency (ms): min {:.3f}, avg {:.3f}, p50 {:.3f}, p95 {:.3f}, " \
+            "p99 {:.3f}, max {:.3f}".format(stats["latency_min_ms"],
+            stats["latency_avg_ms"], stats["latency_p50_ms"],
+            stats["latency_p95_ms"], stats["latency_p99_ms"],
+            stats["latency_max_ms"]))
+    session.stop()
+    return stats["completed"] == len(commands)
+
+
+def multiport_terminal(channels, log_dir=None):
+    '''Handle a Multi-Port Serial Terminal.'''
+    from multiport import MultiPortTerminal
+    terminal = MultiPortTerminal(channels, log_dir)
+    if not terminal.open():
+        print_log(LOG.INFO, "Can't open any Serial port.")
+        terminal.close()
+        return False
+    terminal.run()
+    terminal.close()
+    return True
+
+
+def serial_terminal(port, bauds, capture=None, framing=None, triggers=None,
+        flow_control=None, display=None, input_mode="text", ready=None,
+        ready_timeout=CONST.READY_TIMEOUT, publish=False):
+    '''Handle a Serial Terminal on a Serial session. After opening the
+    port, it waits for the device with the ready strategy (see
+    serial_wait_ready()). With publish, the received stream is published
+    in a shared memory ring for taps.'''
+    from filetransfer import RxTap
+    from session import SerialSession
+    if broker_is_running(port):
+        # Attach to the port through the broker that owns it
+        print("\nAttaching to port {} broker...".format(port))
+    else:
+        print("\nOpening port {} at {} bauds...".format(port, bauds))
+    # Serial read events are handled by the session loop thread, while
+    # keyboard input is handled in a write thread (blocking input)
+    if display is None:
+        display = DataDisplay()
+    REGISTRY.counter("multisterm_display_decode_errors_total",
+            "Received data shown with text decode errors", {"port": port},
+            fn=lambda: display.decode_errors)
+    splitter, engine = terminal_pipeline(capture, framing, triggers)
+    output = OutputRenderer()
+    last_rx = [time.monotonic()]
+    ring = [None]
+    tap = RxTap()
+    def on_read(raw_read):
+        if ring[0] is not None:
+            ring[0].write(raw_read)
+        # Received data belongs to a file transfer in progress
+        if tap.active:
+            tap.feed(raw_read)
+            return
+        last_rx[0] = time.monotonic()
+        with span("decode"):
+            terminal_show(raw_read, output, display, splitter, engine)
+    def on_line_timeout():
+        # Show incomplete lines that have been waiting too long (prompts)
+        if (time.monotonic() - last_rx[0] < CONST.FRAMING_LINE_TIMEOUT) or \
+                (not splitter.pending()):
+            return
+        line = splitter.pending()
+        splitter.reset()
+        terminal_line_show(line, output, display, engine, True)
+    def on_row_timeout():
+        # Show incomplete hex dump row that has been waiting too long
+        if time.monotonic() - last_rx[0] >= CONST.FRAMING_LINE_TIMEOUT:
+            text = display.flush()
+            if text:
+                output.write(text + "\n")
+    def on_disconnect(error):
+        # The session keeps all the state (and holds the messages to
+        # write) until reconnect
+        output.write("\n[Serial port disconnected ({})]\n".format(error))
+    def on_reconnect(outage):
+        output.write("[Serial port reconnected, {:.3f} s outage]\n".format(
+                outage))
+    # Port failures are supervised to reopen it when it comes back
+    session = SerialSession(port, bauds, on_read, capture, flow_control,
+            ready, ready_timeout, on_disconnect=on_disconnect,
+            on_reconnect=on_reconnect, queue_size=0)
+    if not session.open():
+        if not session.attached:
+            print_log(LOG.INFO, "Can't open Serial port.")
+        return False
+    if publish:
+        ring[0] = rx_ring_create(port)
+    if isinstance(splitter, DelimiterSplitter):
+        session.add_timer(CONST.FRAMING_LINE_TIMEOUT, on_line_timeout)
+    elif (splitter is None) and display.is_dump():
+        session.add_timer(CONST.FRAMING_LINE_TIMEOUT, on_row_timeout)
+    th_write = Thread(target=th_serial_write,
+            args=(session, tap, input_mode))
+    th_write.daemon = True
+    stdin_settings = stdin_settings_get()
     print("\nSerial Terminal Start")
-    th_read.start()
+    output.start()
+    # Wait for the device (data received meanwhile is shown)
+    session.start()
     th_write.start()
-    th_read.join()
-    th_write.join()
-    # Close Serial Port
-    if (ser is not None) and ser.isOpen():
-        serial_close(ser)
+    try:
+        session.wait()
+    except KeyboardInterrupt:
+        pass
+    writer_stats = session.writer.stats() if session.writer else None
+    session.stop()
+    stdin_settings_restore(stdin_settings)
+    output.stop()
+    if output.bytes_suppressed:
+        print_log(LOG.WARNING, "{} bytes not shown (terminal too slow).",
+                output.bytes_suppressed)
+    print_log(LOG.DEBUG, "Serial writer stats: {}", writer_stats)
+    if session.first_rx_time is not None:
+        print("\nTime to first byte: {:.3f} s ({:.3f} s since port " \
+                "open)".format(session.first_rx_time - START_TIME,
+                session.first_rx_time - session.open_time))
+        REGISTRY.gauge("multisterm_time_to_first_byte_seconds",
+                "Time from program start to the first received byte",
+                {"port": port}).set(session.first_rx_time - START_TIME)
+    if engine is not None:
+        print("\nTrigger hits:")
+        for name, hits in engine.hits():
+            print("  {}: {}".format(name, hits))
+    if ring[0] is not None:
+        ring[0].close()
+    return True
+
+
+def rx_ring_create(port):
+    '''Create the shared memory ring to publish a port received stream
+    (None if it can't be created).'''
+    try:
+        from shmring import ShmRingWriter, shm_ring_name
+        ring = ShmRingWriter(shm_ring_name(port))
+    except (ImportError, OSError, ValueError) as e:
+        print_log(LOG.ERROR, str(e))
+        print_log(LOG.WARNING, "Can't publish the RX stream.")
+        return None
+    print("\nPublishing RX stream for taps ({})".format(ring.name))
+    return ring
+
+
+def shm_tap(port, capture=None, framing=None, triggers=None, display=None):
+    '''Handle a read-only tap of the received stream that the terminal that
+    owns a port publishes in shared memory.'''
+    try:
+        from shmring import ShmRingReader, shm_ring_name
+        reader = ShmRingReader(shm_ring_name(port))
+    except (ImportError, OSError, ValueError) as e:
+        print_log(LOG.ERROR, str(e))
+        print_log(LOG.INFO, "No RX stream published for the port.")
+        return False
+    if display is None:
+        display = DataDisplay()
+    splitter, engine = terminal_pipeline(capture, framing, triggers)
+    output = OutputRenderer()
+    last_rx = time.monotonic()
+    print("\nSerial Tap Start ({})".format(reader.name))
+    output.start()
+    try:
+        while not reader.is_closed():
+            chunks, lost = reader.read()
+            if lost:
+                output.write("\n[Tap overrun, {} chunks lost]\n".format(lost))
+                if capture is not None:
+                    capture.mark("Tap overrun, {} chunks lost".format(lost))
+            for _, _, view in chunks:
+                # A single copy, shared by the capture log and the display
+                raw_read = bytes(view)
+                view.release()
+                if capture is not None:
+                    capture.log_rx(raw_read)
+                with span("decode"):
+                    terminal_show(raw_read, output, display, splitter, engine)
+            if chunks:
+                last_rx = time.monotonic()
+                continue
+            # Show incomplete line or hex dump row waiting too long
+            if time.monotonic() - last_rx >= CONST.FRAMING_LINE_TIMEOUT:
+                if isinstance(splitter, DelimiterSplitter) and \
+                        splitter.pending():
+                    line = splitter.pending()
+                    splitter.reset()
+                    terminal_line_show(line, output, display, engine, True)
+                elif (splitter is None) and display.is_dump():
+                    text = display.flush()
+                    if text:
+                        output.write(text + "\n")
+            time.sleep(CONST.SHM_POLL_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    output.stop()
+    if reader.is_closed():
+        print("\nRX stream publisher closed.")
+    print("\nTap: {} chunks read, {} chunks lost".format(reader.chunks_read,
+            reader.chunks_lost))
+    reader.close()
     return True
 
 
-def th_serial_read(ser):
-    '''Serial Terminal read and show thread.'''
-    while not g_terminal_close:
-        read_str = serial_read_str(ser)
+def terminal_pipeline(capture=None, framing=None, triggers=None):
+    '''Get the received data frames splitter and triggers engine.'''
+    splitter = None
+    if framing is not None:
+        splitter = framing_create(framing)
+    engine = None
+    if triggers:
+        engine = TriggerEngine(triggers, capture)
+        # Filters, highlights and regex triggers work on complete lines
+        if engine.line_rules() and (splitter is None):
+            splitter = framing_create("lf")
+    # Lines are shown with the device line endings
+    if isinstance(splitter, DelimiterSplitter):
+        splitter.keep_delimiter = True
+    return splitter, engine
+
+
+def terminal_show(raw_read, output, display, splitter=None, triggers=None):
+    '''Serial Terminal show received data in the display mode (the
+    stream or, if a framing is used, each complete frame: text lines or
+    binary frames, that are shown in hex in text display mode).'''
+    if triggers is not None:
+        triggers.feed(raw_read)
+    if splitter is None:
+        read_str = display.stream(raw_read)
         if len(read_str) > 0:
-            print(read_str)
+            if display.is_dump():
+                read_str = read_str + "\n"
+            output.write(read_str)
+        return
+    for frame in splitter.feed(raw_read):
+        if isinstance(splitter, DelimiterSplitter):
+            terminal_line_show(frame, output, display, triggers)
+        elif display.mode == CONST.DISPLAY_MODE_TEXT:
+            output.write(frame.hex(" ") + "\n")
+        else:
+            output.write(display.frame(frame) + "\n")
+
 
+def terminal_line_show(line, output, display, triggers=None, partial=False):
+    '''Serial Terminal show a received line, if it pass the triggers
+    filters (highlighting triggers matches). A line break is added if the
+    line doesn't end with one, unless it is an incomplete line.'''
+    if triggers is not None:
+        line = triggers.line_process(line)
+        if line is None:
+            return
+    text = display.line(line)
+    if (not partial) and (not text.endswith("\n")):
+        text = text + "\n"
+    output.write(text)
 
-def th_serial_write(ser):
-    '''Serial Terminal write thread.'''
-    global g_terminal_close
-    print("Write \"--exit--\" to quit.\n")
-    while not g_terminal_close:
+
+def th_serial_write(session, tap=None, input_mode="text"):
+    '''Serial Terminal write thread (each input line is queued as a
+    message, blocking while the write queue is full). In hex input mode,
+    lines are hex bytes (i.e. "01 03 00 00 00 0a c5 cd").'''
+    print("Write \"--send <FILE> [raw|xmodem|xmodem1k|ymodem]\" to upload " \
+        "a file or \"--exit--\" to quit.\n")
+    while session.is_running():
         write_str = stdin_input()
         if write_str == "--exit--":
-            g_terminal_close = True
+            session.stop()
             break
-        serial_write(ser, write_str)
+        if write_str.startswith("--send ") and (tap is not None):
+            terminal_send_file(session.writer, tap, write_str[7:].strip(),
+                    session.capture)
+            continue
+        to_write = write_str.encode()
+        if input_mode == "hex":
+            to_write = hex_input_parse(write_str)
+            if to_write is None:
+                print("Invalid hex input.")
+                continue
+        session.write(to_write, flush=True)
 
 
+def terminal_send_file(writer, tap, command, capture=None):
+    '''Serial Terminal upload a file ("<FILE> [MODE]" command).'''
+    from filetransfer import (
+        TransferProgress, TRANSFER_MODES, file_send, line_rate
+    )
+    file_path = command
+    mode = "raw"
+    head, _, last = command.rpartition(" ")
+    if head and (last in TRANSFER_MODES):
+        file_path = head.strip()
+        mode = last
+    if not os_path.isfile(file_path):
+        print("File {} not found.".format(file_path))
+        return False
+    progress = TransferProgress(os_path.basename(file_path),
+            os_path.getsize(file_path), line_rate(writer.ser))
+    if capture is not None:
+        capture.mark("File upload {} ({}) start".format(file_path, mode))
+    if mode == "raw":
+        # Raw data is streamed through the write queue (its size bounds
+        # memory use and keeps the port busy)
+        write = lambda data: writer.write(data, PRIO.LOW)
+    else:
+        write = lambda data: writer.write(data, PRIO.HIGH, flush=True)
+        tap.start()
+    try:
+        success = file_send(write, tap.read, file_path, mode, progress)
+        writer.flush()
+    finally:
+        tap.stop()
+    progress.finish(success)
+    if capture is not None:
+        capture.mark("File upload {} ({}) {}".format(file_path, mode,
+                "done" if success else "fail"))
+    return success
+
 ###############################################################################
 ### Main Function
 
 def main(argc, argv):
-    '''Main Function.'''
+    '''Main Function (it gets the program return code, so it can be run
+    from other programs).'''
+    # Capture log search command
+    if (argc > 1) and (argv[1] == "search"):
+        from logsearch import main as search_main
+        return program_end(search_main(argc - 1, argv[1:]))
     # Check and parse program options from arguments
-    options = parse_options()
+    options = parse_options(argv[1:])
+    # Move log output to a background thread if configured
+    if CONST.LOG_ASYNC:
+        log_async_start()
+    # Profiling mode
+    if options["profile"] is not None:
+        profile_dir = CONST.PROFILE_DIR
+        if options["profile_dir"] is not None:
+            profile_dir = options["profile_dir"][0]
+        profiling_start(options["profile"][0], profile_dir)
+    # Metrics exposing
+    metrics_name = "multiport"
+    if options["port"] is not None:
+        metrics_name = options["port"][0]
+        # The broker that owns the port uses its name
+        if (not options["broker"]) and broker_is_running(metrics_name):
+            metrics_name = "{}-{}".format(metrics_name, os_getpid())
+    metrics_sock_path = None
+    if options["metrics_socket"]:
+        metrics_sock_path = metrics_socket_path(metrics_name)
+    metrics_file = None
+    if options["metrics_file"] is not None:
+        metrics_file = options["metrics_file"][0]
+    metrics_start(metrics_sock_path, metrics_file, options["stats"])
+    # Multi-Port mode
+    if (options["ports"] is not None) or (options["ports_file"] is not None):
+        from multiport import ports_parse_spec, ports_parse_file
+        channels = []
+        if options["ports"] is not None:
+            channels.extend(ports_parse_spec(spec) for spec in options["ports"])
+        if options["ports_file"] is not None:
+            channels.extend(ports_parse_file(options["ports_file"][0]))
+        log_dir = None
+        if options["log"] is not None:
+            log_dir = options["log"][0]
+        rc = multiport_terminal(channels, log_dir)
+        if not rc:
+            return program_end(RC.FAIL)
+        return program_end(RC.OK)
     # Serial Port
     serial_port = ""
     if options["port"] is None:
         show_help()
-        sys_exit(RC.OK)
+        return program_end(RC.OK)
     serial_port = options["port"][0]
+    # Received data framing
+    framing = None
+    if options["framing"] is not None:
+        framing = options["framing"][0]
+        try:
+            framing_create(framing)
+        except ValueError as e:
+            print_log(LOG.ERROR, str(e))
+            return program_end(RC.FAIL)
+    # Device readiness strategy after opening the port
+    ready = None
+    if options["ready"] is not None:
+        from serialcomm import serial_ready_parse
+        try:
+            ready = serial_ready_parse(options["ready"][0])
+        except ValueError as e:
+            print_log(LOG.ERROR, str(e))
+            return program_end(RC.FAIL)
+    ready_timeout = CONST.READY_TIMEOUT
+    if options["ready_timeout"] is not None:
+        ready_timeout = options["ready_timeout"][0]
+    # Received data triggers
+    triggers = []
+    if options["highlight"] is not None:
+        for pattern in options["highlight"]:
+            triggers.append(Trigger(pattern, highlight=True))
+    if options["filter"] is not None:
+        for pattern in options["filter"]:
+            triggers.append(Trigger(pattern, include=True))
+    if options["filter_out"] is not None:
+        for pattern in options["filter_out"]:
+            triggers.append(Trigger(pattern, exclude=True))
+    if options["triggers_file"] is not None:
+        triggers.extend(triggers_parse_file(options["triggers_file"][0]))
+    if not triggers_check(triggers):
+        return program_end(RC.FAIL)
+    # Network bridge addresses
+    listeners = []
+    if (options["serve"] is not None) or \
+            (options["serve_rfc2217"] is not None):
+        from netbridge import net_address_parse
+        try:
+            if options["serve"] is not None:
+                listeners.append(net_address_parse(options["serve"][0])
+                        + (False,))
+            if options["serve_rfc2217"] is not None:
+                listeners.append(net_address_parse(
+                        options["serve_rfc2217"][0]) + (True,))
+        except ValueError as e:
+            print_log(LOG.ERROR, str(e))
+            return program_end(RC.FAIL)
     # Serial Bauds
     serial_bauds = 0
-    if options["bauds"] is None:
+    from serialcomm import serial_is_url
+    if (not options["broker"]) and broker_is_running(serial_port):
+        print_log(LOG.INFO, "Port owned by a broker, bauds not required.")
+    elif options["tap"]:
+        print_log(LOG.INFO, "Tap mode, bauds not required.")
+    elif serial_is_url(serial_port) and (options["bauds"] is None):
+        # Raw TCP bridges ignore it, RFC 2217 ones apply it to the port
+        if serial_port.startswith("rfc2217://"):
+            print_log(LOG.ERROR, "BaudRate required for RFC 2217 ports.")
+            return program_end(RC.FAIL)
+        serial_bauds = CONST.SERIAL_COMMON_BAUDS[0]
+    elif options["bauds"] is None:
         print_log(LOG.INFO, "BaudRate not provided, detecting...")
         serial_bauds = auto_detect_serial_bauds(serial_port)
         if serial_bauds == 0:
             print_log(LOG.INFO, "BaudRate detection fail.")
-            sys_exit(RC.OK)
+            return program_end(RC.OK)
     else:
         serial_bauds = options["bauds"][0]
     # Serial log file
-    serial_log = ""
+    capture = None
     if options["log"] is not None:
-        serial_log = options["log"][0]
+        capture_max_size = CONST.CAPTURE_ROTATE_SIZE
+        capture_max_time = CONST.CAPTURE_ROTATE_TIME
+        if options["log_max_size"] is not None:
+            capture_max_size = options["log_max_size"][0]
+        if options["log_max_time"] is not None:
+            capture_max_time = options["log_max_time"][0]
+        if (options["log_format"] is not None) and \
+                (options["log_format"][0] == CONST.CAPTURE_FORMAT_BINARY):
+            capture_sink = BinaryCaptureSink(options["log"][0],
+                    capture_max_size, capture_max_time)
+            if options["log_compress"] is not None:
+                print_log(LOG.WARNING, "Binary logs are not compressed.")
+        elif options["log_compress"] is not None:
+            if options["log_index"]:
+                print_log(LOG.WARNING, "Compressed logs are not indexed.")
+            try:
+                capture_sink = CompressedCaptureSink(options["log"][0],
+                        options["log_compress"][0], capture_max_size,
+                        capture_max_time)
+            except ValueError as e:
+                print_log(LOG.ERROR, str(e))
+                return program_end(RC.FAIL)
+        else:
+            capture_sink = TextCaptureSink(options["log"][0],
+                    capture_max_size, capture_max_time,
+                    index=options["log_index"])
+        capture = CaptureLogger(capture_sink)
+    # Serial Broker
+    if options["broker"]:
+        broker_policy = CONST.BROKER_POLICY_TRUNCATE
+        if options["broker_policy"] is not None:
+            broker_policy = options["broker_policy"][0]
+        rc = serial_broker(serial_port, serial_bauds, broker_policy)
+        if not rc:
+            return program_end(RC.FAIL)
+        return program_end(RC.OK)
+    # Network Bridge
+    if listeners:
+        bridge_policy = CONST.NET_POLICY
+        if options["broker_policy"] is not None:
+            bridge_policy = options["broker_policy"][0]
+        rc = net_bridge(serial_port, serial_bauds, listeners, bridge_policy)
+        if not rc:
+            return program_end(RC.FAIL)
+        return program_end(RC.OK)
     # Serial Terminal
-    rc = serial_terminal(serial_port, serial_bauds)
+    if capture is not None:
+        capture.start()
+    flow_control = None
+    if options["flow_control"] is not None:
+        flow_control = options["flow_control"][0]
+    # Batch of command/response transactions
+    if options["batch"] is not None:
+        batch_depth = CONST.TRANSACTION_DEPTH
+        if options["batch_depth"] is not None:
+            batch_depth = max(1, options["batch_depth"][0])
+        batch_expect = CONST.TRANSACTION_EXPECT
+        if options["batch_expect"] is not None:
+            batch_expect = options["batch_expect"][0]
+        rc = serial_batch(serial_port, serial_bauds, options["batch"][0],
+                batch_depth, batch_expect, capture, flow_control, ready,
+                ready_timeout)
+        if capture is not None:
+            capture.stop()
+        if not rc:
+            return program_end(RC.FAIL)
+        return program_end(RC.OK)
+    display_mode = CONST.DISPLAY_MODE_TEXT
+    if options["display"] is not None:
+        display_mode = options["display"][0]
+    row_bytes = CONST.DISPLAY_ROW_BYTES
+    if options["row_bytes"] is not None:
+        row_bytes = max(1, options["row_bytes"][0])
+    display = DataDisplay(display_mode, row_bytes, not options["no_offsets"])
+    input_mode = "text"
+    if options["input_mode"] is not None:
+        input_mode = options["input_mode"][0]
+    if options["tap"]:
+        rc = shm_tap(serial_port, capture, framing, triggers, display)
+    else:
+        rc = serial_terminal(serial_port, serial_bauds, capture, framing,
+                triggers, flow_control, display, input_mode, ready,
+                ready_timeout, options["publish"])
+    if capture is not None:
+        capture.stop()
     # Program end
     if not rc:
-        program_exit(RC.FAIL)
-    program_exit(RC.OK)
+        return program_end(RC.FAIL)
+    return program_end(RC.OK)
 
 ###############################################################################
-### Exit Function
+### End Function
 
-def program_exit(return_code):
-    '''Finish function.'''
-    global ser
+def program_end(return_code):
+    '''Finish function, it releases program resources and gets the
+    return code.'''
     # Check if unexpected exit code provided and use RC.FAIL in that case
     if (return_code != RC.OK) and (return_code != RC.FAIL):
         return_code = RC.FAIL
-    # Close and free any pending memory
-    if (ser is not None) and ser.isOpen():
-        serial_close(ser)
-    # Exit
-    print_log(LOG.DEBUG, "Program exit ({}).\n".format(return_code))
-    sys_exit(return_code)
+    profiling_stop()
+    metrics_stop()
+    print_log(LOG.DEBUG, "Program exit ({}).\n", return_code)
+    log_async_stop()
+    return return_code
 
 ###############################################################################
 ### Main Script execution Check
 
 if __name__ == "__main__":
     try:
-        main(len(sys_argv), sys_argv)
+        return_code = main(len(sys_argv), sys_argv)
     except KeyboardInterrupt:
-        g_terminal_close = True
-        th_read.join()
-        th_write.join()
-        program_exit(RC.OK)
+        return_code = program_end(RC.OK)
+    sys_exit(return_code)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    netbridge.py
+Description:
+    Serial port network bridge. The port received stream is served to any
+    number of TCP clients, as raw TCP or as RFC 2217 (Telnet COM port
+    control, so remote clients can change the port BaudRate and control
+    lines), and data sent by the clients is written to the port. It works
+    as the Unix socket broker (see broker.py): each client has its own
+    bounded send buffer and slow clients are dropped (or its oldest data
+    truncated). Client sockets use TCP_NODELAY so interactive sessions get
+    each echo at once, while clients with a bulk stream pending to be
+    sent are corked so the data is sent in full segments.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import errno
+import selectors
+import socket
+import time
+
+from serial.rfc2217 import PortManager, IAC
+
+from constants import LOG, PRIO, CONST
+from auxiliar import print_log
+from broker import BrokerClient, SerialBroker
+from serialwriter import SerialWriter
+
+###############################################################################
+### Auxiliar Functions
+
+def net_address_parse(spec):
+    '''Parse a listen address "[<HOST>:]<PORT>", get its (host, port) or
+    raise ValueError if it is invalid.'''
+    host, sep, port = str(spec).rpartition(":")
+    if not sep:
+        host = CONST.NET_DEFAULT_HOST
+    if not port.isdigit() or (int(port) > 65535):
+        raise ValueError("Invalid listen address {}".format(spec))
+    return (host, int(port))
+
+###############################################################################
+### Constants
+
+# Serial port modem status and control lines
+MODEM_LINES = ("cts", "dsr", "ri", "cd")
+CONTROL_LINES = ("rts", "dtr", "break_condition")
+
+###############################################################################
+### RFC 2217 Port
+
+class LinesTolerantPort():
+    '''Serial port proxy for the RFC 2217 port manager, that ignores the
+    modem and control lines of ports without them (i.e. pseudo-terminals),
+    so remote requests on them don't break the Telnet negotiation.'''
+
+    def __init__(self, ser):
+        self.__dict__["_ser"] = ser
+
+    def __getattr__(self, name):
+        try:
+            return getattr(self._ser, name)
+        except OSError as e:
+            if name not in MODEM_LINES:
+                raise
+            print_log(LOG.DEBUG, "Modem line {} not available: {}", name, e)
+            return False
+
+    def __setattr__(self, name, value):
+        try:
+            setattr(self._ser, name, value)
+        except OSError as e:
+            if name not in CONTROL_LINES:
+                raise
+            print_log(LOG.DEBUG, "Control line {} not available: {}", name,
+                    e)
+
+###############################################################################
+### Network Bridge
+
+class NetClient(BrokerClient):
+    '''Network bridge side state of a connected client.'''
+
+    def __init__(self, sock, buffer_size, address):
+        BrokerClient.__init__(self, sock, buffer_size)
+        self.address = address
+        self.manager = None
+        self.corked = False
+
+    def write(self, data):
+        '''Queue Telnet/RFC 2217 control data to be sent to the client.'''
+        self.ring.write(data)
+
+
+class NetBridge(SerialBroker):
+    '''Serial port owner that serves it to raw TCP and RFC 2217 clients.'''
+
+    def __init__(self, ser, listeners, policy=CONST.NET_POLICY,
+            buffer_size=CONST.NET_CLIENT_BUFFER_SIZE,
+            stats_interval=CONST.BROKER_STATS_INTERVAL):
+        SerialBroker.__init__(self, ser, None, policy, buffer_size,
+                stats_interval)
+        # List of (host, port, rfc2217) addresses to listen at
+        self.listeners = listeners
+        self._servers = {}
+        self._last_modem_check = 0
+
+    def start(self):
+        '''Create the TCP servers and register I/O sources.'''
+        self.ser.timeout = 0
+        self._selector = selectors.DefaultSelector()
+        for host, port, rfc2217 in self.listeners:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((host, port))
+            server.listen(CONST.BROKER_MAX_PENDING_CONNECTIONS)
+            server.setblocking(False)
+            self._servers[server] = rfc2217
+            self._selector.register(server, selectors.EVENT_READ, "server")
+            print_log(LOG.INFO, "Bridge listening at {}:{} ({})", host,
+                    port, "RFC 2217" if rfc2217 else "raw TCP")
+        self._selector.register(self.ser.fileno(), selectors.EVENT_READ,
+                "serial")
+        self.writer = SerialWriter(self.ser)
+        self.writer.start()
+        self._running = True
+
+    def stop(self):
+        '''Disconnect all clients and close the TCP servers.'''
+        SerialBroker.stop(self)
+        for server in self._servers:
+            server.close()
+        self._servers = {}
+
+    def stats(self):
+        '''Get per-client statistics.'''
+        stats = SerialBroker.stats(self)
+        for stat, client in zip(stats, self.clients.values()):
+            stat["fd"] = "{}:{}".format(*client.address[:2])
+        return stats
+
+    def _fan_out(self, data):
+        '''Queue received data to be sent to all clients (escaped for
+        RFC 2217 clients).'''
+        escaped = data
+        if IAC in data:
+            escaped = data.replace(IAC, IAC + IAC)
+        for client in list(self.clients.values()):
+            if client.manager is None:
+                self._client_queue(client, data)
+            else:
+                self._client_queue(client, escaped)
+        self._modem_lines_check()
+
+    def _modem_lines_check(self):
+        '''Notify RFC 2217 clients of modem lines changes (checked with
+        port activity, at most once per check interval).'''
+        now = time.monotonic()
+        if now - self._last_modem_check < CONST.NET_MODEM_CHECK_INTERVAL:
+            return
+        self._last_modem_check = now
+        for client in list(self.clients.values()):
+            if client.manager is not None:
+                client.manager.check_modem_lines()
+                self._client_events_update(client)
+
+    def _client_accept(self, server):
+        '''Accept a new client connection.'''
+        try:
+            sock, address = server.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Keep the kernel buffer small, so slow clients data stays in its
+        # bounded buffer where the slow clients policy is applied
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF,
+                CONST.NET_SOCKET_SEND_BUFFER)
+        client = NetClient(sock, self.buffer_size, address)
+        self.clients[sock] = client
+        if self._servers[server]:
+            # It queues the Telnet options negotiation requests
+            client.manager = PortManager(LinesTolerantPort(self.ser), client)
+        self._client_events_update(client)
+        print_log(LOG.INFO, "Client {}:{} connected.", *address[:2])
+
+    def _client_read(self, sock):
+        '''Forward data sent by a client to the Serial port (handling
+        Telnet/RFC 2217 commands of RFC 2217 clients).'''
+        try:
+            data = sock.recv(CONST.BROKER_RECV_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = b''
+        if not data:
+            self._client_remove(sock)
+            return
+        client = self.clients[sock]
+        if client.manager is not None:
+            try:
+                data = b''.join(client.manager.filter(data))
+            except Exception as e:
+                print_log(LOG.ERROR, "RFC 2217 request fail: {}", e)
+                data = b''
+        if data:
+            client.write_pending.append(bytes([PRIO.NORMAL]) + data)
+        self._client_write(client)
+
+    def _client_send(self, sock):
+        '''Send pending RX bytes to a client without blocking (corked
+        while it has a bulk stream pending).'''
+        client = self.clients[sock]
+        self._client_cork(client, client.lag() >= CONST.NET_BULK_SIZE)
+        SerialBroker._client_send(self, sock)
+        if (sock in self.clients) and (client.lag() == 0):
+            self._client_cork(client, False)
+
+    def _client_cork(self, client, cork):
+        '''Hold (or send) partial TCP segments of a client socket.'''
+        if (cork == client.corked) or (not hasattr(socket, "TCP_CORK")):
+            return
+        try:
+            client.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK,
+                    int(cork))
+            client.corked = cork
+        except OSError as e:
+            print_log(LOG.DEBUG, "TCP cork fail: {}", e)
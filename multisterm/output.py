@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    output.py
+Description:
+    Terminal output renderer. Received data to show is appended to a
+    buffer without adding anything (device line endings are preserved),
+    and a background thread writes it to the terminal in a single write
+    and flush, at most at a capped rate (i.e. 60 times per second) or as
+    soon as a size threshold is reached. The Serial read never waits for
+    the terminal: if the terminal can't keep up and the buffer is full,
+    new data is dropped and a "N bytes suppressed" marker is shown.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from sys import stdout as sys_stdout
+from threading import Thread, Condition
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from metrics import REGISTRY
+from profiling import span
+
+###############################################################################
+### Output Renderer
+
+class OutputRenderer():
+    '''Coalesce terminal output and write it at a capped rate.'''
+
+    def __init__(self, stream=None, flush_rate=CONST.OUTPUT_FLUSH_RATE,
+            flush_size=CONST.OUTPUT_FLUSH_SIZE,
+            max_pending=CONST.OUTPUT_MAX_PENDING):
+        self.stream = stream
+        if self.stream is None:
+            self.stream = sys_stdout
+        self.flush_interval = 1.0 / flush_rate
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.encoding = getattr(self.stream, "encoding", None) or "utf-8"
+        self.bytes_written = 0
+        self.bytes_suppressed = 0
+        self.flushes = 0
+        self._buf = []
+        self._size = 0
+        self._suppressed = 0
+        self._oldest = None
+        self._cond = Condition()
+        self._latency_metric = REGISTRY.histogram(
+                "multisterm_output_latency_seconds",
+                "Time from data read to its display (oldest data of each "
+                "flush)", CONST.METRICS_LATENCY_BUCKETS)
+        self._depth_metric = REGISTRY.histogram(
+                "multisterm_output_flush_bytes",
+                "Output bytes written in each flush",
+                CONST.METRICS_SIZE_BUCKETS)
+        REGISTRY.gauge("multisterm_output_pending_bytes",
+                "Output bytes waiting to be shown", fn=lambda: self._size)
+        REGISTRY.counter("multisterm_output_suppressed_bytes_total",
+                "Output bytes dropped because the terminal is behind",
+                fn=lambda: self.bytes_suppressed)
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        '''Launch the output thread.'''
+        self._running = True
+        self._thread = Thread(target=self._th_output)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Write all pending output and stop the output thread.'''
+        if self._thread is None:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+        self._thread = None
+
+    def write(self, data):
+        '''Add text or bytes to the output, return False if it has been
+        suppressed because the terminal is not keeping up.'''
+        if isinstance(data, str):
+            data = data.encode(self.encoding, "replace")
+        if not data:
+            return True
+        with self._cond:
+            if self._size + len(data) > self.max_pending:
+                self._suppressed = self._suppressed + len(data)
+                self.bytes_suppressed = self.bytes_suppressed + len(data)
+                return False
+            # Wake up the output thread for new output (it waits for the
+            # flush rate) or for a full buffer
+            if (not self._buf) or (self._size + len(data) >= self.flush_size):
+                self._cond.notify_all()
+            if not self._buf:
+                self._oldest = time.monotonic()
+            self._buf.append(data)
+            self._size = self._size + len(data)
+        return True
+
+    def _output_get(self, last_flush):
+        '''Wait for output to write, at most at the flush rate (unless the
+        size threshold is reached). Returns the data and the time of its
+        oldest write, or None when stopped.'''
+        with self._cond:
+            self._cond.wait_for(lambda: self._buf or self._suppressed or
+                    (not self._running))
+            if (not self._running) and (not self._buf) and \
+                    (not self._suppressed):
+                return None
+            wait = last_flush + self.flush_interval - time.monotonic()
+            if wait > 0:
+                self._cond.wait_for(lambda: (self._size >= self.flush_size)
+                        or (not self._running), wait)
+            data = b"".join(self._buf)
+            oldest = self._oldest
+            self._buf.clear()
+            self._size = 0
+            self._oldest = None
+            if self._suppressed:
+                data = data + "\n[{} bytes suppressed]\n".format(
+                        self._suppressed).encode()
+                self._suppressed = 0
+        return (data, oldest)
+
+    def _th_output(self):
+        '''Output thread.'''
+        last_flush = 0
+        while True:
+            output = self._output_get(last_flush)
+            if output is None:
+                break
+            data, oldest = output
+            try:
+                with span("display"):
+                    # Keep the order with text printed directly to the stream
+                    self.stream.flush()
+                    buffer = getattr(self.stream, "buffer", None)
+                    if buffer is not None:
+                        buffer.write(data)
+                        buffer.flush()
+                    else:
+                        self.stream.write(data.decode(self.encoding,
+                                "replace"))
+                        self.stream.flush()
+            except (OSError, ValueError) as e:
+                print_log(LOG.DEBUG, "Output write fail: {}", e)
+            self.bytes_written = self.bytes_written + len(data)
+            self.flushes = self.flushes + 1
+            last_flush = time.monotonic()
+            if oldest is not None:
+                self._latency_metric.observe(last_flush - oldest)
+            self._depth_metric.observe(len(data))
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    profiling.py
+Description:
+    Profiling mode. The program runs under a deterministic profiler
+    (cProfile, a profiler for each thread started since profiling starts,
+    merged in the report) or a sampling profiler (all threads, used as
+    fallback if cProfile is not available) while tracemalloc traces the
+    memory allocations. Hot path stages (Serial read, decode, display and
+    log write) are wrapped in named spans that account its calls, time
+    and allocated memory; spans cost just a function call when profiling
+    is disabled. A report (pstats or collapsed stacks file and a text
+    summary) is written at exit or when a SIGUSR1 signal is received.
+    Note that this module can't use auxiliar log functions, as it is
+    imported by them, and that profiling modules (tracemalloc, cProfile
+    and pstats) are imported just when profiling is used.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import io
+import signal
+import sys
+import threading
+import time
+from os import getpid as os_getpid
+from os import makedirs as os_makedirs
+from os import path as os_path
+from threading import Thread, Lock, RLock, Event, get_ident
+
+from constants import CONST
+
+###############################################################################
+### Stage Spans
+
+class StageStats():
+    '''Accumulated calls, time and allocated memory of a stage.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.allocated = 0
+        self._lock = Lock()
+
+    def add(self, elapsed, allocated):
+        '''Account a stage execution.'''
+        with self._lock:
+            self.calls = self.calls + 1
+            self.total_time = self.total_time + elapsed
+            self.max_time = max(self.max_time, elapsed)
+            self.allocated = self.allocated + allocated
+
+
+class Span():
+    '''Timing span of a stage execution (context manager).'''
+
+    __slots__ = ("stats", "start", "memory")
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.memory = _traced_memory[0]()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        allocated = _traced_memory[0]()[0] - self.memory
+        self.stats.add(elapsed, max(0, allocated))
+
+
+class NullSpan():
+    '''Span that does nothing (profiling disabled).'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+# Stages statistics (None while profiling is disabled)
+_stages = [None]
+
+# Traced memory get function (tracemalloc.get_traced_memory)
+_traced_memory = [None]
+
+
+def span(name):
+    '''Get a span to measure a stage execution:
+        with span("decode"):
+            ...'''
+    stages = _stages[0]
+    if stages is None:
+        return NULL_SPAN
+    stats = stages.get(name)
+    if stats is None:
+        stats = stages.setdefault(name, StageStats(name))
+    return Span(stats)
+
+###############################################################################
+### Sampling Profiler
+
+class SamplingProfiler():
+    '''Statistical profiler, it periodically samples all threads stacks.'''
+
+    def __init__(self, interval=CONST.PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = {}
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread = None
+
+    def enable(self):
+        '''Launch the sampling thread.'''
+        self._stop.clear()
+        self._thread = Thread(target=self._th_sample)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def disable(self):
+        '''Stop the sampling thread.'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stacks(self):
+        '''Get the sampled stacks (root first) and its number of samples.'''
+        with self._lock:
+            return dict(self._stacks)
+
+    def dump_stacks(self, file_path):
+        '''Write the samples in collapsed stacks format (flame graphs).'''
+        with open(file_path, "w") as f:
+            for stack, count in self.stacks().items():
+                f.write("{} {}\n".format(";".join(stack), count))
+
+    def top(self, num=CONST.PROFILE_REPORT_LINES):
+        '''Get the functions with more samples on top of the stack (self)
+        and in the stack (cumulative).'''
+        own = {}
+        cumulative = {}
+        for stack, count in self.stacks().items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for function in set(stack[1:]):
+                cumulative[function] = cumulative.get(function, 0) + count
+        top = sorted(own.items(), key=lambda item: item[1], reverse=True)
+        return [(function, count, cumulative.get(function, count))
+                for function, count in top[:num]]
+
+    def _th_sample(self):
+        '''Sampling thread.'''
+        own_id = get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while (frame is not None) and \
+                        (len(stack) < CONST.PROFILE_MAX_STACK):
+                    code = frame.f_code
+                    stack.append("{} ({}:{})".format(code.co_name,
+                            os_path.basename(code.co_filename),
+                            code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append("thread-{}".format(thread_id))
+                stack = tuple(reversed(stack))
+                with self._lock:
+                    self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self.samples = self.samples + 1
+
+###############################################################################
+### Threads Profiler
+
+class ProfileStats():
+    '''Stats snapshot of a profiler (as pstats loads them from a profiler,
+    without stopping it).'''
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        '''Stats are already created.'''
+
+
+class ThreadsProfiler():
+    '''Deterministic profiler of all threads: each thread (the calling one
+    and the ones started while it is enabled) runs its own cProfile
+    profiler and their stats are merged in a single pstats file.'''
+
+    def __init__(self):
+        import cProfile
+        self._cprofile = cProfile
+        self._profilers = {}
+        self._lock = Lock()
+        self._enabled = False
+
+    def enable(self):
+        '''Start profiling the calling thread and the new threads.'''
+        self._enabled = True
+        threading.setprofile(self._on_thread_start)
+        self._thread_enable()
+
+    def disable(self):
+        '''Stop profiling (other threads profilers stop with their
+        threads).'''
+        self._enabled = False
+        threading.setprofile(None)
+        profiler = self._profilers.get(get_ident())
+        if profiler is not None:
+            profiler.disable()
+
+    def dump_stats(self, file_path):
+        '''Write the merged stats of all threads (profilers keep
+        running).'''
+        import pstats
+        with self._lock:
+            profilers = list(self._profilers.values())
+        snapshots = []
+        for profiler in profilers:
+            profiler.snapshot_stats()
+            snapshots.append(ProfileStats(profiler.stats))
+        pstats.Stats(*snapshots).dump_stats(file_path)
+
+    def _thread_enable(self):
+        '''Start the profiler of the calling thread.'''
+        with self._lock:
+            profiler = self._profilers.get(get_ident())
+            if profiler is None:
+                profiler = self._cprofile.Profile()
+                self._profilers[get_ident()] = profiler
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ profiler is process wide, a single one traces
+            # all threads
+            pass
+
+    def _on_thread_start(self, frame, event, arg):
+        '''Profile function of the new threads, it replaces itself by the
+        thread profiler.'''
+        sys.setprofile(None)
+        if self._enabled:
+            self._thread_enable()
+
+###############################################################################
+### Profiling Session
+
+class ProfilingSession():
+    '''Profiler, memory tracing and stage spans of a program run.'''
+
+    def __init__(self, profiler=CONST.PROFILER_CPROFILE,
+            output_dir=CONST.PROFILE_DIR):
+        self.profiler_name = profiler
+        self.output_dir = output_dir
+        self.profiler = None
+        self.running = False
+        self.start_time = 0
+        self.reports = 0
+        self._lock = RLock()
+        prefix = os_path.join(output_dir, "multisterm_{}".format(os_getpid()))
+        self.report_path = "{}_report.txt".format(prefix)
+        self.stats_path = "{}.pstats".format(prefix)
+        self.stacks_path = "{}.folded".format(prefix)
+
+    def start(self):
+        '''Start profiling (threads started before are not profiled).'''
+        if self.profiler_name == CONST.PROFILER_CPROFILE:
+            try:
+                self.profiler = ThreadsProfiler()
+            except ImportError:
+                print("cProfile not available, using sampling profiler.")
+                self.profiler_name = CONST.PROFILER_SAMPLE
+        if self.profiler is None:
+            self.profiler = SamplingProfiler()
+        import tracemalloc
+        tracemalloc.start(CONST.PROFILE_TRACEMALLOC_FRAMES)
+        _traced_memory[0] = tracemalloc.get_traced_memory
+        _stages[0] = {}
+        self.start_time = time.perf_counter()
+        self.running = True
+        self.profiler.enable()
+
+    def stop(self):
+        '''Stop profiling and write the final report.'''
+        self.running = False
+        self.profiler.disable()
+        self.report()
+        _stages[0] = None
+        import tracemalloc
+        tracemalloc.stop()
+
+    def report(self):
+        '''Write the profile stats and the report text files.'''
+        with self._lock:
+            if not os_path.exists(self.output_dir):
+                os_makedirs(self.output_dir, 0o775)
+            if self.profiler_name == CONST.PROFILER_CPROFILE:
+                stats_path = self.stats_path
+                self.profiler.dump_stats(stats_path)
+                text = self.report_text()
+            else:
+                stats_path = self.stacks_path
+                self.profiler.dump_stacks(stats_path)
+                text = self.report_text()
+            with open(self.report_path, "w") as f:
+                f.write(text)
+            self.reports = self.reports + 1
+        print("\nProfile report: {} ({})".format(self.report_path,
+                stats_path))
+
+    def report_text(self):
+        '''Get the report text: profiler top functions, stages summary
+        and top memory allocations.'''
+        import tracemalloc
+        elapsed = time.perf_counter() - self.start_time
+        lines = []
+        lines.append("Profile report ({}, {:.3f} s)".format(
+                self.profiler_name, elapsed))
+        lines.append("")
+        lines.append("Stages:")
+        lines.append("  {:<16}{:>10}{:>12}{:>12}{:>12}{:>8}{:>14}".format(
+                "stage", "calls", "total ms", "avg us", "max us", "%",
+                "alloc bytes"))
+        for stats in sorted((_stages[0] or {}).values(),
+                key=lambda stats: stats.total_time, reverse=True):
+            lines.append("  {:<16}{:>10}{:>12.3f}{:>12.3f}{:>12.3f}" \
+                    "{:>8.2f}{:>14}".format(stats.name, stats.calls,
+                    stats.total_time * 1000,
+                    stats.total_time / max(1, stats.calls) * 1000000,
+                    stats.max_time * 1000000,
+                    stats.total_time / max(elapsed, 1e-9) * 100,
+                    stats.allocated))
+        lines.append("")
+        lines.append("Functions:")
+        if self.profiler_name == CONST.PROFILER_CPROFILE:
+            import pstats
+            stream = io.StringIO()
+            stats = pstats.Stats(self.stats_path, stream=stream)
+            stats.sort_stats("cumulative").print_stats(
+                    CONST.PROFILE_REPORT_LINES)
+            lines.append(stream.getvalue())
+        else:
+            lines.append("  {} samples every {} s".format(
+                    self.profiler.samples, self.profiler.interval))
+            lines.append("  {:>8}{:>8}  {}".format("self", "cumul",
+                    "function"))
+            for function, own, cumulative in self.profiler.top():
+                lines.append("  {:>8}{:>8}  {}".format(own, cumulative,
+                        function))
+            lines.append("")
+        current, peak = tracemalloc.get_traced_memory()
+        lines.append("Memory: {} bytes traced, {} bytes peak".format(
+                current, peak))
+        # Allocations of the profiler itself are not shown
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__)))
+        for stat in snapshot.statistics("lineno")[
+                :CONST.PROFILE_REPORT_LINES]:
+            lines.append("  {}".format(stat))
+        return "\n".join(lines) + "\n"
+
+###############################################################################
+### Profiling Control
+
+# Running profiling session
+_session = [None]
+
+
+def profiling_start(profiler=CONST.PROFILER_CPROFILE,
+        output_dir=CONST.PROFILE_DIR):
+    '''Start profiling, a report is written on SIGUSR1 and at
+    profiling_stop() (call it from the main thread).'''
+    if _session[0] is not None:
+        return
+    session = ProfilingSession(profiler, output_dir)
+    session.start()
+    _session[0] = session
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, _on_report_signal)
+
+
+def profiling_stop():
+    '''Stop profiling and write the final report.'''
+    session = _session[0]
+    if session is None:
+        return
+    _session[0] = None
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    session.stop()
+
+
+def _on_report_signal(signum, frame):
+    '''Write a report of the running profiling session.'''
+    session = _session[0]
+    if session is not None:
+        session.report()
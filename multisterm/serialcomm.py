@@ -16,10 +16,15 @@ Version:
 ###############################################################################
 ### Imported modules
 
-from serial import Serial, SerialException, SerialTimeoutException, LF
+import time
 
-from constants import LOG
+from serial import (
+    Serial, SerialException, SerialTimeoutException, LF, serial_for_url
+)
+
+from constants import LOG, CONST
 from auxiliar import print_log, is_running_with_py3
+from metrics import port_metrics
 
 ###############################################################################
 ### Serial Functions
@@ -27,14 +32,18 @@ from auxiliar import print_log, is_running_with_py3
 def serial_open(port, baudrate, read_timeout=None, write_timeout=None):
     '''Try to open a Serial Port.'''
     ser = None
-    print_log(LOG.INFO, "Opening Serial port {} at {}bps...".format(
-            port, str(baudrate)))
+    print_log(LOG.INFO, "Opening Serial port {} at {}bps...", port, baudrate)
     try:
-        ser = Serial(port=None)
-        ser.port = port
+        if serial_is_url(port):
+            ser = serial_for_url(port, do_not_open=True)
+        else:
+            ser = Serial(port=None)
+            ser.port = port
         ser.baudrate = baudrate
         ser.timeout=read_timeout
-        ser.write_timeout = write_timeout
+        # RFC 2217 ports don't support write timeouts
+        if not str(port).startswith("rfc2217://"):
+            ser.write_timeout = write_timeout
         if not ser.isOpen():
             ser.open()
         ser.flush()
@@ -43,20 +52,101 @@ def serial_open(port, baudrate, read_timeout=None, write_timeout=None):
         print_log(LOG.ERROR, str(e))
     if (ser is None) or (not ser.isOpen()):
         ser = None
+        port_metrics(port).open_errors.inc()
         print_log(LOG.ERROR, "Can't open serial port.")
+    else:
+        port_metrics(port).opens.inc()
     return ser
 
 
+def serial_is_url(port):
+    '''Check if a port is a pyserial URL (i.e. "rfc2217://<HOST>:<PORT>" or
+    "socket://<HOST>:<PORT>") instead of a device.'''
+    return "://" in str(port)
+
+
+def serial_flow_control_set(ser, flow_control=None):
+    '''Configure Serial Port flow control ("rtscts", "xonxoff" or None).'''
+    if ser is None:
+        return
+    print_log(LOG.INFO, "Serial flow control: {}", flow_control)
+    try:
+        ser.rtscts = (flow_control == "rtscts")
+        ser.xonxoff = (flow_control == "xonxoff")
+    except Exception as e:
+        print_log(LOG.ERROR, str(e))
+
+
+def serial_ready_parse(spec):
+    '''Parse a port readiness strategy ("none", "delay:<SECONDS>", "byte"
+    or "banner:<TEXT>"), get its (strategy, argument) or raise ValueError
+    if it is invalid.'''
+    strategy, _, arg = spec.partition(":")
+    if strategy not in CONST.READY_STRATEGIES:
+        raise ValueError("Unknown readiness strategy \"{}\".".format(spec))
+    if strategy == CONST.READY_DELAY:
+        try:
+            return (strategy, float(arg))
+        except ValueError:
+            raise ValueError("Invalid readiness delay \"{}\".".format(arg))
+    if strategy == CONST.READY_BANNER:
+        if not arg:
+            raise ValueError("Readiness banner not provided.")
+        return (strategy, arg.encode())
+    return (strategy, None)
+
+
+def serial_wait_ready(ser, ready=None, timeout=CONST.READY_TIMEOUT,
+        on_read=None):
+    '''Wait for the device after opening the port, with a readiness
+    strategy: None (no wait), ("delay", SECONDS), ("byte", None) to wait
+    for any data or ("banner", BYTES) to wait for a banner or prompt. The
+    data received while waiting is passed to on_read. Returns if the
+    device got ready before the timeout.'''
+    if (ser is None) or (ready is None) or (ready[0] == CONST.READY_NONE):
+        return True
+    strategy, arg = ready
+    if strategy == CONST.READY_DELAY:
+        time.sleep(arg)
+        return True
+    tail = b''
+    backup_timeout = ser.timeout
+    deadline = time.monotonic() + timeout
+    is_ready = False
+    try:
+        while not is_ready:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            ser.timeout = min(remaining, CONST.READY_POLL_TIME)
+            data = serial_read_available(ser)
+            if not data:
+                continue
+            if on_read is not None:
+                on_read(data)
+            if strategy == CONST.READY_BYTE:
+                is_ready = True
+                continue
+            # Keep the last bytes to find a banner split between reads
+            tail = tail + data
+            is_ready = (arg in tail)
+            tail = tail[max(0, len(tail) - len(arg) + 1):]
+    except Exception as e:
+        print_log(LOG.ERROR, str(e))
+    ser.timeout = backup_timeout
+    return is_ready
+
+
 def serial_close(ser=None):
     '''Try to close a Serial Port.'''
     # Check if no port provided
     if ser is None:
         return
     port = ser.port
-    print_log(LOG.INFO, "Closing Serial port {}...".format(port))
+    print_log(LOG.INFO, "Closing Serial port {}...", port)
     try:
         ser.close()
-        print_log(LOG.INFO, "Serial port {} closed.".format(port))
+        print_log(LOG.INFO, "Serial port {} closed.", port)
     except SerialException as e:
         print_log(LOG.ERROR, str(e))
 
@@ -71,17 +161,42 @@ def serial_read(ser=None, num_bytes=1024, timeout=None):
     if timeout is not None:
         ser.timeout = timeout
     # Read and restore default read timeout
+    raw_read = b''
     try:
         raw_read = ser.read(num_bytes)
     except Exception as e:
         print_log(LOG.ERROR, str(e))
     ser.timeout = backup_timeout
-    print_log(LOG.DEBUG, "Serial read (bytes):\n{}".format(raw_read))
+    print_log(LOG.DEBUG, "Serial read (bytes):\n{}", raw_read)
     if not raw_read:
         return b''
     return raw_read
 
 
+def serial_read_available(ser=None):
+    '''Read all bytes available in a Serial Port input buffer in one call.
+    Exceptions are propagated so the caller can detect port failures.'''
+    if ser is None:
+        return b''
+    size = ser.in_waiting or 1
+    # Non-blocking reads just get what is available, so a bigger size is
+    # requested for ports that can't tell the available bytes (sockets)
+    if ser.timeout == 0:
+        size = max(size, CONST.SERIAL_READ_SIZE)
+    raw_read = ser.read(size)
+    # Non-blocking reads of some ports (RFC 2217) get a byte each time
+    if raw_read and (ser.timeout == 0) and (len(raw_read) < size) and \
+            ser.in_waiting:
+        data = bytearray(raw_read)
+        while (len(data) < size) and ser.in_waiting:
+            data.extend(ser.read(size - len(data)))
+        raw_read = bytes(data)
+    if raw_read:
+        port_metrics(ser.port).rx(len(raw_read))
+    print_log(LOG.DEBUG, "Serial read (bytes):\n{}", raw_read)
+    return raw_read
+
+
 def serial_read_str(ser=None, num_bytes=1024, timeout=None):
     '''Try to read from a Serial Port and return read data as string.'''
     raw_read = serial_read(ser, num_bytes, timeout)
@@ -89,8 +204,9 @@ def serial_read_str(ser=None, num_bytes=1024, timeout=None):
     try:
         str_read = raw_read.decode()
     except Exception as e:
+        port_metrics(getattr(ser, "port", None)).decode_errors.inc()
         print_log(LOG.ERROR, str(e))
-    print_log(LOG.DEBUG, "Serial read (str):\n{}".format(str_read))
+    print_log(LOG.DEBUG, "Serial read (str):\n{}", str_read)
     return str_read
 
 
@@ -103,35 +219,39 @@ def serial_read_until(ser=None, expected=LF, num_bytes=1024, timeout=None):
     backup_timeout = ser.timeout
     if timeout is not None:
         ser.timeout = timeout
+    raw_read = b''
     try:
         raw_read = ser.read_until(expected=expected, size=num_bytes)
     except Exception as e:
         print_log(LOG.ERROR, str(e))
     ser.timeout = backup_timeout
-    print_log(LOG.DEBUG, "Serial read (bytes):\n{}".format(raw_read))
+    print_log(LOG.DEBUG, "Serial read (bytes):\n{}", raw_read)
     # Parse to string
     str_read = ""
     try:
-        str_read = str(raw_read) # str_read = raw_read.decode()
+        str_read = raw_read.decode()
     except Exception as e:
         print_log(LOG.ERROR, str(e))
-    print_log(LOG.DEBUG, "Serial read (str):\n{}".format(str_read))
+    print_log(LOG.DEBUG, "Serial read (str):\n{}", str_read)
     return str_read
 
 
-def serial_write(ser=None, to_write=None):
-    '''Basic Serial write function managed for Py2 and Py3 support.'''
+def serial_write(ser=None, to_write=None, flush=True):
+    '''Basic Serial write function managed for Py2 and Py3 support (it
+    waits for the data to be transmitted only if flush is requested).'''
     if ser is None:
         return None
-    print_log(LOG.DEBUG, "Serial write (str):\n{}".format(to_write))
-    if is_running_with_py3():
+    print_log(LOG.DEBUG, "Serial write (str):\n{}", to_write)
+    if is_running_with_py3() and isinstance(to_write, str):
         to_write = to_write.encode()
     try:
         ser.write(to_write)
+        port_metrics(ser.port).tx_bytes.inc(len(to_write))
     except Exception as e:
         print_log(LOG.ERROR, str(e))
-    print_log(LOG.DEBUG, "Serial write (bytes):\n{}".format(to_write))
-    ser.flush()
+    print_log(LOG.DEBUG, "Serial write (bytes):\n{}", to_write)
+    if flush:
+        ser.flush()
 
 
 def serial_flush(ser=None):
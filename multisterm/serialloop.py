@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    serialloop.py
+Description:
+    Event driven Serial Port I/O loop. It waits on the ports file
+    descriptors and just wakes up when there is data to read, when a timer
+    expires or when it is requested to stop, so no polling timeouts are
+    involved (except for ports without a file descriptor, like RFC 2217
+    network ports, that are read periodically). A single loop can serve
+    any number of ports.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import selectors
+import time
+from collections import deque
+from os import pipe as os_pipe
+from os import read as os_read
+from os import write as os_write
+from os import close as os_close
+from os import set_blocking as os_set_blocking
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from serialcomm import serial_read_available
+from metrics import port_metrics
+from profiling import span
+
+###############################################################################
+### Serial Event Loop
+
+class SerialEventLoop():
+    '''Wait for Serial ports data and dispatch it to read callbacks.'''
+
+    def __init__(self, ser=None, on_read=None):
+        self.ser = ser
+        self.on_read = on_read
+        self._running = True
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os_pipe()
+        os_set_blocking(self._wake_r, False)
+        os_set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._serials = {}
+        self._polled = {}
+        self._timers = []
+        self._calls = deque()
+        if ser is not None:
+            self.add_serial(ser, on_read)
+
+    def add_serial(self, ser, on_read, on_error=None):
+        '''Register a Serial port to call on_read with received data. If
+        the port fails, on_error is called with the port and the exception
+        (the loop is stopped if no on_error is provided).'''
+        # Reads are done only when data is ready, so they must never block
+        ser.timeout = 0
+        callback = lambda: self._serial_ready(ser, on_read, on_error)
+        try:
+            fd = ser.fileno()
+        except (AttributeError, OSError, ValueError):
+            # Reads of a port without file descriptor never block and
+            # raise on port failures, so it can be read periodically
+            self._polled[ser] = callback
+            self.add_timer(CONST.LOOP_POLL_INTERVAL, callback)
+            return
+        self._serials[ser] = fd
+        self._selector.register(fd, selectors.EVENT_READ, callback)
+
+    def remove_serial(self, ser):
+        '''Unregister a Serial port.'''
+        fd = self._serials.pop(ser, None)
+        if fd is not None:
+            self._selector.unregister(fd)
+        callback = self._polled.pop(ser, None)
+        if callback is not None:
+            self.remove_timer(callback)
+
+    def add_reader(self, fileobj, callback):
+        '''Register an extra file object to call callback when readable.'''
+        self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj):
+        '''Unregister an extra file object.'''
+        self._selector.unregister(fileobj)
+
+    def add_timer(self, interval, callback):
+        '''Call callback periodically each interval seconds.'''
+        self._timers.append([time.monotonic() + interval, interval, callback])
+
+    def remove_timer(self, callback):
+        '''Remove the timers of a callback.'''
+        self._timers = [timer for timer in self._timers
+                if timer[2] != callback]
+
+    def call_soon(self, callback):
+        '''Request a function call from the loop thread (it can be called
+        from any thread).'''
+        self._calls.append(callback)
+        self._wake()
+
+    def is_running(self):
+        '''Check if the loop is running.'''
+        return self._running
+
+    def run(self):
+        '''Dispatch events until stop() is called or a port fails.'''
+        while self._running:
+            for key, _ in self._selector.select(self._timeout()):
+                if key.data is None:
+                    self._wake_drain()
+                else:
+                    key.data()
+                if not self._running:
+                    break
+            while self._calls:
+                self._calls.popleft()()
+            if self._timers:
+                self._timers_run()
+
+    def stop(self):
+        '''Request loop stop, it can be called from any thread.'''
+        self._running = False
+        self._wake()
+
+    def close(self):
+        '''Release loop resources (it does not close the Serial ports).'''
+        self._selector.close()
+        os_close(self._wake_r)
+        os_close(self._wake_w)
+
+    def _wake(self):
+        '''Wake up the loop if it is waiting for events.'''
+        try:
+            os_write(self._wake_w, b'\0')
+        except OSError:
+            pass
+
+    def _wake_drain(self):
+        '''Empty the wake up pipe.'''
+        try:
+            while os_read(self._wake_r, 64):
+                pass
+        except OSError:
+            pass
+
+    def _timeout(self):
+        '''Get time to wait for events until next timer expiration.'''
+        if self._calls:
+            return 0
+        if not self._timers:
+            return None
+        next_time = min(timer[0] for timer in self._timers)
+        return max(0, next_time - time.monotonic())
+
+    def _timers_run(self):
+        '''Call expired timers callbacks.'''
+        now = time.monotonic()
+        # Callbacks can add or remove timers
+        for timer in list(self._timers):
+            if now >= timer[0]:
+                timer[0] = now + timer[1]
+                timer[2]()
+
+    def _serial_ready(self, ser, on_read, on_error):
+        '''Read all bytes a port has available and dispatch them.'''
+        try:
+            with span("serial_read"):
+                data = serial_read_available(ser)
+        except Exception as e:
+            port_metrics(ser.port).read_errors.inc()
+            print_log(LOG.ERROR, str(e))
+            if on_error is None:
+                self._running = False
+            else:
+                self.remove_serial(ser)
+                on_error(ser, e)
+            return
+        if data and (on_read is not None):
+            on_read(data)
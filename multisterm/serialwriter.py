@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    serialwriter.py
+Description:
+    Serial Port write scheduler. Writers enqueue whole messages in a
+    bounded queue and return immediately, while a single writer thread
+    sends them, joining all pending small messages in one write() call and
+    flushing only at the end of a batch that contains a message boundary
+    that requests it (or when asked to). Each message is written in a
+    single call and by a single thread, so messages from different writers
+    never interleave. Messages are sent by priority class, and a full queue
+    blocks (or rejects) new messages to signal backpressure. A batch whose
+    write fails is discarded, unless the on_error callback (i.e. a port
+    supervisor that will reopen the port) asks to hold it: then it is put
+    back in the queue until the writer is resumed.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from collections import deque
+from threading import Thread, Condition
+
+from constants import LOG, PRIO, CONST
+from auxiliar import print_log
+from metrics import REGISTRY, port_metrics
+
+###############################################################################
+### Serial Writer
+
+class SerialWriter():
+    '''Serial port writes queue served by a background thread.'''
+
+    def __init__(self, ser, max_size=CONST.WRITE_QUEUE_SIZE,
+            coalesce_size=CONST.WRITE_COALESCE_SIZE, on_error=None):
+        self.ser = ser
+        # Called with write errors, it returns if the batch must be held
+        self.on_error = on_error
+        self.max_size = max_size
+        self.coalesce_size = coalesce_size
+        self._queues = [deque() for _ in PRIO.TEXT]
+        self._queued_bytes = 0
+        self._cond = Condition()
+        self._thread = None
+        self._running = False
+        self._flush_requested = False
+        self._writing = False
+        self._paused = False
+        # Statistics
+        self.max_queued_bytes = 0
+        self.messages_written = 0
+        self.bytes_written = 0
+        self.writes = 0
+        self.flushes = 0
+        self.backpressure_events = 0
+        self.errors = 0
+        self.messages_dropped = 0
+        self._latencies = deque(maxlen=CONST.WRITE_LATENCY_SAMPLES)
+        # Metrics
+        port = str(getattr(ser, "port", None))
+        labels = {"port": port}
+        self._port_metrics = port_metrics(port)
+        self._latency_metric = REGISTRY.histogram(
+                "multisterm_write_latency_seconds",
+                "Time from message enqueue to its write",
+                CONST.METRICS_LATENCY_BUCKETS, labels)
+        self._depth_metric = REGISTRY.histogram(
+                "multisterm_write_queue_depth_bytes",
+                "Write queue bytes when a message is enqueued",
+                CONST.METRICS_SIZE_BUCKETS, labels)
+        REGISTRY.gauge("multisterm_write_queued_bytes",
+                "Bytes waiting in the write queue", labels,
+                fn=lambda: self._queued_bytes)
+        REGISTRY.counter("multisterm_write_backpressure_total",
+                "Writes that found the write queue full", labels,
+                fn=lambda: self.backpressure_events)
+        REGISTRY.counter("multisterm_write_errors_total",
+                "Port write failures", labels, fn=lambda: self.errors)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Launch the writer thread.'''
+        self._running = True
+        self._thread = Thread(target=self._th_write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=CONST.WRITE_DRAIN_TIMEOUT):
+        '''Send pending messages (waiting at most timeout, held messages of
+        a paused writer are discarded) and stop.'''
+        if not self._paused:
+            self.drain(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write(self, data, priority=PRIO.NORMAL, flush=False, block=True,
+            timeout=None):
+        '''Enqueue a message to be written atomically. If the queue is full
+        it waits for space (at most timeout) or, if not blocking, returns
+        False (backpressure).'''
+        if isinstance(data, str):
+            data = data.encode()
+        size = len(data)
+        with self._cond:
+            if not self._has_space(size):
+                self.backpressure_events = self.backpressure_events + 1
+                if not block:
+                    return False
+                if not self._cond.wait_for(lambda: self._has_space(size),
+                        timeout):
+                    return False
+            self._queues[priority].append((data, flush, time.monotonic()))
+            self._queued_bytes = self._queued_bytes + size
+            self.max_queued_bytes = max(self.max_queued_bytes,
+                    self._queued_bytes)
+            self._cond.notify_all()
+        self._depth_metric.observe(self._queued_bytes)
+        return True
+
+    def pause(self):
+        '''Hold queued messages (i.e. while the port is disconnected).'''
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        '''Send the held messages.'''
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def flush(self, wait=True, timeout=None):
+        '''Request a flush of the port once the queued messages are sent.'''
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+        if wait:
+            return self.drain(timeout)
+        return True
+
+    def drain(self, timeout=None):
+        '''Wait until all queued messages have been written.'''
+        with self._cond:
+            return self._cond.wait_for(lambda: ((not self._queued_bytes) and
+                    (not self._writing) and (not self._flush_requested)) or
+                    (not self._running), timeout)
+
+    def full(self):
+        '''Check if the queue is full (backpressure signal).'''
+        return self._queued_bytes >= self.max_size
+
+    def queued(self):
+        '''Get the number of messages and bytes waiting to be written.'''
+        return (sum(len(queue) for queue in self._queues), self._queued_bytes)
+
+    def stats(self):
+        '''Get queue depth and write latency statistics.'''
+        latencies = sorted(self._latencies)
+        messages, queued_bytes = self.queued()
+        stats = {
+            "queued_messages": messages,
+            "queued_bytes": queued_bytes,
+            "max_queued_bytes": self.max_queued_bytes,
+            "messages_written": self.messages_written,
+            "bytes_written": self.bytes_written,
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "backpressure_events": self.backpressure_events,
+            "errors": self.errors,
+            "messages_dropped": self.messages_dropped,
+            "latency_avg_ms": 0.0,
+            "latency_p99_ms": 0.0,
+            "latency_max_ms": 0.0
+        }
+        if latencies:
+            stats["latency_avg_ms"] = \
+                sum(latencies) / len(latencies) * 1000
+            stats["latency_p99_ms"] = \
+                latencies[int(0.99 * (len(latencies) - 1))] * 1000
+            stats["latency_max_ms"] = latencies[-1] * 1000
+        return stats
+
+    def _has_space(self, size):
+        '''Check if a message fits in the queue (a message bigger than the
+        queue is accepted when the queue is empty).'''
+        return (self._queued_bytes + size <= self.max_size) or \
+            (self._queued_bytes == 0)
+
+    def _batch_get(self):
+        '''Get the next batch of whole messages to write (highest priority
+        first), if it needs a flush and the taken (priority, message) queue
+        entries (to put them back if the write fails).'''
+        batch = []
+        batch_size = 0
+        flush = False
+        taken = []
+        for priority, queue in enumerate(self._queues):
+            while queue:
+                data, msg_flush, msg_time = queue[0]
+                if batch and (batch_size + len(data) > self.coalesce_size):
+                    return (batch, flush, taken)
+                taken.append((priority, queue.popleft()))
+                batch.append(data)
+                batch_size = batch_size + len(data)
+                flush = flush or msg_flush
+        return (batch, flush, taken)
+
+    def _batch_requeue(self, taken, flush_requested):
+        '''Put back a failed batch at the front of its queues and hold the
+        writes until resume() (i.e. the port is reopened), so no message is
+        lost while the port failure is handled.'''
+        for priority, message in reversed(taken):
+            self._queues[priority].appendleft(message)
+        self._flush_requested = self._flush_requested or flush_requested
+        self._paused = True
+
+    def _th_write(self):
+        '''Writer thread.'''
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: ((self._queued_bytes or
+                        self._flush_requested) and (not self._paused)) or
+                        (not self._running))
+                if (not self._running) and ((not self._queued_bytes) or
+                        self._paused):
+                    break
+                batch, flush, taken = self._batch_get()
+                # Requested flush is done after last queued message
+                flush_requested = False
+                if self._flush_requested and (not any(self._queues)):
+                    flush = True
+                    flush_requested = True
+                    self._flush_requested = False
+                self._writing = True
+            data = batch[0] if len(batch) == 1 else b"".join(batch)
+            try:
+                if data:
+                    self.ser.write(data)
+                    self.writes = self.writes + 1
+                    self._port_metrics.tx_bytes.inc(len(data))
+                if flush:
+                    self.ser.flush()
+                    self.flushes = self.flushes + 1
+            except Exception as e:
+                self.errors = self.errors + 1
+                print_log(LOG.ERROR, "Serial write fail: {}", e)
+                hold = (self.on_error is not None) and self.on_error(e)
+                with self._cond:
+                    self._writing = False
+                    if hold:
+                        self._batch_requeue(taken, flush_requested)
+                    else:
+                        # The written part of the batch is unknown
+                        self._queued_bytes = self._queued_bytes - len(data)
+                        self.messages_dropped = \
+                            self.messages_dropped + len(batch)
+                    self._cond.notify_all()
+                continue
+            now = time.monotonic()
+            for _, (_, _, msg_time) in taken:
+                self._latencies.append(now - msg_time)
+                self._latency_metric.observe(now - msg_time)
+            with self._cond:
+                self._writing = False
+                self._queued_bytes = self._queued_bytes - len(data)
+                self.messages_written = self.messages_written + len(batch)
+                self.bytes_written = self.bytes_written + len(data)
+                self._cond.notify_all()
+            print_log(LOG.DEBUG, "Serial write (bytes):\n{}", data)
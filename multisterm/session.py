@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    session.py
+Description:
+    Embeddable Serial port session. A SerialSession owns (or attaches
+    through its broker to) a Serial port and serves it without blocking
+    its user: received data is dispatched by an event loop in a background
+    thread to callbacks and to an iterator interface, and data is written
+    through a Serial writer. Any number of sessions can share a single
+    event loop thread (SessionLoop), so a long-lived process can keep
+    hundreds of ports open. Failed ports are reopened when they come back
+    (see hotplug.py). Sessions keep all their state, so they don't depend
+    on module globals.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from collections import deque
+from threading import Thread, Condition, Event, current_thread
+
+from constants import LOG, PRIO, CONST
+from auxiliar import print_log
+from broker import BrokerPort, broker_is_running
+from serialcomm import (
+    serial_open, serial_close, serial_flow_control_set, serial_wait_ready,
+    SerialTimeoutException
+)
+from serialloop import SerialEventLoop
+from serialwriter import SerialWriter
+from hotplug import PortSupervisor
+
+###############################################################################
+### Session Loop
+
+class SessionLoop():
+    '''Serial event loop served by a background thread, that can be shared
+    by any number of sessions.'''
+
+    def __init__(self):
+        self.loop = SerialEventLoop()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Launch the loop thread.'''
+        self._thread = Thread(target=self.loop.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the loop thread and release its resources.'''
+        if self._thread is None:
+            return
+        self.loop.stop()
+        if self._thread is not current_thread():
+            self._thread.join()
+        self._thread = None
+        self.loop.close()
+
+    def is_running(self):
+        '''Check if the loop thread is running.'''
+        return (self._thread is not None) and self._thread.is_alive()
+
+    def call(self, callback):
+        '''Run a function in the loop thread and wait for it (the loop
+        structures are not thread safe).'''
+        if (self._thread is None) or (self._thread is current_thread()) or \
+                (not self._thread.is_alive()):
+            callback()
+            return
+        done = Event()
+        def call_and_notify():
+            try:
+                callback()
+            finally:
+                done.set()
+        self.loop.call_soon(call_and_notify)
+        while not done.wait(CONST.SESSION_CALL_TIMEOUT):
+            if not self._thread.is_alive():
+                break
+
+###############################################################################
+### Serial Session
+
+class SerialSession():
+    '''Serial port session with callback and iterator interfaces for the
+    received data. If no SessionLoop is provided, the session runs its
+    own one.'''
+
+    def __init__(self, port, bauds=0, on_read=None, capture=None,
+            flow_control=None, ready=None, ready_timeout=CONST.READY_TIMEOUT,
+            reconnect=True, on_disconnect=None, on_reconnect=None, loop=None,
+            queue_size=CONST.SESSION_QUEUE_SIZE):
+        self.port = port
+        self.bauds = bauds
+        self.capture = capture
+        self.flow_control = flow_control
+        self.ready = ready
+        self.ready_timeout = ready_timeout
+        self.reconnect = reconnect
+        self.on_disconnect = on_disconnect
+        self.on_reconnect = on_reconnect
+        self.ser = None
+        self.writer = None
+        self.supervisor = None
+        self.attached = False
+        self.open_time = None
+        self.first_rx_time = None
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.chunks_dropped = 0
+        self._listeners = []
+        if on_read is not None:
+            self._listeners.append(on_read)
+        self._session_loop = loop
+        self._own_loop = (loop is None)
+        self._timers = []
+        self._running = False
+        self._closed = Event()
+        # Received chunks for the iterator interface (0 to disable it)
+        self._queue = deque(maxlen=queue_size) if queue_size else None
+        self._queue_cond = Condition()
+
+    def __enter__(self):
+        if not self.start():
+            raise OSError("Can't open Serial port {}".format(self.port))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __iter__(self):
+        '''Iterate received chunks until the session ends.'''
+        while True:
+            data = self.read()
+            if data is None:
+                return
+            yield data
+
+    def open(self):
+        '''Open the Serial port (or attach to the broker that owns it).'''
+        if self.ser is not None:
+            return True
+        self.attached = broker_is_running(self.port)
+        if self.attached:
+            try:
+                self.ser = BrokerPort(self.port, 1.0)
+            except OSError as e:
+                print_log(LOG.ERROR, str(e))
+                print_log(LOG.INFO, "Can't attach to Serial port broker.")
+                return False
+        else:
+            self.ser = serial_open(self.port, self.bauds, 1.0, 1.0)
+            if (self.ser is None) or (not self.ser.isOpen()):
+                self.ser = None
+                return False
+            serial_flow_control_set(self.ser, self.flow_control)
+        self.open_time = time.monotonic()
+        return True
+
+    def start(self):
+        '''Open the port, wait for the device with the ready strategy (see
+        serial_wait_ready()) and serve the port in the loop thread. It
+        returns without waiting for any data.'''
+        if self._running:
+            return True
+        if not self.open():
+            return False
+        self._closed.clear()
+        self.writer = SerialWriter(self.ser, on_error=self._on_write_error)
+        self.writer.start()
+        # Data received meanwhile is dispatched as any other data
+        if (not self.attached) and (not serial_wait_ready(self.ser,
+                self.ready, self.ready_timeout, self._on_read)):
+            print_log(LOG.WARNING, "Device not ready after {} s.",
+                    self.ready_timeout)
+        if self._session_loop is None:
+            self._session_loop = SessionLoop()
+            self._session_loop.start()
+        self._running = True
+        self._session_loop.call(self._loop_add)
+        return True
+
+    def stop(self):
+        '''Stop serving the port, send pending writes and close it.'''
+        if self._running:
+            self._running = False
+            self._session_loop.call(self._loop_remove)
+            if self._own_loop:
+                self._session_loop.stop()
+                self._session_loop = None
+        if self.writer is not None:
+            self.writer.stop()
+            self.writer = None
+        if self.ser is not None:
+            if self.ser.isOpen():
+                serial_close(self.ser)
+            self.ser = None
+        self._end()
+
+    close = stop
+
+    def is_running(self):
+        '''Check if the session is serving the port.'''
+        return self._running and (not self._closed.is_set())
+
+    def wait(self, timeout=None):
+        '''Wait until the session ends (stopped or its port failed without
+        reconnection). Returns if it ended.'''
+        return self._closed.wait(timeout)
+
+    def add_listener(self, callback):
+        '''Call callback with each received chunk (from the loop thread).'''
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        '''Stop calling a received data callback.'''
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def add_timer(self, interval, callback):
+        '''Call callback periodically in the loop thread while the session
+        runs.'''
+        self._timers.append((interval, callback))
+        if self._running:
+            self._session_loop.call(
+                    lambda: self._session_loop.loop.add_timer(interval,
+                    callback))
+
+    def remove_timer(self, callback):
+        '''Stop calling a timer callback.'''
+        self._timers = [timer for timer in self._timers
+                if timer[1] != callback]
+        if self._running:
+            self._session_loop.call(
+                    lambda: self._session_loop.loop.remove_timer(callback))
+
+    def call(self, callback):
+        '''Run a function in the loop thread and wait for it.'''
+        if self._session_loop is None:
+            callback()
+            return
+        self._session_loop.call(callback)
+
+    def write(self, data, flush=True, priority=PRIO.NORMAL, block=True,
+            timeout=None):
+        '''Queue data to be written (see SerialWriter.write()). Returns if
+        it was queued.'''
+        if isinstance(data, str):
+            data = data.encode()
+        if (self.writer is None) or \
+                (not self.writer.write(data, priority, flush, block, timeout)):
+            return False
+        self.bytes_sent = self.bytes_sent + len(data)
+        if self.capture is not None:
+            self.capture.log_tx(data)
+        return True
+
+    def read(self, timeout=None):
+        '''Get the next received chunk (iterator interface), waiting at
+        most timeout seconds (b'' on timeout, None once the session ended
+        and all chunks were read).'''
+        if self._queue is None:
+            raise ValueError("Session without received data queue")
+        with self._queue_cond:
+            if not self._queue_cond.wait_for(lambda: self._queue or
+                    self._closed.is_set(), timeout):
+                return b''
+            if self._queue:
+                return self._queue.popleft()
+            return None
+
+    def stats(self):
+        '''Get session statistics.'''
+        stats = {
+            "port": self.port,
+            "running": self.is_running(),
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "chunks_dropped": self.chunks_dropped,
+            "disconnects": 0
+        }
+        if self.supervisor is not None:
+            stats["disconnects"] = self.supervisor.disconnects
+        if self.writer is not None:
+            stats["writer"] = self.writer.stats()
+        return stats
+
+    def _loop_add(self):
+        '''Serve the port in the loop (loop thread).'''
+        loop = self._session_loop.loop
+        if self.attached or (not self.reconnect):
+            loop.add_serial(self.ser, self._on_read, self._on_error)
+        else:
+            self.supervisor = PortSupervisor(loop, self.ser, self._on_read,
+                    self._on_disconnect, self._on_reconnect)
+            self.supervisor.start()
+        for interval, callback in self._timers:
+            loop.add_timer(interval, callback)
+
+    def _loop_remove(self):
+        '''Stop serving the port in the loop (loop thread).'''
+        loop = self._session_loop.loop
+        loop.remove_serial(self.ser)
+        if self.supervisor is not None:
+            self.supervisor.close()
+        for _, callback in self._timers:
+            loop.remove_timer(callback)
+
+    def _on_read(self, data):
+        '''Dispatch received data.'''
+        if self.first_rx_time is None:
+            self.first_rx_time = time.monotonic()
+        self.bytes_received = self.bytes_received + len(data)
+        if self.capture is not None:
+            self.capture.log_rx(data)
+        for callback in self._listeners:
+            callback(data)
+        if self._queue is not None:
+            with self._queue_cond:
+                # Oldest chunks are dropped if nobody reads them
+                if len(self._queue) == self._queue.maxlen:
+                    self.chunks_dropped = self.chunks_dropped + 1
+                self._queue.append(data)
+                self._queue_cond.notify_all()
+
+    def _on_error(self, ser, error):
+        '''Port failure without reconnection, the session ends.'''
+        if self.on_disconnect is not None:
+            self.on_disconnect(error)
+        for _, callback in self._timers:
+            self._session_loop.loop.remove_timer(callback)
+        self._end()
+
+    def _on_write_error(self, error):
+        '''Writer failure (writer thread). The batch is held only if the
+        port is supervised, as its reopening resumes the writer (a write
+        timeout is not a port failure and its batch can be partially
+        written, so it is discarded).'''
+        if (self.supervisor is None) or \
+                isinstance(error, SerialTimeoutException):
+            return False
+        # The port is reopened even if its reads did not fail
+        self._session_loop.loop.call_soon(lambda: self._port_fail(error))
+        return True
+
+    def _port_fail(self, error):
+        '''Handle a write failure as a port failure (loop thread).'''
+        if self._running and (self.supervisor is not None):
+            self.supervisor.fail(error)
+
+    def _on_disconnect(self, error):
+        '''Port failure (it is reopened when it comes back), writes are
+        held meanwhile.'''
+        self.writer.pause()
+        if self.capture is not None:
+            self.capture.mark("Serial port disconnected ({})".format(error))
+        if self.on_disconnect is not None:
+            self.on_disconnect(error)
+
+    def _on_reconnect(self, outage):
+        '''Port reopened.'''
+        if self.capture is not None:
+            self.capture.mark("Serial port reconnected ({:.3f} s " \
+                    "outage)".format(outage))
+        if self.on_reconnect is not None:
+            self.on_reconnect(outage)
+        self.writer.resume()
+
+    def _end(self):
+        '''Mark the session as ended and wake up its readers.'''
+        with self._queue_cond:
+            self._closed.set()
+            self._queue_cond.notify_all()
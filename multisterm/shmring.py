@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    shmring.py
+Description:
+    Shared memory RX ring. The process that owns a Serial port publishes
+    the received stream in a named shared memory ring of fixed size slots
+    (each one with its sequence number, timestamp and data length), so any
+    number of local read-only taps can map it and read the data in place
+    through memoryview slices: no copies and no syscalls per chunk, and
+    nothing at all to do for the writer per attached tap. Taps detect the
+    chunks they lost (overwritten before being read) by sequence gaps.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import time
+from os import getpid as os_getpid
+from os import path as os_path
+from struct import calcsize as struct_calcsize
+from struct import pack_into as struct_pack_into
+from struct import unpack_from as struct_unpack_from
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from metrics import REGISTRY
+
+###############################################################################
+### Constants
+
+# Ring header: magic, version, number of slots, slot data size, writer
+# state, writer PID and next sequence number to write
+RING_MAGIC = b"MSTMRING"
+RING_VERSION = 1
+RING_HEADER = "<8sIIIIIxxxxQ"
+RING_HEADER_SIZE = 64
+RING_STATE_OFFSET = struct_calcsize("<8sIII")
+RING_SEQ_OFFSET = struct_calcsize("<8sIIIIIxxxx")
+RING_STATE_OPEN = 1
+RING_STATE_CLOSED = 2
+
+# Slot header: sequence number, timestamp and data length
+SLOT_HEADER = "<QdIxxxx"
+SLOT_HEADER_SIZE = struct_calcsize(SLOT_HEADER)
+
+###############################################################################
+### Auxiliar Functions
+
+def shm_ring_name(port):
+    '''Get the shared memory ring name of a Serial port.'''
+    port_name = os_path.realpath(port).strip("/").replace("/", "_")
+    return "multisterm_{}".format(port_name)
+
+###############################################################################
+### Ring Writer
+
+class ShmRingWriter():
+    '''Publisher of a received stream in a shared memory ring.'''
+
+    def __init__(self, name, slots=CONST.SHM_RING_SLOTS,
+            slot_size=CONST.SHM_RING_SLOT_SIZE):
+        from multiprocessing import shared_memory
+        self.name = name
+        self.slots = slots
+        self.slot_size = slot_size
+        self.seq = 0
+        self._slot_stride = SLOT_HEADER_SIZE + slot_size
+        size = RING_HEADER_SIZE + (slots * self._slot_stride)
+        try:
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        except FileExistsError:
+            # Stale ring of a writer that did not clean up
+            print_log(LOG.WARNING, "Replacing stale ring {}.", name)
+            shared_memory.SharedMemory(name).unlink()
+            self._shm = shared_memory.SharedMemory(name, True, size)
+        self._buf = self._shm.buf
+        struct_pack_into(RING_HEADER, self._buf, 0, RING_MAGIC, RING_VERSION,
+                slots, slot_size, RING_STATE_OPEN, os_getpid(), 0)
+        labels = {"ring": name}
+        self._chunks_metric = REGISTRY.counter(
+                "multisterm_shm_ring_chunks_total",
+                "Chunks published in the shared memory ring", labels,
+                fn=lambda: self.seq)
+
+    def write(self, data):
+        '''Publish received data (split in slots of the slot size).'''
+        for i in range(0, len(data), self.slot_size):
+            chunk = data[i:i+self.slot_size]
+            offset = RING_HEADER_SIZE + \
+                    ((self.seq % self.slots) * self._slot_stride)
+            # The slot header is updated first, so a reader of the slot
+            # previous sequence can detect that it is being overwritten
+            struct_pack_into(SLOT_HEADER, self._buf, offset, self.seq,
+                    time.time(), len(chunk))
+            offset = offset + SLOT_HEADER_SIZE
+            self._buf[offset:offset+len(chunk)] = chunk
+            self.seq = self.seq + 1
+            struct_pack_into("<Q", self._buf, RING_SEQ_OFFSET, self.seq)
+
+    def close(self):
+        '''Mark the ring as closed (for the taps) and remove it.'''
+        struct_pack_into("<I", self._buf, RING_STATE_OFFSET,
+                RING_STATE_CLOSED)
+        self._buf = None
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+
+###############################################################################
+### Ring Reader
+
+class ShmRingReader():
+    '''Read-only tap of a shared memory ring. It starts reading at the
+    newest published data.'''
+
+    def __init__(self, name):
+        from multiprocessing import shared_memory
+        self.name = name
+        self._shm = shared_memory.SharedMemory(name)
+        try:
+            # Attached segments must not be removed at exit (Python < 3.13
+            # tracks them as created by this process)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        except Exception as e:
+            print_log(LOG.DEBUG, "Ring untrack fail: {}", e)
+        self._buf = self._shm.buf
+        magic, version, self.slots, self.slot_size, _, self.writer_pid, \
+                self.next_seq = struct_unpack_from(RING_HEADER, self._buf, 0)
+        if (magic != RING_MAGIC) or (version != RING_VERSION):
+            self.close()
+            raise ValueError("Invalid shared memory ring {}".format(name))
+        self._slot_stride = SLOT_HEADER_SIZE + self.slot_size
+        self.chunks_read = 0
+        self.chunks_lost = 0
+        self._lost_metric = REGISTRY.counter(
+                "multisterm_shm_tap_lost_chunks_total",
+                "Ring chunks overwritten before the tap read them",
+                {"ring": name}, fn=lambda: self.chunks_lost)
+
+    def is_closed(self):
+        '''Check if the writer closed the ring.'''
+        state = struct_unpack_from("<I", self._buf, RING_STATE_OFFSET)[0]
+        return state != RING_STATE_OPEN
+
+    def read(self, max_chunks=None):
+        '''Get the published chunks pending to be read, as a list of
+        (sequence, timestamp, data memoryview) and the number of chunks
+        lost since the previous read. Views are slices of the ring that
+        the writer will overwrite after a whole ring lap, copy them to keep
+        the data longer.'''
+        write_seq = struct_unpack_from("<Q", self._buf, RING_SEQ_OFFSET)[0]
+        lost = 0
+        if write_seq - self.next_seq > self.slots:
+            lost = write_seq - self.slots - self.next_seq
+            self.next_seq = write_seq - self.slots
+        end_seq = write_seq
+        if max_chunks is not None:
+            end_seq = min(end_seq, self.next_seq + max_chunks)
+        chunks = []
+        for seq in range(self.next_seq, end_seq):
+            offset = RING_HEADER_SIZE + \
+                    ((seq % self.slots) * self._slot_stride)
+            slot_seq, timestamp, size = struct_unpack_from(SLOT_HEADER,
+                    self._buf, offset)
+            if slot_seq != seq:
+                break
+            offset = offset + SLOT_HEADER_SIZE
+            chunks.append((seq, timestamp, self._buf[offset:offset+size]))
+        # Drop the chunks the writer started to overwrite meanwhile
+        write_seq = struct_unpack_from("<Q", self._buf, RING_SEQ_OFFSET)[0]
+        overwritten = 0
+        while chunks and (chunks[0][0] + self.slots <= write_seq):
+            chunks.pop(0)[2].release()
+            overwritten = overwritten + 1
+        lost = lost + overwritten
+        self.next_seq = self.next_seq + overwritten + len(chunks)
+        self.chunks_read = self.chunks_read + len(chunks)
+        self.chunks_lost = self.chunks_lost + lost
+        return chunks, lost
+
+    def close(self):
+        '''Unmap the ring (views of read chunks must be released first).'''
+        self._buf = None
+        try:
+            self._shm.close()
+        except BufferError as e:
+            print_log(LOG.DEBUG, "Ring unmap fail: {}", e)
@@ -24,7 +24,27 @@ class TEXT():
         "\n" \
         "SYNOPSIS\n" \
         "       python multiserialterm.py [--help] [--version] [-p <PORT>] " \
-        "[-b <BAUDS>] [-l <LOG_FILE>]\n" \
+        "[-b <BAUDS>] [-l <LOG_FILE>] [--log-format <FORMAT>] " \
+        "[--log-max-size <BYTES>] [--log-index] " \
+        "[--log-compress <CODEC>] " \
+        "[--log-max-time <SECONDS>] [--ports <PORT[:BAUDS[:NAME]]> ...] " \
+        "[--ports-file <PORTS_FILE>] [--framing <FRAMING>] " \
+        "[--ready <STRATEGY>] [--ready-timeout <SECONDS>] " \
+        "[--highlight <PATTERN> ...] [--filter <PATTERN> ...] " \
+        "[--filter-out <PATTERN> ...] [--triggers-file <TRIGGERS_FILE>] " \
+        "[--flow-control <FLOW_CONTROL>] [--display <MODE>] " \
+        "[--row-bytes <BYTES>] [--no-offsets] [--input-mode <MODE>] " \
+        "[--stats] [--metrics-file <FILE>] [--metrics-socket] " \
+        "[--profile <PROFILER>] [--profile-dir <DIR>] " \
+        "[--broker] " \
+        "[--broker-policy <POLICY>] [--publish] [--tap] " \
+        "[--serve <[HOST:]PORT>] " \
+        "[--serve-rfc2217 <[HOST:]PORT>] [--batch <SCRIPT_FILE>] " \
+        "[--batch-depth <NUM>] [--batch-expect <PATTERN>]\n" \
+        "       python multiserialterm.py search <LOG_FILE> [<PATTERN>] " \
+        "[--regex] [--ignore-case] [--start <TIMESTAMP>] " \
+        "[--end <TIMESTAMP>] [--direction <DIR>] [--count] " \
+        "[--max-count <NUM>] [--no-bloom] [--stats]\n" \
         "\n" \
         "DESCRIPTION\n" \
         "       Multi-Serial-Terminal for multiple connections and " \
@@ -37,7 +57,8 @@ class TEXT():
         "           Shows help text (current information).\n" \
         "\n" \
         "       -p --port\n" \
-        "           Specify the Serial port to use.\n" \
+        "           Specify the Serial port to use (or a network bridge " \
+        "as \"socket://<HOST>:<PORT>\" or \"rfc2217://<HOST>:<PORT>\").\n" \
         "\n" \
         "       -b --bauds\n" \
         "           Specify Serial communication speed BaudRate.\n" \
@@ -45,6 +66,160 @@ class TEXT():
         "       -l --log\n" \
         "           Specify a file to log all Serial received-transmitted data.\n" \
         "\n" \
+        "       --log-format\n" \
+        "           Log file format, \"text\" (default) or \"binary\" " \
+        "(timestamped RX/TX records with a seek index, use capturebin.py " \
+        "to export it).\n" \
+        "\n" \
+        "       --log-max-size\n" \
+        "           Rotate the log file when it reaches this size (bytes).\n" \
+        "\n" \
+        "       --log-max-time\n" \
+        "           Rotate the log file after this time (seconds).\n" \
+        "\n" \
+        "       --log-index\n" \
+        "           Keep the text log search index updated while logging " \
+        "(see the search command).\n" \
+        "\n" \
+        "       --log-compress\n" \
+        "           Write the text log as independently compressed blocks " \
+        "(\"gzip\", \"bz2\", \"lzma\", \"zstd\" or \"auto\", that is zstd " \
+        "if available and gzip otherwise) with a block table, use " \
+        "capturezip.py to export it.\n" \
+        "\n" \
+        "       search\n" \
+        "           Search a text log by time range and literal or regex " \
+        "pattern, using (and building) its sidecar index to scan just the " \
+        "candidate blocks (see \"search --help\").\n" \
+        "\n" \
+        "       --framing\n" \
+        "           Split received data in frames: text lines (\"lf\", " \
+        "\"crlf\" or custom \"delim:<HEX_BYTES>\") or binary frames " \
+        "shown in hex (\"slip\", \"cobs\", \"len8\", \"len16\", " \
+        "\"len32\").\n" \
+        "\n" \
+        "       --ready\n" \
+        "           Wait for the device after opening the port: " \
+        "\"none\" (default), a fixed \"delay:<SECONDS>\", the first " \
+        "received \"byte\" or a \"banner:<TEXT>\" (i.e. a prompt). The " \
+        "time to first byte is shown at exit.\n" \
+        "\n" \
+        "       --ready-timeout\n" \
+        "           Maximum time to wait for the device to be ready " \
+        "(default 5 seconds).\n" \
+        "\n" \
+        "       --display\n" \
+        "           Received data display mode: \"text\" (default), " \
+        "\"hex\" dump, \"mixed\" hex and ASCII dump or C-\"escape\" " \
+        "text.\n" \
+        "\n" \
+        "       --row-bytes\n" \
+        "           Hex dump bytes per row (default 16).\n" \
+        "\n" \
+        "       --no-offsets\n" \
+        "           Don't show the offsets column in hex dumps.\n" \
+        "\n" \
+        "       --input-mode\n" \
+        "           Written lines are \"text\" (default) or \"hex\" bytes " \
+        "(i.e. \"01 03 00 00 00 0a c5 cd\").\n" \
+        "\n" \
+        "       --highlight\n" \
+        "           Highlight these patterns in received lines (patterns " \
+        "starting with \"re:\" are regular expressions).\n" \
+        "\n" \
+        "       --filter\n" \
+        "           Show only received lines that contain any of these " \
+        "patterns.\n" \
+        "\n" \
+        "       --filter-out\n" \
+        "           Hide received lines that contain any of these " \
+        "patterns.\n" \
+        "\n" \
+        "       --triggers-file\n" \
+        "           Read triggers from a file (a trigger each line as: " \
+        "PATTERN [highlight] [include|exclude] [mark] [name=<NAME>] " \
+        "[color=<COLOR>] [command=<COMMAND>]). Trigger hits are counted " \
+        "and shown at exit, \"mark\" writes a marker into the log file " \
+        "and \"command\" runs a command on each hit.\n" \
+        "\n" \
+        "       --flow-control\n" \
+        "           Serial port flow control, hardware \"rtscts\" or " \
+        "software \"xonxoff\" (text data only).\n" \
+        "\n" \
+        "       --stats\n" \
+        "           Show a summary of the metrics (counters, latencies and " \
+        "queue depths histograms) at exit.\n" \
+        "\n" \
+        "       --metrics-file\n" \
+        "           Periodically write the metrics to a Prometheus " \
+        "textfile (i.e. for the node exporter textfile collector).\n" \
+        "\n" \
+        "       --metrics-socket\n" \
+        "           Serve the metrics in Prometheus text format through a " \
+        "local Unix socket (get them with \"python metrics.py <PORT>\").\n" \
+        "\n" \
+        "       --profile\n" \
+        "           Profiling mode, run under \"cprofile\" or \"sample\" " \
+        "profiler (all threads), tracing memory allocations " \
+        "and timing the read, decode, display and log stages. A report is " \
+        "written at exit and on SIGUSR1.\n" \
+        "\n" \
+        "       --profile-dir\n" \
+        "           Directory for the profile reports (default current " \
+        "directory).\n" \
+        "\n" \
+        "       --ports\n" \
+        "           Multi-port mode, serve a list of Serial ports (each one " \
+        "as PORT[:BAUDS[:NAME]], BAUDS can be \"auto\" and PORT a URL as " \
+        "socket://<HOST>:<PORT>) showing their " \
+        "data prefixed by NAME. With -l, it is a directory to log each " \
+        "port to NAME.log.\n" \
+        "\n" \
+        "       --ports-file\n" \
+        "           Multi-port mode, read the Serial ports from a file (a " \
+        "port each line as: PORT [bauds=<BAUDS>] [name=<NAME>] " \
+        "[log=<LOG_FILE>]).\n" \
+        "\n" \
+        "       --broker\n" \
+        "           Own the Serial port and share it with other instances, " \
+        "that will attach to it automatically.\n" \
+        "\n" \
+        "       --broker-policy\n" \
+        "           Broker action for slow clients, \"truncate\" their " \
+        "oldest data (default) or \"drop\" them (network bridge default).\n" \
+        "\n" \
+        "       --publish\n" \
+        "           Publish the received stream in a shared memory ring, " \
+        "for local read-only taps.\n" \
+        "\n" \
+        "       --tap\n" \
+        "           Read-only tap of the received stream published by the " \
+        "terminal that owns the port (see --publish).\n" \
+        "\n" \
+        "       --batch\n" \
+        "           Run a script of commands (a command each line, " \
+        "optionally followed by its expected response end pattern and " \
+        "timeout, tab separated) waiting for each response, and show the " \
+        "responses latency statistics.\n" \
+        "\n" \
+        "       --batch-depth\n" \
+        "           Number of batch commands in flight (sent before the " \
+        "previous responses arrive, default 1).\n" \
+        "\n" \
+        "       --batch-expect\n" \
+        "           Batch commands default expected response end pattern, " \
+        "i.e. a prompt (\"re:\" prefix for regular expressions, default " \
+        "line end).\n" \
+        "\n" \
+        "       --serve\n" \
+        "           Network bridge, own the Serial port and serve it to raw " \
+        "TCP clients at this address (all interfaces if no HOST).\n" \
+        "\n" \
+        "       --serve-rfc2217\n" \
+        "           Network bridge, own the Serial port and serve it to " \
+        "RFC 2217 clients (remote BaudRate and control lines changes) at " \
+        "this address.\n" \
+        "\n" \
         "       -v, --version\n" \
         "           Shows current installed version.\n" \
         "\n" \
@@ -61,7 +236,7 @@ class TEXT():
 
     OPT_PORT = \
         "\n" \
-        "Specify the Serial port to use"
+        "Specify the Serial port to use (or a socket:// or rfc2217:// URL)"
 
     OPT_BAUDS = \
         "\n" \
@@ -71,6 +246,141 @@ class TEXT():
         "\n" \
         "Specify a file to log all Serial received-transmitted data"
 
+    OPT_LOG_FORMAT = \
+        "\n" \
+        "Log file format (text or binary)"
+
+    OPT_LOG_MAX_SIZE = \
+        "\n" \
+        "Rotate the log file when it reaches this size (bytes)"
+
+    OPT_LOG_MAX_TIME = \
+        "\n" \
+        "Rotate the log file after this time (seconds)"
+
+    OPT_LOG_INDEX = \
+        "\n" \
+        "Keep the text log search index updated while logging"
+
+    OPT_LOG_COMPRESS = \
+        "\n" \
+        "Write the text log as compressed blocks (auto, gzip, bz2, lzma or " \
+        "zstd)"
+
+    OPT_FRAMING = \
+        "\n" \
+        "Received data framing (lf, crlf, delim:<HEX_BYTES>, slip, cobs, " \
+        "len8, len16 or len32)"
+
+    OPT_READY = \
+        "\n" \
+        "Device readiness strategy (none, delay:<SECONDS>, byte or " \
+        "banner:<TEXT>)"
+
+    OPT_READY_TIMEOUT = \
+        "\n" \
+        "Device readiness maximum wait time"
+
+    OPT_DISPLAY = \
+        "\n" \
+        "Received data display mode (text, hex, mixed or escape)"
+
+    OPT_ROW_BYTES = \
+        "\n" \
+        "Hex dump bytes per row"
+
+    OPT_NO_OFFSETS = \
+        "\n" \
+        "Hide hex dump offsets column"
+
+    OPT_INPUT_MODE = \
+        "\n" \
+        "Written lines input mode (text or hex)"
+
+    OPT_HIGHLIGHT = \
+        "\n" \
+        "Patterns to highlight (\"re:<REGEX>\" for regular expressions)"
+
+    OPT_FILTER = \
+        "\n" \
+        "Show only lines with these patterns"
+
+    OPT_FILTER_OUT = \
+        "\n" \
+        "Hide lines with these patterns"
+
+    OPT_TRIGGERS_FILE = \
+        "\n" \
+        "Triggers definitions file"
+
+    OPT_FLOW_CONTROL = \
+        "\n" \
+        "Serial port flow control (rtscts or xonxoff)"
+
+    OPT_STATS = \
+        "\n" \
+        "Show a metrics summary at exit"
+
+    OPT_METRICS_FILE = \
+        "\n" \
+        "Prometheus textfile to periodically write the metrics"
+
+    OPT_METRICS_SOCKET = \
+        "\n" \
+        "Serve the metrics through a local Unix socket"
+
+    OPT_PROFILE = \
+        "\n" \
+        "Profiling mode profiler (cprofile or sample)"
+
+    OPT_PROFILE_DIR = \
+        "\n" \
+        "Profile reports directory"
+
+    OPT_PORTS = \
+        "\n" \
+        "Multi-port mode Serial ports list (PORT[:BAUDS[:NAME]])"
+
+    OPT_PORTS_FILE = \
+        "\n" \
+        "Multi-port mode Serial ports configuration file"
+
+    OPT_BROKER = \
+        "\n" \
+        "Own the Serial port and share it with other attached instances"
+
+    OPT_BROKER_POLICY = \
+        "\n" \
+        "Broker action for slow clients (truncate or drop)"
+
+    OPT_PUBLISH = \
+        "\n" \
+        "Publish the received stream in shared memory for local taps"
+
+    OPT_TAP = \
+        "\n" \
+        "Read-only tap of the received stream published for the port"
+
+    OPT_SERVE = \
+        "\n" \
+        "Serve the Serial port to raw TCP clients ([HOST:]PORT)"
+
+    OPT_SERVE_RFC2217 = \
+        "\n" \
+        "Serve the Serial port to RFC 2217 clients ([HOST:]PORT)"
+
+    OPT_BATCH = \
+        "\n" \
+        "Run a script of command/response transactions"
+
+    OPT_BATCH_DEPTH = \
+        "\n" \
+        "Number of batch commands in flight (default 1)"
+
+    OPT_BATCH_EXPECT = \
+        "\n" \
+        "Batch commands default expected response end (\"re:\" for regex)"
+
     IGNORE_OPTION = \
         "\n" \
         "Ignoring unkown option \"{}\"."
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    transaction.py
+Description:
+    Command/response transactions for scripted device control. Each sent
+    command gets a future that is resolved with its response as soon as
+    its expected pattern (i.e. a prompt) is received, instead of waiting
+    for a fixed read timeout. Several commands can be in flight at the
+    same time (pipelined), responses are matched to them in order, and a
+    batch runner executes a script of commands keeping a configurable
+    number of them in flight. Each transaction latency (from command
+    enqueue to its response) is measured. A channel can run on its own
+    event loop thread or on a started Serial session (see session.py).
+    Expected patterns starting with "re:" are regular expressions.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import re
+import time
+from collections import deque
+from concurrent.futures import Future
+from threading import Thread, Lock
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from filesrw import file_exists, file_read_all_text
+from metrics import REGISTRY
+from serialloop import SerialEventLoop
+from serialwriter import SerialWriter
+
+###############################################################################
+### Auxiliar Functions
+
+def expect_compile(expect):
+    '''Get the regular expression of an expected pattern (a compiled
+    regex, a "re:<REGEX>" text or a literal text or bytes).'''
+    if hasattr(expect, "search"):
+        return expect
+    if isinstance(expect, str):
+        if expect.startswith("re:"):
+            return re.compile(expect[3:].encode())
+        expect = expect.encode()
+    return re.compile(re.escape(expect))
+
+
+def bytes_text(data):
+    '''Get bytes as text (for messages and responses shown to users).'''
+    return data.decode(CONST.FRAMING_ENCODING, CONST.FRAMING_DECODE_ERRORS)
+
+###############################################################################
+### Transaction
+
+class Response():
+    '''Response of a transaction.'''
+
+    __slots__ = ("command", "data", "match", "latency")
+
+    def __init__(self, command, data, match, latency):
+        self.command = command
+        self.data = data
+        self.match = match
+        self.latency = latency
+
+    @property
+    def text(self):
+        '''Response data as text.'''
+        return bytes_text(self.data)
+
+    def __str__(self):
+        return self.text
+
+
+class Transaction():
+    '''Sent command waiting for its response.'''
+
+    __slots__ = ("command", "expect", "timeout", "future", "send_time",
+            "deadline")
+
+    def __init__(self, command, expect, timeout):
+        self.command = command
+        self.expect = expect
+        self.timeout = timeout
+        self.future = Future()
+        # Transactions can't be cancelled once sent
+        self.future.set_running_or_notify_cancel()
+        self.send_time = 0
+        self.deadline = None
+
+###############################################################################
+### Transaction Channel
+
+class TransactionChannel():
+    '''Serial port command/response channel with pipelined transactions.
+    Received data is handled by an event loop in a background thread and
+    commands are sent by a Serial writer (the ones of the session, if a
+    started SerialSession is provided instead of a port).'''
+
+    def __init__(self, ser, expect=CONST.TRANSACTION_EXPECT,
+            timeout=CONST.TRANSACTION_TIMEOUT, eol=CONST.TRANSACTION_EOL,
+            capture=None):
+        self.session = None
+        if hasattr(ser, "add_listener"):
+            self.session = ser
+            ser = self.session.ser
+        self.ser = ser
+        self.expect = expect_compile(expect)
+        self.timeout = timeout
+        self.eol = eol.encode() if isinstance(eol, str) else eol
+        self.capture = capture
+        self.sent = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.failed = 0
+        self.unsolicited_bytes = 0
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._lock = Lock()
+        self._send_lock = Lock()
+        self._running = False
+        self._loop = None
+        self._writer = None
+        self._thread = None
+        self._latencies = deque(maxlen=CONST.TRANSACTION_LATENCY_SAMPLES)
+        # Metrics
+        labels = {"port": str(getattr(ser, "port", None))}
+        self._latency_metric = REGISTRY.histogram(
+                "multisterm_transaction_latency_seconds",
+                "Time from command send to its response",
+                CONST.METRICS_LATENCY_BUCKETS, labels)
+        REGISTRY.gauge("multisterm_transactions_in_flight",
+                "Commands sent waiting for their response", labels,
+                fn=lambda: len(self._pending))
+        REGISTRY.counter("multisterm_transaction_timeouts_total",
+                "Commands without response in time", labels,
+                fn=lambda: self.timeouts)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Launch the event loop thread and the Serial writer.'''
+        if self.session is not None:
+            self._writer = self.session.writer
+            self._running = True
+            self.session.add_listener(self._on_read)
+            self.session.add_timer(CONST.TRANSACTION_TIMEOUT_RESOLUTION,
+                    self._timeouts_check)
+            return
+        self._loop = SerialEventLoop(self.ser, self._on_read)
+        self._loop.add_timer(CONST.TRANSACTION_TIMEOUT_RESOLUTION,
+                self._timeouts_check)
+        self._writer = SerialWriter(self.ser)
+        self._writer.start()
+        self._running = True
+        self._thread = Thread(target=self._th_loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the channel (transactions in flight fail).'''
+        if (self.session is not None) and self._running:
+            self.session.remove_listener(self._on_read)
+            self.session.remove_timer(self._timeouts_check)
+            self._channel_end()
+            return
+        if self._thread is None:
+            return
+        self._writer.stop()
+        self._loop.stop()
+        self._thread.join()
+        self._thread = None
+        self._loop.close()
+
+    def send(self, command, expect=None, timeout=None):
+        '''Send a command (the end of line is appended) and get the future
+        of its Response. The future fails with TimeoutError if the expected
+        pattern is not received in timeout seconds since the previous
+        transaction completed (or since it was sent, if none was pending),
+        or with ConnectionError if the port fails.'''
+        if isinstance(command, str):
+            command = command.encode()
+        if expect is None:
+            expect = self.expect
+        if timeout is None:
+            timeout = self.timeout
+        transaction = Transaction(command, expect_compile(expect), timeout)
+        data = command + self.eol
+        # Commands must be written in the transactions order, but the write
+        # (that blocks while the writer is paused or full) is done without
+        # the lock that the loop thread takes to match the responses
+        with self._send_lock:
+            with self._lock:
+                if not self._running:
+                    transaction.future.set_exception(ConnectionError(
+                            "Transaction channel not running"))
+                    return transaction.future
+                transaction.send_time = time.monotonic()
+                if not self._pending:
+                    transaction.deadline = transaction.send_time + timeout
+                self._pending.append(transaction)
+                self.sent = self.sent + 1
+            if self.session is not None:
+                self.session.write(data, flush=True)
+            else:
+                self._writer.write(data, flush=True)
+        if self.capture is not None:
+            self.capture.log_tx(data)
+        return transaction.future
+
+    def in_flight(self):
+        '''Get the number of commands waiting for their response.'''
+        return len(self._pending)
+
+    def stats(self):
+        '''Get transactions and latency statistics.'''
+        latencies = sorted(self._latencies)
+        stats = {
+            "sent": self.sent,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "failed": self.failed,
+            "in_flight": len(self._pending),
+            "unsolicited_bytes": self.unsolicited_bytes,
+            "latency_min_ms": 0.0,
+            "latency_avg_ms": 0.0,
+            "latency_p50_ms": 0.0,
+            "latency_p95_ms": 0.0,
+            "latency_p99_ms": 0.0,
+            "latency_max_ms": 0.0
+        }
+        if latencies:
+            stats["latency_min_ms"] = latencies[0] * 1000
+            stats["latency_avg_ms"] = \
+                sum(latencies) / len(latencies) * 1000
+            stats["latency_p50_ms"] = \
+                latencies[int(0.50 * (len(latencies) - 1))] * 1000
+            stats["latency_p95_ms"] = \
+                latencies[int(0.95 * (len(latencies) - 1))] * 1000
+            stats["latency_p99_ms"] = \
+                latencies[int(0.99 * (len(latencies) - 1))] * 1000
+            stats["latency_max_ms"] = latencies[-1] * 1000
+        return stats
+
+    def _th_loop(self):
+        '''Event loop thread (it ends on stop or on port failure).'''
+        self._loop.run()
+        self._channel_end()
+
+    def _channel_end(self):
+        '''Fail the transactions in flight, the channel is not running.'''
+        with self._lock:
+            self._running = False
+            failed = list(self._pending)
+            self._pending.clear()
+            self.failed = self.failed + len(failed)
+        for transaction in failed:
+            transaction.future.set_exception(ConnectionError(
+                    "Serial port closed before the response to \"{}\"".format(
+                    bytes_text(transaction.command))))
+
+    def _on_read(self, data):
+        '''Match received data to the transactions in flight.'''
+        if self.capture is not None:
+            self.capture.log_rx(data)
+        completed = []
+        now = time.monotonic()
+        with self._lock:
+            self._buffer.extend(data)
+            while self._pending:
+                transaction = self._pending[0]
+                match = transaction.expect.search(self._buffer)
+                if match is None:
+                    break
+                response = bytes(self._buffer[:match.end()])
+                del self._buffer[:match.end()]
+                self._pending.popleft()
+                self._head_start(now)
+                completed.append((transaction, response))
+            if (not self._pending) and self._buffer:
+                self.unsolicited_bytes = \
+                    self.unsolicited_bytes + len(self._buffer)
+                self._buffer.clear()
+        # Futures are resolved without the lock, so their callbacks can
+        # send new commands
+        for transaction, response in completed:
+            latency = now - transaction.send_time
+            self.completed = self.completed + 1
+            self._latencies.append(latency)
+            self._latency_metric.observe(latency)
+            transaction.future.set_result(Response(transaction.command,
+                    response, transaction.expect.search(response), latency))
+
+    def _timeouts_check(self):
+        '''Fail the oldest transaction if its response did not arrive in
+        time (its partial response is discarded).'''
+        expired = []
+        now = time.monotonic()
+        with self._lock:
+            while self._pending and (now >= self._pending[0].deadline):
+                expired.append(self._pending.popleft())
+                self._buffer.clear()
+                self._head_start(now)
+            self.timeouts = self.timeouts + len(expired)
+        for transaction in expired:
+            print_log(LOG.DEBUG, "Transaction timeout: {}",
+                    bytes_text(transaction.command))
+            transaction.future.set_exception(TimeoutError(
+                    "No response to \"{}\" in {} s".format(
+                    bytes_text(transaction.command), transaction.timeout)))
+
+    def _head_start(self, now):
+        '''Start the response timeout of the new oldest transaction.'''
+        if self._pending:
+            transaction = self._pending[0]
+            transaction.deadline = max(now, transaction.send_time) + \
+                    transaction.timeout
+
+###############################################################################
+### Batch Runner
+
+def transaction_script_parse(file_path):
+    '''Parse a transactions script, with a command each line and optionally
+    its expected pattern and timeout, tab separated:
+    COMMAND[<TAB>EXPECT[<TAB>TIMEOUT]]. Get a list of (command, expect,
+    timeout) tuples (None for defaults) or None if it is invalid.'''
+    if not file_exists(file_path):
+        print_log(LOG.ERROR, "Script file {} not found.", file_path)
+        return None
+    commands = []
+    for line_number, line in enumerate(
+            file_read_all_text(file_path).splitlines(), 1):
+        if (not line.strip()) or line.lstrip().startswith("#"):
+            continue
+        fields = line.split("\t")
+        command = fields[0]
+        expect = None
+        timeout = None
+        try:
+            if (len(fields) > 1) and fields[1]:
+                expect = expect_compile(fields[1])
+            if (len(fields) > 2) and fields[2]:
+                timeout = float(fields[2])
+        except (re.error, ValueError) as e:
+            print_log(LOG.ERROR, "Invalid script line {}: {}", line_number,
+                    e)
+            return None
+        commands.append((command, expect, timeout))
+    return commands
+
+
+def transaction_batch(channel, commands, depth=CONST.TRANSACTION_DEPTH,
+        on_result=None):
+    '''Run a list of (command, expect, timeout) transactions keeping up to
+    depth of them in flight. Get the list of (command, Response or
+    exception) results in order (also passed to on_result as soon as each
+    one is available).'''
+    results = []
+    in_flight = deque()
+    def result_wait():
+        command, future = in_flight.popleft()
+        error = future.exception()
+        result = (command, future.result() if error is None else error)
+        results.append(result)
+        if on_result is not None:
+            on_result(*result)
+    for command, expect, timeout in commands:
+        if len(in_flight) >= max(1, depth):
+            result_wait()
+        in_flight.append((command, channel.send(command, expect, timeout)))
+    while in_flight:
+        result_wait()
+    return results
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    triggers.py
+Description:
+    Multi-pattern trigger engine for the received data stream. All literal
+    patterns are searched at once by an Aho-Corasick automaton (compiled to
+    a full transitions table, so each byte costs a single lookup) whose
+    state is kept between chunks, so matches split across reads are found
+    as soon as their last byte arrives. Regular expression patterns are
+    combined in a single alternation that is run once per complete line,
+    and line filters and highlights are also compiled to single regexes
+    (patterns that can't be combined, i.e. with backreferences or named
+    groups, are run on their own).
+    Each trigger counts its hits and can highlight its matches, filter
+    lines in or out, run a command or write a marker into the capture log.
+    Trigger patterns starting with "re:" are regular expressions.
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import re
+import shlex
+import subprocess
+import time
+from os import environ as os_environ
+
+from constants import LOG, CONST
+from auxiliar import print_log
+from filesrw import file_exists, file_read_all_text
+
+###############################################################################
+### Constants
+
+HIGHLIGHT_COLORS = {
+    "red": b"\x1b[1;31m",
+    "green": b"\x1b[1;32m",
+    "yellow": b"\x1b[1;33m",
+    "blue": b"\x1b[1;34m",
+    "magenta": b"\x1b[1;35m",
+    "cyan": b"\x1b[1;36m"
+}
+
+HIGHLIGHT_RESET = b"\x1b[0m"
+
+# Regex syntax that can't be combined in an alternation with other
+# patterns (named groups, backreferences, conditionals and global flags)
+UNCOMBINABLE_RE = re.compile(
+        rb"\(\?P?<[A-Za-z_]|\\[1-9]|\\g<|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+
+###############################################################################
+### Trigger
+
+class Trigger():
+    '''Pattern to watch in the received data and its actions.'''
+
+    def __init__(self, pattern, name=None, highlight=False, include=False,
+            exclude=False, mark=False, command=None,
+            color=CONST.TRIGGER_HIGHLIGHT_COLOR):
+        self.regex = pattern.startswith("re:")
+        if self.regex:
+            pattern = pattern[3:]
+        self.pattern = pattern.encode()
+        self.name = name
+        if self.name is None:
+            self.name = pattern
+        self.highlight = highlight
+        self.include = include
+        self.exclude = exclude
+        self.mark = mark
+        self.command = command
+        self.color = HIGHLIGHT_COLORS.get(color, HIGHLIGHT_COLORS["red"])
+        self.hits = 0
+        self.last_hook = 0
+
+    def regex_pattern(self):
+        '''Get the trigger pattern as a regular expression.'''
+        if self.regex:
+            return self.pattern
+        return re.escape(self.pattern)
+
+###############################################################################
+### Aho-Corasick Automaton
+
+class AhoCorasick():
+    '''Streaming multi-pattern literal bytes matcher.'''
+
+    def __init__(self, patterns):
+        # Build the keywords trie
+        goto = [{}]
+        outputs = [[]]
+        for i, pattern in enumerate(patterns):
+            state = 0
+            for byte in pattern:
+                if byte not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            outputs[state].append(i)
+        # Breadth first fail links, merging outputs and completing the
+        # transitions table with the fail state transitions
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = [goto[0].get(byte, 0) for byte in range(256)]
+        queue = list(goto[0].values())
+        while queue:
+            state = queue.pop(0)
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            delta[state] = list(delta[fail[state]])
+            for byte, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]][byte]
+                delta[state][byte] = next_state
+                queue.append(next_state)
+        self._delta = [tuple(row) for row in delta]
+        self._outputs = [tuple(out) if out else None for out in outputs]
+        self._state = 0
+
+    def feed(self, data):
+        '''Search a data chunk, continuing the previous chunk matches.
+        Returns a list of (pattern index, match end offset in data).'''
+        hits = []
+        delta = self._delta
+        outputs = self._outputs
+        state = self._state
+        for offset, byte in enumerate(data):
+            state = delta[state][byte]
+            if outputs[state] is not None:
+                for i in outputs[state]:
+                    hits.append((i, offset + 1))
+        self._state = state
+        return hits
+
+    def reset(self):
+        '''Forget partial matches of previous chunks.'''
+        self._state = 0
+
+###############################################################################
+### Pattern Set
+
+class PatternSet():
+    '''Regular expressions of a list of triggers, compiled in a single
+    alternation with a named group for each one ("t<INDEX>"), except the
+    ones that can't be combined, that are compiled on their own.'''
+
+    def __init__(self, triggers):
+        self.triggers = triggers
+        self._combined = None
+        self._separate = []
+        combined = []
+        for i, trigger in enumerate(triggers):
+            if trigger.regex and UNCOMBINABLE_RE.search(trigger.pattern):
+                self._separate.append((i, re.compile(trigger.pattern)))
+            else:
+                combined.append(i)
+        if not combined:
+            return
+        try:
+            self._combined = re.compile(b"|".join(b"(?P<t%d>%s)" % (i,
+                    triggers[i].regex_pattern()) for i in combined))
+        except re.error:
+            # Not expected syntax interactions, run them on their own
+            self._separate = sorted(self._separate + [(i,
+                    re.compile(triggers[i].regex_pattern()))
+                    for i in combined], key=lambda item: item[0])
+
+    def finditer(self, line):
+        '''Iterate the (trigger, match) of all the patterns matches.'''
+        if self._combined is not None:
+            for match in self._combined.finditer(line):
+                yield (self.triggers[int(match.lastgroup[1:])], match)
+        for i, regex in self._separate:
+            for match in regex.finditer(line):
+                yield (self.triggers[i], match)
+
+    def search(self, line):
+        '''Check if any pattern matches a line.'''
+        if (self._combined is not None) and self._combined.search(line):
+            return True
+        return any(regex.search(line) for _, regex in self._separate)
+
+    def sub(self, function, line):
+        '''Replace the matches (the leftmost one of overlapping matches) by
+        the result of function(trigger, match).'''
+        if not self._separate:
+            return self._combined.sub(lambda match: function(
+                    self.triggers[int(match.lastgroup[1:])], match), line)
+        matches = sorted(self.finditer(line),
+                key=lambda item: (item[1].start(), -item[1].end()))
+        result = []
+        offset = 0
+        for trigger, match in matches:
+            if match.start() < offset:
+                continue
+            result.append(line[offset:match.start()])
+            result.append(function(trigger, match))
+            offset = max(match.end(), offset)
+        result.append(line[offset:])
+        return b"".join(result)
+
+###############################################################################
+### Trigger Engine
+
+class TriggerEngine():
+    '''Run a set of triggers over the received data stream.'''
+
+    def __init__(self, triggers, capture=None):
+        self.triggers = triggers
+        self.capture = capture
+        self._literals = [t for t in triggers if not t.regex]
+        self._regexes = [t for t in triggers if t.regex]
+        self._matcher = None
+        if self._literals:
+            self._matcher = AhoCorasick([t.pattern for t in self._literals])
+        self._regex = self._combine(self._regexes)
+        self._include = self._combine([t for t in triggers if t.include])
+        self._exclude = self._combine([t for t in triggers if t.exclude])
+        self._highlights = [t for t in triggers if t.highlight]
+        self._highlight = self._combine(self._highlights)
+
+    def line_rules(self):
+        '''Check if there are triggers that require complete lines.'''
+        return (self._regex is not None) or (self._include is not None) or \
+            (self._exclude is not None) or (self._highlight is not None)
+
+    def feed(self, data):
+        '''Search literal triggers in a received data chunk.'''
+        if self._matcher is None:
+            return
+        for i, _ in self._matcher.feed(data):
+            trigger = self._literals[i]
+            self.fire(trigger, trigger.pattern)
+
+    def line_process(self, line):
+        '''Search regex triggers in a complete line, apply the filters and
+        highlight it. Returns None if the line must not be shown.'''
+        if self._regex is not None:
+            for trigger, match in self._regex.finditer(line):
+                self.fire(trigger, match.group())
+        if (self._include is not None) and (not self._include.search(line)):
+            return None
+        if (self._exclude is not None) and self._exclude.search(line):
+            return None
+        if self._highlight is not None:
+            line = self._highlight.sub(self._highlight_match, line)
+        return line
+
+    def fire(self, trigger, match):
+        '''Count a trigger hit and run its actions.'''
+        trigger.hits = trigger.hits + 1
+        print_log(LOG.DEBUG, "Trigger {} hit: {}", trigger.name, match)
+        if trigger.mark and (self.capture is not None):
+            self.capture.mark("Trigger {}: {}".format(trigger.name,
+                    match.decode(errors="replace")))
+        if trigger.command is not None:
+            now = time.monotonic()
+            if now - trigger.last_hook < CONST.TRIGGER_HOOK_MIN_INTERVAL:
+                return
+            trigger.last_hook = now
+            self._run_command(trigger, match)
+
+    def hits(self):
+        '''Get the list of (trigger name, hits).'''
+        return [(t.name, t.hits) for t in self.triggers]
+
+    @staticmethod
+    def _highlight_match(trigger, match):
+        '''Wrap a highlight match in its trigger color.'''
+        return trigger.color + match.group() + HIGHLIGHT_RESET
+
+    def _run_command(self, trigger, match):
+        '''Launch a trigger command without waiting for it.'''
+        env = dict(os_environ)
+        env["MULTISTERM_TRIGGER"] = trigger.name
+        env["MULTISTERM_MATCH"] = match.decode(errors="replace")
+        try:
+            subprocess.Popen(trigger.command, shell=True, env=env,
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL)
+        except OSError as e:
+            print_log(LOG.ERROR, "Trigger {} command fail: {}",
+                    trigger.name, e)
+
+    @staticmethod
+    def _combine(triggers):
+        '''Compile the patterns of a list of triggers (see PatternSet).'''
+        if not triggers:
+            return None
+        return PatternSet(triggers)
+
+###############################################################################
+### Configuration Functions
+
+def triggers_parse_file(file_path):
+    '''Parse a triggers file, with a trigger each line (quoted as shell
+    words): PATTERN [highlight] [include|exclude] [mark] [name=<NAME>]
+    [color=<COLOR>] [command=<COMMAND>]'''
+    triggers = []
+    if not file_exists(file_path):
+        print_log(LOG.ERROR, "Triggers file {} not found.", file_path)
+        return triggers
+    for line in file_read_all_text(file_path).splitlines():
+        line = line.strip()
+        if (not line) or line.startswith("#"):
+            continue
+        try:
+            fields = shlex.split(line)
+        except ValueError as e:
+            print_log(LOG.ERROR, "Invalid trigger {}: {}", line, e)
+            continue
+        options = {}
+        for field in fields[1:]:
+            key, _, value = field.partition("=")
+            options[key] = value
+        triggers.append(Trigger(fields[0], options.get("name"),
+                "highlight" in options, "include" in options,
+                "exclude" in options, "mark" in options,
+                options.get("command"),
+                options.get("color", CONST.TRIGGER_HIGHLIGHT_COLOR)))
+    return triggers
+
+
+def triggers_check(triggers):
+    '''Check that triggers patterns are not empty and that their regular
+    expressions are valid (also once combined).'''
+    for trigger in triggers:
+        if not trigger.pattern:
+            print_log(LOG.ERROR, "Invalid trigger {}: empty pattern",
+                    trigger.name)
+            return False
+        try:
+            re.compile(trigger.regex_pattern())
+        except re.error as e:
+            print_log(LOG.ERROR, "Invalid trigger {}: {}", trigger.name, e)
+            return False
+    try:
+        TriggerEngine(triggers)
+    except re.error as e:
+        print_log(LOG.ERROR, "Invalid triggers combination: {}", e)
+        return False
+    return True
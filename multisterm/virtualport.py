@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Script:
+    virtualport.py
+Description:
+    Virtual Serial device based on a pseudo-terminal (pty) pair, that can be
+    opened by pyserial as a real port. The device side can generate data
+    (text, binary, bursts or line floods) and echo back received data, so
+    the terminal can be tested and benchmarked without hardware.
+    It can be executed to launch a virtual device:
+        python virtualport.py [-g text|binary|bursts|lines] [-r <BYTES/S>]
+               [-e]
+Author:
+    Jose Miguel Rios Rubio
+Date:
+    18/10/2026
+Version:
+    1.0.0
+'''
+
+###############################################################################
+### Imported modules
+
+import os
+import selectors
+import time
+import tty
+from sys import argv as sys_argv
+from sys import exit as sys_exit
+from threading import Thread
+from argparse import ArgumentParser as argparse_ArgumentParser
+
+from constants import RC, LOG, CONST
+from auxiliar import print_log
+
+###############################################################################
+### Data Generators
+# Generators yield (data, delay) tuples, delay is the time (seconds) to wait
+# after the data has been sent.
+
+def gen_text(line_size=CONST.VPORT_LINE_SIZE):
+    '''Human readable text lines.'''
+    text = b"The quick brown fox jumps over the lazy dog 0123456789 "
+    num_line = 0
+    while True:
+        line = b"[%08d] " % num_line
+        line = line + (text * (line_size // len(text) + 1))
+        yield (line[:line_size-2] + b"\r\n", 0)
+        num_line = num_line + 1
+
+
+def gen_binary(chunk_size=CONST.VPORT_CHUNK_SIZE):
+    '''Random binary data.'''
+    pool = os.urandom(chunk_size * 16)
+    i = 0
+    while True:
+        start = (i % 16) * chunk_size
+        yield (pool[start:start+chunk_size], 0)
+        i = i + 1
+
+
+def gen_bursts(burst_size=CONST.VPORT_BURST_SIZE,
+        burst_gap=CONST.VPORT_BURST_GAP):
+    '''Text bursts separated by silence gaps.'''
+    lines = gen_text()
+    while True:
+        burst = bytearray()
+        while len(burst) < burst_size:
+            burst.extend(next(lines)[0])
+        yield (bytes(burst), burst_gap)
+
+
+def gen_lines():
+    '''Flood of very short lines.'''
+    num_line = 0
+    while True:
+        yield (b"%d\n" % (num_line % 1000), 0)
+        num_line = num_line + 1
+
+
+GENERATORS = {
+    "text": gen_text,
+    "binary": gen_binary,
+    "bursts": gen_bursts,
+    "lines": gen_lines
+}
+
+###############################################################################
+### Virtual Port
+
+class VirtualPort():
+    '''pty pair based virtual Serial device.'''
+
+    def __init__(self, generator=None, echo=False, rate=0, limit=0):
+        self.generator = generator
+        self.echo = echo
+        self.rate = rate
+        self.limit = limit
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._master, self._slave = os.openpty()
+        # Raw device side: no echo, no EOL translations
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self._thread = None
+        self._running = False
+        self._pending = bytearray()
+        self._on_receive = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Launch the device thread.'''
+        self._running = True
+        self._thread = Thread(target=self._th_device)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        '''Stop the device thread and release the pty.'''
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._master is not None:
+            os.close(self._master)
+            os.close(self._slave)
+            self._master = None
+
+    def set_on_receive(self, callback):
+        '''Set a function to be called with data received by the device.'''
+        self._on_receive = callback
+
+    def send(self, data):
+        '''Queue data to be sent by the device.'''
+        self._pending.extend(data)
+
+    def generation_done(self):
+        '''Check if the generation limit has been reached and sent.'''
+        return (self.limit > 0) and (self.bytes_sent >= self.limit) and \
+            (not self._pending)
+
+    def _generate(self, now, next_time):
+        '''Get next generator data if it is time to send it.'''
+        if (self.generator is None) or (now < next_time) or \
+                (len(self._pending) >= CONST.VPORT_CHUNK_SIZE):
+            return next_time
+        if (self.limit > 0) and (self.bytes_sent + len(self._pending)
+                >= self.limit):
+            return next_time
+        data, delay = next(self.generator)
+        if self.limit > 0:
+            data = data[:self.limit - self.bytes_sent - len(self._pending)]
+        self._pending.extend(data)
+        if self.rate > 0:
+            delay = delay + (len(data) / self.rate)
+        return max(now, next_time) + delay
+
+    def _th_device(self):
+        '''Virtual device thread.'''
+        selector = selectors.DefaultSelector()
+        selector.register(self._master, selectors.EVENT_READ)
+        next_time = time.time()
+        while self._running:
+            now = time.time()
+            next_time = self._generate(now, next_time)
+            events = selectors.EVENT_READ
+            if self._pending:
+                events = events | selectors.EVENT_WRITE
+            selector.modify(self._master, events)
+            timeout = CONST.VPORT_POLL_TIME
+            if (self.generator is not None) and (not self._pending):
+                timeout = min(timeout, max(0, next_time - time.time()))
+            for _, ready in selector.select(timeout):
+                if ready & selectors.EVENT_READ:
+                    self._device_read()
+                if ready & selectors.EVENT_WRITE:
+                    self._device_write()
+        selector.close()
+
+    def _device_read(self):
+        '''Read data written to the port by the application.'''
+        try:
+            data = os.read(self._master, CONST.VPORT_READ_SIZE)
+        except (BlockingIOError, OSError):
+            return
+        self.bytes_received = self.bytes_received + len(data)
+        if self._on_receive is not None:
+            self._on_receive(data)
+        if self.echo:
+            self._pending.extend(data)
+
+    def _device_write(self):
+        '''Write pending data to the application side.'''
+        try:
+            written = os.write(self._master, self._pending)
+        except (BlockingIOError, OSError):
+            return
+        del self._pending[:written]
+        self.bytes_sent = self.bytes_sent + written
+
+###############################################################################
+### Main Function
+
+def main(argc, argv):
+    '''Main Function.'''
+    arg_parser = argparse_ArgumentParser()
+    arg_parser.add_argument("-g", "--generator", help="Data generator",
+                            action='store', type=str,
+                            choices=list(GENERATORS.keys()))
+    arg_parser.add_argument("-r", "--rate", help="Generator bytes/s limit",
+                            action='store', type=int, default=0)
+    arg_parser.add_argument("-e", "--echo", help="Echo back received data",
+                            action='store_true')
+    args = arg_parser.parse_args(argv[1:])
+    generator = None
+    if args.generator is not None:
+        generator = GENERATORS[args.generator]()
+    vport = VirtualPort(generator, args.echo, args.rate)
+    vport.start()
+    print("Virtual Serial port: {}".format(vport.port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    vport.stop()
+    print_log(LOG.INFO, "Virtual port sent {} and received {} bytes",
+            vport.bytes_sent, vport.bytes_received)
+    return RC.OK
+
+###############################################################################
+### Main Script execution Check
+
+if __name__ == "__main__":
+    sys_exit(main(len(sys_argv), sys_argv))